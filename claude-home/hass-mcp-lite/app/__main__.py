@@ -1,13 +1,30 @@
 #!/usr/bin/env python
 """Entry point for running Hass-MCP as a module"""
 
+import argparse
+import asyncio
+
+from .config import HA_MCP_TRANSPORT, HA_MCP_HOST, HA_MCP_PORT, HA_MCP_SOCKET
 from .server import mcp
 
 
 def main():
-    """Run the MCP server with stdio communication"""
-    mcp.run()
+    """Run the MCP server with stdio communication, or over SSE for many sessions"""
+    parser = argparse.ArgumentParser(prog="python -m app", description="Hass-MCP server")
+    parser.add_argument("--transport", choices=("stdio", "sse"), default=HA_MCP_TRANSPORT,
+                        help="stdio for one session, sse to serve many sessions from one process")
+    parser.add_argument("--host", default=HA_MCP_HOST, help="interface to bind with --transport sse")
+    parser.add_argument("--port", type=int, default=HA_MCP_PORT, help="port to bind with --transport sse")
+    parser.add_argument("--socket", default=HA_MCP_SOCKET or None,
+                        help="unix socket to bind instead of host and port")
+    args = parser.parse_args()
+
+    if args.transport == "sse":
+        from .network import serve
+        asyncio.run(serve(mcp, args.host, args.port, args.socket))
+    else:
+        mcp.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,157 @@
+import heapq
+import logging
+import random
+from itertools import islice
+from typing import Dict, Any, Optional, List, Tuple, Iterable, TypeVar
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Area label for entities without area_name/area_id attributes
+UNKNOWN_AREA = "Unknown"
+
+def area_of(entity: Dict[str, Any]) -> str:
+    """Return the area an entity is counted under"""
+    attributes = entity.get("attributes") or {}
+    return attributes.get("area_name") or attributes.get("area_id") or UNKNOWN_AREA
+
+def reservoir_sample(items: Iterable[T], k: int, rng: Optional[random.Random] = None) -> List[T]:
+    """
+    Pick k items uniformly at random in a single pass (Algorithm R)
+
+    Only the k picked items are held, so the input can be any iterable
+    without being materialized as a list.
+    """
+    rng = rng or random
+    reservoir: List[T] = []
+    if k <= 0:
+        return reservoir
+    for seen, item in enumerate(items):
+        if seen < k:
+            reservoir.append(item)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < k:
+                reservoir[slot] = item
+    return reservoir
+
+class DomainAggregate:
+    """Counters for the entities of one domain"""
+
+    __slots__ = ("count", "states", "attributes", "areas")
+
+    def __init__(self):
+        self.count = 0
+        # state -> entity IDs in that state, in the order they entered it
+        self.states: Dict[str, Dict[str, None]] = {}
+        # attribute key -> number of entities having it
+        self.attributes: Dict[str, int] = {}
+        # area -> number of entities
+        self.areas: Dict[str, int] = {}
+
+    def add(self, entity_id: str, entity: Dict[str, Any]) -> None:
+        self.count += 1
+        state = entity.get("state", "unknown")
+        members = self.states.get(state)
+        if members is None:
+            members = self.states[state] = {}
+        members[entity_id] = None
+        for key in entity.get("attributes") or {}:
+            self.attributes[key] = self.attributes.get(key, 0) + 1
+        area = area_of(entity)
+        self.areas[area] = self.areas.get(area, 0) + 1
+
+    def remove(self, entity_id: str, entity: Dict[str, Any]) -> None:
+        self.count -= 1
+        state = entity.get("state", "unknown")
+        members = self.states.get(state)
+        if members is not None:
+            members.pop(entity_id, None)
+            if not members:
+                del self.states[state]
+        for key in entity.get("attributes") or {}:
+            _decrement(self.attributes, key)
+        _decrement(self.areas, area_of(entity))
+
+    def state_counts(self) -> Dict[str, int]:
+        """Return {state: entity count}"""
+        return {state: len(members) for state, members in self.states.items()}
+
+    def examples(self, state: str, limit: int, sample: bool = False, rng: Optional[random.Random] = None) -> List[str]:
+        """
+        Return up to limit entity IDs in the given state
+
+        Args:
+            state: The state to pick examples from
+            limit: Maximum number of entity IDs
+            sample: If True, pick them uniformly at random instead of the
+                    first ones that entered the state
+            rng: Optional random generator for sampling
+        """
+        members = self.states.get(state, {})
+        if sample:
+            return reservoir_sample(members, limit, rng)
+        return list(islice(members, max(limit, 0)))
+
+    def top_attributes(self, limit: int) -> List[Tuple[str, int]]:
+        """Return the limit most common (attribute, entity count) pairs"""
+        return heapq.nlargest(limit, self.attributes.items(), key=lambda item: item[1])
+
+def _decrement(counter: Dict[str, int], key: str) -> None:
+    count = counter.get(key, 0) - 1
+    if count > 0:
+        counter[key] = count
+    else:
+        counter.pop(key, None)
+
+class EntityAggregates:
+    """
+    Per-domain state, attribute and area counters maintained incrementally
+
+    Registered as an EntityStore listener, so every addition, change and
+    removal adjusts the counters of its domain and overview-style summaries
+    are read in O(domains) instead of rescanning every entity.
+    """
+
+    def __init__(self):
+        self.domains: Dict[str, DomainAggregate] = {}
+
+    def update(self, entity_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Store listener: move an entity's contribution from old to new"""
+        domain = entity_id.split(".", 1)[0]
+        aggregate = self.domains.get(domain)
+        if old is not None and aggregate is not None:
+            if (new is not None and old.get("state") == new.get("state")
+                    and (old.get("attributes") or {}).keys() == (new.get("attributes") or {}).keys()
+                    and area_of(old) == area_of(new)):
+                # Only attribute values or timestamps changed
+                return
+            aggregate.remove(entity_id, old)
+        if new is not None:
+            if aggregate is None:
+                aggregate = self.domains[domain] = DomainAggregate()
+            aggregate.add(entity_id, new)
+        elif aggregate is not None and aggregate.count <= 0:
+            del self.domains[domain]
+
+    def domain(self, domain: str) -> Optional[DomainAggregate]:
+        """Return the counters of a domain, or None if it has no entities"""
+        return self.domains.get(domain)
+
+    def area_distribution(self) -> Dict[str, Dict[str, int]]:
+        """Return {area: {domain: entity count}}"""
+        distribution: Dict[str, Dict[str, int]] = {}
+        for domain, aggregate in self.domains.items():
+            for area, count in aggregate.areas.items():
+                distribution.setdefault(area, {})[domain] = count
+        return distribution
+
+    def most_common_domains(self, limit: int) -> List[Tuple[str, int]]:
+        """Return the limit largest (domain, entity count) pairs"""
+        return heapq.nlargest(
+            limit,
+            ((domain, aggregate.count) for domain, aggregate in self.domains.items()),
+            key=lambda item: item[1]
+        )
@@ -0,0 +1,294 @@
+import json
+import logging
+import math
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, Sequence
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Rough bytes of JSON tool output per model token
+BYTES_PER_TOKEN = 4
+
+# Attribute values whose JSON is larger than this are the first thing dropped
+LARGE_ATTRIBUTE_BYTES = 200
+
+# Items kept of a nested list once lists are summarised
+SUMMARY_ITEMS = 3
+
+# Strings (log messages, tracebacks) are cut to this many characters as a last resort
+SHORT_STRING_CHARS = 300
+
+# A degradation step: returns the reduced response and a note on what it
+# elided (None when it found nothing to elide)
+Step = Callable[[Any], Tuple[Any, Optional[Dict[str, Any]]]]
+
+def budget_bytes(max_tokens: Optional[int] = None, max_bytes: Optional[int] = None) -> Optional[int]:
+    """Combine a token and a byte budget into one byte limit (None when unlimited)"""
+    limits = []
+    if max_tokens is not None and max_tokens > 0:
+        limits.append(max_tokens * BYTES_PER_TOKEN)
+    if max_bytes is not None and max_bytes > 0:
+        limits.append(max_bytes)
+    return min(limits) if limits else None
+
+def estimate_bytes(value: Any) -> int:
+    """Measure a response the way it is sent: compact, ASCII-escaped JSON"""
+    return len(json.dumps(value, default=str))
+
+def estimate_tokens(value: Any) -> int:
+    """Estimate the number of model tokens a response costs"""
+    return math.ceil(estimate_bytes(value) / BYTES_PER_TOKEN)
+
+def _map_entities(value: Any, transform: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Any:
+    """Apply transform to every entity dictionary, copying the containers around them"""
+    if isinstance(value, dict):
+        if "entity_id" in value:
+            return transform(value)
+        return {key: _map_entities(item, transform) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_entities(item, transform) for item in value]
+    return value
+
+def _is_large(value: Any, threshold: int) -> bool:
+    if value is None or isinstance(value, (bool, int, float)):
+        return False
+    if isinstance(value, str) and len(value) * 2 < threshold:
+        # Cannot exceed the threshold even with every character escaped
+        return False
+    return estimate_bytes(value) > threshold
+
+def drop_large_attributes(threshold: int = LARGE_ATTRIBUTE_BYTES) -> Step:
+    """Step: drop attribute values larger than threshold bytes (entity pictures, source lists, ...)"""
+    def step(response: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        dropped: Dict[str, int] = {}
+
+        def transform(entity: Dict[str, Any]) -> Dict[str, Any]:
+            attributes = entity.get("attributes")
+            if not isinstance(attributes, dict):
+                return entity
+            kept = {}
+            for key, value in attributes.items():
+                if _is_large(value, threshold):
+                    dropped[key] = dropped.get(key, 0) + 1
+                else:
+                    kept[key] = value
+            return entity if len(kept) == len(attributes) else {**entity, "attributes": kept}
+
+        response = _map_entities(response, transform)
+        if not dropped:
+            return response, None
+        return response, {"step": "drop_large_attributes", "attributes": dropped}
+    return step
+
+def lean_entities(project: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Step:
+    """Step: replace entities carrying full attributes with their lean projection"""
+    def step(response: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        count = 0
+
+        def transform(entity: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal count
+            if not isinstance(entity.get("attributes"), dict):
+                return entity
+            count += 1
+            return project(entity)
+
+        response = _map_entities(response, transform)
+        return response, ({"step": "lean_fields", "entities": count} if count else None)
+    return step
+
+def drop_attributes() -> Step:
+    """Step: keep only the state of entities, dropping their attributes"""
+    def step(response: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        count = 0
+
+        def transform(entity: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal count
+            if "attributes" not in entity:
+                return entity
+            count += 1
+            return {key: value for key, value in entity.items() if key != "attributes"}
+
+        response = _map_entities(response, transform)
+        return response, ({"step": "drop_attributes", "entities": count} if count else None)
+    return step
+
+def summarize_lists(keep: int = SUMMARY_ITEMS, skip: Sequence[str] = ()) -> Step:
+    """
+    Step: cut nested lists to their first `keep` items
+
+    Top-level lists under the `skip` keys (the main list, which is left for
+    truncation, and continuation lists) are kept whole, but the items inside
+    them are summarised.
+    """
+    def step(response: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        lists = 0
+        items = 0
+
+        def summarize(value: Any) -> Any:
+            nonlocal lists, items
+            if isinstance(value, dict):
+                return {key: summarize(item) for key, item in value.items()}
+            if isinstance(value, list):
+                if len(value) > keep:
+                    lists += 1
+                    items += len(value) - keep
+                    value = value[:keep]
+                return [summarize(item) for item in value]
+            return value
+
+        if isinstance(response, dict):
+            response = {
+                key: [summarize(item) for item in value] if key in skip and isinstance(value, list) else summarize(value)
+                for key, value in response.items()
+            }
+        else:
+            response = summarize(response)
+        if not lists:
+            return response, None
+        return response, {"step": "summarize_lists", "lists": lists, "items": items}
+    return step
+
+def shorten_strings(limit: int = SHORT_STRING_CHARS) -> Step:
+    """Step: cut long strings (messages, tracebacks) to limit characters"""
+    def step(response: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        count = 0
+
+        def shorten(value: Any) -> Any:
+            nonlocal count
+            if isinstance(value, str):
+                if len(value) > limit:
+                    count += 1
+                    return value[:limit] + "..."
+                return value
+            if isinstance(value, dict):
+                return {key: shorten(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [shorten(item) for item in value]
+            return value
+
+        response = shorten(response)
+        return response, ({"step": "shorten_strings", "strings": count, "max_chars": limit} if count else None)
+    return step
+
+def _apply(response: Any, steps: Sequence[Step]) -> Tuple[Any, List[Dict[str, Any]]]:
+    notes = []
+    for step in steps:
+        response, note = step(response)
+        if note:
+            notes.append(note)
+    return response, notes
+
+def _report(response: Any, elided: List[Dict[str, Any]], max_bytes: int, original_bytes: int) -> Dict[str, Any]:
+    """Attach what was elided and the budget to a degraded response"""
+    report = {"max_bytes": max_bytes, "bytes": 0, "original_bytes": original_bytes}
+    response = {**response, "elided": elided, "budget": report}
+    # Measure with the report included (twice, in case the size gained a digit)
+    report["bytes"] = estimate_bytes(response)
+    report["bytes"] = estimate_bytes(response)
+    return response
+
+async def fit_to_budget(
+    response: Any,
+    max_bytes: Optional[int],
+    steps: Sequence[Step] = (),
+    shrink: Optional[Callable[[int], Awaitable[Any]]] = None,
+    size: int = 0,
+    list_key: str = "results",
+    protect: Optional[Sequence[str]] = None
+) -> Any:
+    """
+    Degrade a response step by step until it fits a byte budget
+
+    The steps are tried in order, each on top of the previous ones, until
+    the response fits. If it still does not, the response is rebuilt by
+    `shrink` with fewer items of its main list (found by binary search), so
+    the continuation cursor comes from the tool that built it. Responses
+    without a main list can instead drop their largest top-level fields.
+
+    Args:
+        response: The complete response
+        max_bytes: The budget (see budget_bytes), or None for no budget
+        steps: Degradation steps, cheapest loss first
+        shrink: Optional coroutine returning the response for only the first
+                n items of its main list, including how to continue
+        size: Number of items in the main list of the complete response
+        list_key: Key of the main list; a list response is wrapped under it
+        protect: If given, the largest top-level fields not named here are
+                 dropped as a last resort
+
+    Returns:
+        The response unchanged if it fits; otherwise the degraded response
+        with "elided" (what each step left out) and "budget" (limit and
+        resulting size). If even that does not fit, {"error": "budget too
+        small", "min_bytes": N, "max_bytes": ...} with the smallest size
+        that could be returned, so nothing larger than asked for is sent.
+    """
+    if max_bytes is None:
+        return response
+    original_bytes = estimate_bytes(response)
+    if original_bytes <= max_bytes:
+        return response
+    if isinstance(response, list):
+        response = {list_key: response}
+
+    def fits(candidate: Any, notes: List[Dict[str, Any]]) -> bool:
+        return estimate_bytes(_report(candidate, notes, max_bytes, original_bytes)) <= max_bytes
+
+    applied: List[Step] = []
+    elided: List[Dict[str, Any]] = []
+    for step in steps:
+        response, note = step(response)
+        applied.append(step)
+        if note:
+            elided.append(note)
+        if fits(response, elided):
+            break
+
+    if not fits(response, elided) and shrink is not None and size > 1:
+        best: Optional[Tuple[Any, List[Dict[str, Any]]]] = None
+        low, high = 1, size - 1
+        while low <= high:
+            count = (low + high) // 2
+            candidate = await shrink(count)
+            if isinstance(candidate, list):
+                candidate = {list_key: candidate}
+            candidate, notes = _apply(candidate, applied)
+            notes.append({"step": "truncate", "kept": count, "of": size})
+            if fits(candidate, notes):
+                best = (candidate, notes)
+                low = count + 1
+            else:
+                high = count - 1
+        if best is None:
+            # Not even one item fits; one item is the smallest that can be reported
+            candidate = await shrink(1)
+            if isinstance(candidate, list):
+                candidate = {list_key: candidate}
+            candidate, notes = _apply(candidate, applied)
+            notes.append({"step": "truncate", "kept": 1, "of": size})
+            best = (candidate, notes)
+        response, elided = best
+
+    if protect is not None and not fits(response, elided):
+        fields = sorted(
+            (key for key in response if key not in protect),
+            key=lambda key: estimate_bytes(response[key]),
+            reverse=True
+        )
+        dropped: List[str] = []
+        note = {"step": "drop_fields", "fields": dropped}
+        for key in fields:
+            response = {name: value for name, value in response.items() if name != key}
+            dropped.append(key)
+            if fits(response, elided + [note]):
+                break
+        elided.append(note)
+
+    smallest = original_bytes
+    if elided:
+        degraded = _report(response, elided, max_bytes, original_bytes)
+        degraded_bytes = estimate_bytes(degraded)
+        if degraded_bytes <= max_bytes:
+            return degraded
+        smallest = min(smallest, degraded_bytes)
+    return {"error": "budget too small", "min_bytes": smallest, "max_bytes": max_bytes}
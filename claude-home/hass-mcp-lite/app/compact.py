@@ -0,0 +1,291 @@
+import sys
+import logging
+from collections.abc import Mapping
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Strings up to this length (states, timestamps, short attribute values) are interned
+MAX_INTERNED_LENGTH = 64
+
+# Attribute values shorter than this are shared between entities
+MAX_SHARED_ATTRIBUTE_LENGTH = 32
+
+# Attributes whose values are (nearly) unique per entity and never worth sharing
+UNIQUE_ATTRIBUTES = ("friendly_name", "id", "entity_picture", "media_title", "media_content_id")
+
+# Distinct attribute key tuples shared between entities; beyond this many
+# shapes, new ones are still used but no longer registered
+MAX_SHAPES = 8192
+
+# Top-level keys of a state object, in the order Home Assistant sends them
+STATE_KEYS = ("entity_id", "state", "attributes", "last_changed", "last_reported", "last_updated", "context")
+
+# Lists of scalars (supported_color_modes, hvac_modes, source_list, ...) are
+# stored as shared tuples; at most this many distinct ones are registered
+MAX_SHARED_VALUES = 16384
+
+_shared_values: Dict[Tuple[Any, ...], Tuple[Any, ...]] = {}
+
+def _intern(value: Any) -> Any:
+    """Return the interned copy of a short string"""
+    if type(value) is str and len(value) <= MAX_INTERNED_LENGTH:
+        return sys.intern(value)
+    return value
+
+def _share(key: str, value: Any) -> Any:
+    """Return a shared copy of a short attribute string or a list of scalars"""
+    kind = type(value)
+    if kind is str:
+        if len(value) < MAX_SHARED_ATTRIBUTE_LENGTH and key not in UNIQUE_ATTRIBUTES:
+            return sys.intern(value)
+        return value
+    if kind is list and len(value) <= MAX_INTERNED_LENGTH:
+        if any(type(item) in (list, dict) for item in value):
+            # Only lists of scalars are shared; a nested list would come back as a tuple
+            return value
+        frozen = tuple(_share(key, item) for item in value)
+        shared = _shared_values.get(frozen)
+        if shared is not None:
+            return shared
+        if len(_shared_values) < MAX_SHARED_VALUES:
+            _shared_values[frozen] = frozen
+        return frozen
+    return value
+
+def _thaw(value: Any) -> Any:
+    # JSON has no tuples, so a tuple is always a shared list
+    return list(value) if type(value) is tuple else value
+
+class AttributeShape:
+    """An interned tuple of attribute keys with a key -> position index"""
+
+    __slots__ = ("keys", "index")
+
+    def __init__(self, keys: Tuple[str, ...]):
+        self.keys = keys
+        self.index = {key: position for position, key in enumerate(keys)}
+
+_shapes: Dict[Tuple[str, ...], AttributeShape] = {}
+
+def attribute_shape(keys: Tuple[str, ...]) -> AttributeShape:
+    """Return the shared shape for a tuple of attribute keys"""
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = AttributeShape(tuple(sys.intern(key) for key in keys))
+        if len(_shapes) < MAX_SHAPES:
+            _shapes[shape.keys] = shape
+    return shape
+
+def shape_count() -> int:
+    """Return the number of registered attribute shapes"""
+    return len(_shapes)
+
+class Attributes(Mapping):
+    """
+    Read-only attribute mapping stored as a shared key shape plus a value tuple
+
+    Entities of the same kind have the same attribute keys, so the keys and
+    their index are held once per shape instead of once per entity. Short
+    strings and lists of scalars are shared between entities; shared lists
+    are stored as tuples and handed out as fresh lists.
+    """
+
+    __slots__ = ("shape", "values")
+
+    def __init__(self, shape: AttributeShape, values: Tuple[Any, ...]):
+        self.shape = shape
+        self.values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return _thaw(self.values[self.shape.index[key]])
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self.shape.index.get(key)
+        return default if position is None else _thaw(self.values[position])
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.shape.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.shape.keys)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Attributes):
+            return self.shape.keys == other.shape.keys and self.values == other.values
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the attributes as a plain dictionary"""
+        return {key: _thaw(value) for key, value in zip(self.shape.keys, self.values)}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+_EMPTY_SHAPE = attribute_shape(())
+
+def compact_attributes(attributes: Optional[Mapping]) -> Tuple[AttributeShape, Tuple[Any, ...]]:
+    """Convert an attribute dictionary to its (shape, values) form"""
+    if isinstance(attributes, Attributes):
+        return attributes.shape, attributes.values
+    if not attributes:
+        return _EMPTY_SHAPE, ()
+    return (
+        attribute_shape(tuple(attributes)),
+        tuple(_share(key, value) for key, value in attributes.items())
+    )
+
+class CompactEntity(Mapping):
+    """
+    Read-only, slot-based form of a state object as held by the EntityStore
+
+    Behaves like the state dictionary it was built from (entity["state"],
+    entity.get("attributes"), iteration in Home Assistant's key order). The
+    state and timestamps are interned (entity IDs are unique, so they are not), attributes are kept as a
+    shared shape plus a value tuple (entity["attributes"] is a light
+    Attributes view over them) and context is only kept when asked for. Use
+    to_dict() (or plain()) before handing an entity to anything that
+    serializes it.
+    """
+
+    __slots__ = ("entity_id", "state", "shape", "values", "last_changed", "last_reported", "last_updated",
+                 "context", "extra")
+
+    def __init__(
+        self,
+        entity_id: str,
+        state: Any,
+        shape: AttributeShape,
+        values: Tuple[Any, ...],
+        last_changed: Optional[str] = None,
+        last_reported: Optional[str] = None,
+        last_updated: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.entity_id = entity_id
+        self.state = state
+        self.shape = shape
+        self.values = values
+        self.last_changed = last_changed
+        self.last_reported = last_reported
+        self.last_updated = last_updated
+        self.context = context
+        self.extra = extra
+
+    @property
+    def attributes(self) -> Attributes:
+        return Attributes(self.shape, self.values)
+
+    def _has(self, key: str) -> bool:
+        # entity_id, state and attributes are always present; the rest only when set
+        return key in ("entity_id", "state", "attributes") or getattr(self, key) is not None
+
+    def __getitem__(self, key: str) -> Any:
+        if key in STATE_KEYS:
+            if self._has(key):
+                return getattr(self, key)
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        if key in STATE_KEYS:
+            return self._has(key)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key in STATE_KEYS:
+            if self._has(key):
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactEntity):
+            return (
+                self.entity_id == other.entity_id
+                and self.state == other.state
+                and self.last_updated == other.last_updated
+                and self.last_changed == other.last_changed
+                and self.last_reported == other.last_reported
+                and self.shape.keys == other.shape.keys
+                and self.values == other.values
+                and self.context == other.context
+                and self.extra == other.extra
+            )
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the state as a plain dictionary (as /api/states would)"""
+        result: Dict[str, Any] = {}
+        for key in self:
+            value = self[key]
+            result[key] = value.to_dict() if isinstance(value, Attributes) else value
+        return result
+
+    def __repr__(self) -> str:
+        return f"CompactEntity({self.to_dict()!r})"
+
+def compact_entity(data: Mapping, keep_context: bool = False) -> CompactEntity:
+    """
+    Convert a state object to its compact form
+
+    Args:
+        data: A state dictionary (or an existing CompactEntity, returned as is)
+        keep_context: If False, the context is dropped
+
+    Returns:
+        The compact entity
+    """
+    if isinstance(data, CompactEntity):
+        if data.context is not None and not keep_context:
+            data = CompactEntity(data.entity_id, data.state, data.shape, data.values, data.last_changed,
+                                 data.last_reported, data.last_updated, None, data.extra)
+        return data
+
+    shape, values = compact_attributes(data.get("attributes"))
+    extra = {key: value for key, value in data.items() if key not in STATE_KEYS} or None
+
+    # Timestamps repeat across entities (everything changed at startup) and
+    # within one (reported, updated and changed at the same instant)
+    return CompactEntity(
+        data["entity_id"],
+        _intern(data.get("state")),
+        shape,
+        values,
+        _intern(data.get("last_changed")),
+        _intern(data.get("last_reported")),
+        _intern(data.get("last_updated")),
+        data.get("context") if keep_context else None,
+        extra
+    )
+
+def plain(entity: Mapping) -> Dict[str, Any]:
+    """Return a state (compact or not) as a plain dictionary for a response"""
+    if isinstance(entity, CompactEntity):
+        return entity.to_dict()
+    return entity
+
+def plain_attributes(attributes: Mapping) -> Dict[str, Any]:
+    """Return attributes (compact or not) as a plain dictionary for a response"""
+    if isinstance(attributes, Attributes):
+        return attributes.to_dict()
+    return attributes
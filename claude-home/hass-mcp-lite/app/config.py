@@ -5,6 +5,72 @@ from typing import Optional
 HA_URL: str = os.environ.get("HA_URL", "http://localhost:8123")
 HA_TOKEN: str = os.environ.get("HA_TOKEN", "")
 
+# WebSocket entity mirror (set HA_MIRROR=false to always use the REST API)
+HA_WS_URL: str = os.environ.get("HA_WS_URL", "")
+HA_MIRROR_ENABLED: bool = os.environ.get("HA_MIRROR", "true").lower() not in ("0", "false", "no", "off")
+
+# Default number of seconds a REST snapshot may be served from the entity cache
+HA_CACHE_MAX_AGE: float = float(os.environ.get("HA_CACHE_MAX_AGE", "10"))
+
+# Seconds a completed GET may be handed to callers that ask for the same URL
+# (identical in-flight GETs are always shared)
+HA_COALESCE_WINDOW: float = float(os.environ.get("HA_COALESCE_WINDOW", "0.5"))
+
+# Default point budget for reduced entity history
+HA_HISTORY_MAX_POINTS: int = int(os.environ.get("HA_HISTORY_MAX_POINTS", "200"))
+
+# History segment cache: directory under the add-on's persistent /data (empty
+# keeps it in memory only) and the maximum number of cached history points
+HA_HISTORY_CACHE_DIR: str = os.environ.get(
+    "HA_HISTORY_CACHE_DIR", "/data/hass-mcp/history" if os.path.isdir("/data") else ""
+)
+HA_HISTORY_CACHE_MAX_POINTS: int = int(os.environ.get("HA_HISTORY_CACHE_MAX_POINTS", "200000"))
+
+# Maximum number of service calls bulk_call_service runs at the same time
+HA_BULK_CONCURRENCY: int = int(os.environ.get("HA_BULK_CONCURRENCY", "4"))
+
+# Decode /api/states incrementally while it downloads (set HA_STREAM_STATES=false to disable)
+HA_STREAM_STATES: bool = os.environ.get("HA_STREAM_STATES", "true").lower() not in ("0", "false", "no", "off")
+
+# Hold cached states as compact records (set HA_COMPACT_STATES=false for plain
+# dictionaries). Context is dropped unless HA_KEEP_CONTEXT is set; entities
+# requested with the "context" field are then fetched from Home Assistant.
+HA_COMPACT_STATES: bool = os.environ.get("HA_COMPACT_STATES", "true").lower() not in ("0", "false", "no", "off")
+HA_KEEP_CONTEXT: bool = os.environ.get("HA_KEEP_CONTEXT", "false").lower() not in ("0", "false", "no", "off")
+
+# Maximum total characters of rendered hass:// resources kept for re-reads
+HA_RENDER_CACHE_MAX_CHARS: int = int(os.environ.get("HA_RENDER_CACHE_MAX_CHARS", "4000000"))
+
+# Connection pool to Home Assistant: maximum connections, idle connections kept
+# alive and seconds before an idle one is closed
+HA_POOL_MAX_CONNECTIONS: int = int(os.environ.get("HA_POOL_MAX_CONNECTIONS", "20"))
+HA_POOL_MAX_KEEPALIVE: int = int(os.environ.get("HA_POOL_MAX_KEEPALIVE", "10"))
+HA_POOL_KEEPALIVE_EXPIRY: float = float(os.environ.get("HA_POOL_KEEPALIVE_EXPIRY", "30"))
+
+# HTTP/2 to Home Assistant: "auto" uses it when the h2 package is installed
+# (the "http2" extra) and HA_URL is https; over plain http it is never used
+HA_HTTP2: str = os.environ.get("HA_HTTP2", "auto").lower()
+
+# Seconds to connect and to wait for a free pooled connection, and read
+# timeouts per endpoint class
+HA_CONNECT_TIMEOUT: float = float(os.environ.get("HA_CONNECT_TIMEOUT", "5"))
+HA_POOL_TIMEOUT: float = float(os.environ.get("HA_POOL_TIMEOUT", "10"))
+HA_TIMEOUT_STATES: float = float(os.environ.get("HA_TIMEOUT_STATES", "10"))
+HA_TIMEOUT_ERROR_LOG: float = float(os.environ.get("HA_TIMEOUT_ERROR_LOG", "30"))
+HA_TIMEOUT_SERVICES: float = float(os.environ.get("HA_TIMEOUT_SERVICES", "10"))
+
+# Transport of python -m app: "stdio" (one session per process) or "sse" to
+# serve many sessions from one process on HA_MCP_HOST:HA_MCP_PORT, or on the
+# unix socket HA_MCP_SOCKET when set
+HA_MCP_TRANSPORT: str = os.environ.get("HA_MCP_TRANSPORT", "stdio").lower()
+HA_MCP_HOST: str = os.environ.get("HA_MCP_HOST", "127.0.0.1")
+HA_MCP_PORT: int = int(os.environ.get("HA_MCP_PORT", "8765"))
+HA_MCP_SOCKET: str = os.environ.get("HA_MCP_SOCKET", "")
+
+# Maximum tool calls and resource reads one MCP session runs at the same time
+# (0 for no limit)
+HA_SESSION_CONCURRENCY: int = int(os.environ.get("HA_SESSION_CONCURRENCY", "4"))
+
 def get_ha_headers() -> dict:
     """Return the headers needed for Home Assistant API requests"""
     headers = {
@@ -16,3 +82,23 @@ def get_ha_headers() -> dict:
         headers["Authorization"] = f"Bearer {HA_TOKEN}"
     
     return headers
+
+def get_ha_ws_url() -> str:
+    """
+    Return the Home Assistant WebSocket API URL
+
+    Uses HA_WS_URL when set, otherwise derives it from HA_URL. The supervisor
+    proxy exposes the socket at /core/websocket instead of /api/websocket.
+    """
+    if HA_WS_URL:
+        return HA_WS_URL
+
+    base = HA_URL.rstrip("/")
+    if base.startswith("https://"):
+        base = "wss://" + base[len("https://"):]
+    elif base.startswith("http://"):
+        base = "ws://" + base[len("http://"):]
+
+    if base.endswith("/core"):
+        return f"{base}/websocket"
+    return f"{base}/api/websocket"
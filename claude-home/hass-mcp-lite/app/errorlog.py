@@ -0,0 +1,358 @@
+import re
+import bisect
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, Any, Optional, List, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Record header: "2024-01-01 12:00:00.123 ERROR (MainThread) [homeassistant.components.mqtt] message"
+RECORD_PATTERN = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?)\s+"
+    r"(DEBUG|INFO|WARNING|ERROR|CRITICAL|FATAL)\s+"
+    r"\(([^)]*)\)\s+\[([^\]]+)\]\s?(.*)$"
+)
+
+# Volatile parts of messages replaced before fingerprinting
+NORMALIZE_PATTERNS = (
+    (re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"), "<uuid>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    (re.compile(r"\b[0-9A-HJKMNP-TV-Z]{26}\b"), "<ulid>"),
+    (re.compile(r"\b[0-9a-fA-F]{12,}\b"), "<id>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+)
+
+# Severity order used for minimum-level filters
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50, "FATAL": 50}
+
+# Occurrence timestamps kept per group for "since" counts
+MAX_OCCURRENCES = 1000
+
+# Traceback lines kept for a group's example record
+MAX_TRACEBACK_LINES = 40
+
+# Bytes before the saved offset that are fetched again and compared, to
+# detect a log that was replaced (Home Assistant restart) rather than grown
+OVERLAP_BYTES = 256
+
+# Lines kept in memory for paging; older lines are dropped (counters keep them)
+MAX_LINES = 20000
+
+def integration_of(logger_name: str) -> str:
+    """Map a logger name to its integration (homeassistant.components.mqtt.client -> mqtt)"""
+    parts = logger_name.split(".")
+    if len(parts) >= 3 and parts[0] in ("homeassistant", "custom_components") and parts[1] == "components":
+        return parts[2]
+    if len(parts) >= 2 and parts[0] == "custom_components":
+        return parts[1]
+    if parts[0] == "homeassistant":
+        return parts[1] if len(parts) > 1 else "homeassistant"
+    return parts[0]
+
+def fingerprint(level: str, logger_name: str, message: str) -> str:
+    """Identify repeats of a record regardless of numbers and ids in its message"""
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return hashlib.sha1(f"{level}|{logger_name}|{message}".encode()).hexdigest()[:12]
+
+def normalize_timestamp(value: str) -> str:
+    """Bring a user-supplied time ("2024-01-01T12:00") into log timestamp form"""
+    return value.strip().replace("T", " ")
+
+class ErrorLogGroup:
+    """All records of the log sharing one fingerprint"""
+
+    __slots__ = (
+        "fingerprint", "level", "logger", "integration", "message",
+        "traceback", "count", "first_seen", "last_seen", "occurrences"
+    )
+
+    def __init__(self, key: str, timestamp: str, level: str, logger_name: str, message: str):
+        self.fingerprint = key
+        self.level = level
+        self.logger = logger_name
+        self.integration = integration_of(logger_name)
+        self.message = message
+        self.traceback: List[str] = []
+        self.count = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.occurrences: List[str] = []
+
+    def add(self, timestamp: str) -> None:
+        self.count += 1
+        self.last_seen = timestamp
+        self.occurrences.append(timestamp)
+        if len(self.occurrences) > MAX_OCCURRENCES:
+            del self.occurrences[:len(self.occurrences) - MAX_OCCURRENCES]
+
+    def count_since(self, since: str) -> int:
+        """Occurrences at or after since (all of them when since predates the kept ones)"""
+        if not self.occurrences or since <= self.occurrences[0]:
+            return self.count
+        return len(self.occurrences) - bisect.bisect_left(self.occurrences, since)
+
+    def to_dict(self, since: Optional[str] = None) -> Dict[str, Any]:
+        result = {
+            "fingerprint": self.fingerprint,
+            "level": self.level,
+            "integration": self.integration,
+            "logger": self.logger,
+            "message": self.message,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+        if since:
+            result["count_since"] = self.count_since(since)
+        if self.traceback:
+            result["traceback"] = "\n".join(self.traceback)
+        return result
+
+class ErrorLogIndex:
+    """
+    Structured records of the error log, grouped by fingerprint
+
+    Lines are fed in order. A line starting with a timestamp, level, thread
+    and logger opens a record; other lines are its traceback. Each record is
+    counted in the group of its fingerprint (level, logger and the message
+    with numbers and ids normalised); the group keeps the first record's
+    message and traceback as its example.
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, ErrorLogGroup] = {}
+        self.levels: Counter = Counter()
+        self.integrations: Counter = Counter()
+        self.records = 0
+        self._open: Optional[ErrorLogGroup] = None
+
+    def add_line(self, line: str) -> None:
+        """Feed the next complete log line"""
+        match = RECORD_PATTERN.match(line)
+        if match is None:
+            # Traceback or message continuation of the open record; only the
+            # first record of a group keeps its traceback as the example
+            group = self._open
+            if group is not None and len(group.traceback) < MAX_TRACEBACK_LINES:
+                group.traceback.append(line)
+            return
+
+        timestamp, level, _, logger_name, message = match.groups()
+        timestamp = normalize_timestamp(timestamp)
+        key = fingerprint(level, logger_name, message)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = ErrorLogGroup(key, timestamp, level, logger_name, message)
+            self._open = group
+        else:
+            self._open = None
+        group.add(timestamp)
+        self.records += 1
+        self.levels[level] += 1
+        self.integrations[group.integration] += 1
+
+    def search(
+        self,
+        level: Optional[str] = None,
+        integration: Optional[str] = None,
+        since: Optional[str] = None,
+        text: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Query the groups
+
+        Args:
+            level: Minimum level (e.g. "WARNING" also returns ERROR and CRITICAL)
+            integration: Integration or logger prefix (e.g. "mqtt", "homeassistant.core")
+            since: Only groups seen at or after this time ("YYYY-MM-DD HH:MM:SS")
+            text: Case-insensitive text to find in the message or traceback
+            limit: Maximum number of groups
+
+        Returns:
+            (groups as dictionaries, most recently seen first; total matching groups)
+        """
+        min_level = LEVELS.get(level.upper(), 0) if level else 0
+        integration = integration.lower() if integration else None
+        since = normalize_timestamp(since) if since else None
+        text = text.lower() if text else None
+
+        matches = []
+        for group in self.groups.values():
+            if LEVELS.get(group.level, 0) < min_level:
+                continue
+            if integration and group.integration != integration and not group.logger.startswith(integration):
+                continue
+            if since and group.last_seen < since:
+                continue
+            if text and text not in group.message.lower() and not any(
+                text in line.lower() for line in group.traceback
+            ):
+                continue
+            matches.append(group)
+
+        matches.sort(key=lambda group: (group.last_seen, group.count), reverse=True)
+        return [group.to_dict(since) for group in matches[:max(limit, 0)]], len(matches)
+
+class ErrorLogFollower:
+    """
+    Incremental reader of the Home Assistant error log
+
+    The follower remembers how many bytes it has consumed and the last bytes
+    before that offset. Each refresh requests only the bytes after the offset
+    (plus that overlap) with a Range header; when the overlap no longer
+    matches, or the log is shorter than the offset, the log was recreated
+    and is read again from the start. New lines are fed to an ErrorLogIndex,
+    so counters and record groups are updated from new lines only.
+
+    Lines are numbered from the start of the current log. Each new log gets
+    a new generation, so cursors from a previous log are recognised.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.offset = 0
+        self._tail = b""
+        self._partial = b""
+        self._lines: List[str] = []
+        self._first_line = 0
+        self.index = ErrorLogIndex()
+        self.last_new_lines = 0
+        self.last_fetched_bytes = 0
+
+    @property
+    def total_lines(self) -> int:
+        """Number of complete lines read from the current log"""
+        return self._first_line + len(self._lines)
+
+    def reset(self) -> None:
+        """Forget the current log and start a new generation"""
+        self.generation += 1
+        self.offset = 0
+        self._tail = b""
+        self._partial = b""
+        self._lines = []
+        self._first_line = 0
+        self.index = ErrorLogIndex()
+
+    def range_header(self) -> Optional[str]:
+        """Return the Range header for the next fetch, or None for a full read"""
+        if self.offset == 0:
+            return None
+        return f"bytes={max(self.offset - OVERLAP_BYTES, 0)}-"
+
+    def apply(self, status_code: int, content: bytes, content_range: Optional[str] = None) -> Optional[int]:
+        """
+        Consume the response to a fetch made with range_header()
+
+        Args:
+            status_code: 200 (full log), 206 (partial) or 416 (range beyond the end)
+            content: The response body
+            content_range: The Content-Range header of a 206 response
+
+        Returns:
+            The number of new complete lines, or None when the log was
+            replaced and has to be fetched again from the start
+        """
+        if status_code == 416:
+            # The log is shorter than what we have read: it was recreated
+            self.reset()
+            return None
+
+        if status_code == 206:
+            start = self._range_start(content_range)
+            if start is None or start > self.offset:
+                self.reset()
+                return None
+            overlap = content[:self.offset - start]
+            new_bytes = content[self.offset - start:]
+        elif self.offset and len(content) >= self.offset:
+            # The server ignored the Range header; only the new part is parsed
+            overlap = content[max(self.offset - OVERLAP_BYTES, 0):self.offset]
+            new_bytes = content[self.offset:]
+        else:
+            overlap, new_bytes = b"", content
+
+        if self.offset and overlap != self._tail:
+            self.reset()
+            if status_code == 206:
+                return None
+            new_bytes = content
+
+        self.last_fetched_bytes = len(content)
+        return self._consume(new_bytes)
+
+    @staticmethod
+    def _range_start(content_range: Optional[str]) -> Optional[int]:
+        """Parse the first byte position from 'bytes start-end/total'"""
+        if not content_range or not content_range.startswith("bytes "):
+            return None
+        try:
+            return int(content_range[6:].split("-", 1)[0])
+        except ValueError:
+            return None
+
+    def _consume(self, new_bytes: bytes) -> int:
+        """Split new bytes into lines and update the counters"""
+        self.offset += len(new_bytes)
+        self._tail = (self._tail + new_bytes)[-OVERLAP_BYTES:]
+
+        data = self._partial + new_bytes
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._partial = data
+            self.last_new_lines = 0
+            return 0
+        self._partial = data[end + 1:]
+
+        lines = data[:end].decode("utf-8", errors="replace").split("\n")
+        add_line = self.index.add_line
+        for line in lines:
+            add_line(line)
+
+        self._lines.extend(lines)
+        if len(self._lines) > MAX_LINES:
+            dropped = len(self._lines) - MAX_LINES
+            del self._lines[:dropped]
+            self._first_line += dropped
+        self.last_new_lines = len(lines)
+        return len(lines)
+
+    def page(
+        self,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Tuple[int, str]], Optional[int]]:
+        """
+        Return up to limit lines, newest first
+
+        Args:
+            limit: Maximum number of lines
+            before: Only lines numbered below this (continues a previous page)
+            after: Only lines numbered at or above this (follow mode)
+
+        Returns:
+            ([(line_number, text), ...], next_before) where next_before is None
+            when there are no older lines in range
+        """
+        upper = self.total_lines if before is None else min(before, self.total_lines)
+        lower = max(self._first_line, after or 0)
+        start = max(upper - max(limit, 0), lower)
+        lines = [(number, self._lines[number - self._first_line]) for number in range(upper - 1, start - 1, -1)]
+        return lines, (start if start > lower else None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the running counters"""
+        index = self.index
+        return {
+            "error_count": index.levels["ERROR"] + index.levels["CRITICAL"] + index.levels["FATAL"],
+            "warning_count": index.levels["WARNING"],
+            "integration_mentions": dict(index.integrations.most_common()),
+            "record_groups": len(index.groups),
+            "total_lines": self.total_lines,
+            "log_size": self.offset,
+        }
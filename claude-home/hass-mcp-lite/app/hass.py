@@ -1,10 +1,34 @@
 import httpx
-from typing import Dict, Any, Optional, List, TypeVar, Callable, Awaitable, Union, cast
+from typing import Dict, Any, Optional, List, Set, Tuple, TypeVar, Callable, Awaitable, Union, cast
+import asyncio
 import functools
 import inspect
+import json
 import logging
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from urllib.parse import quote, urlencode
 
-from .config import HA_URL, HA_TOKEN, get_ha_headers
+from .aggregates import EntityAggregates
+from .compact import plain
+from .config import (
+    HA_URL, HA_TOKEN, HA_MIRROR_ENABLED, HA_CACHE_MAX_AGE, HA_STREAM_STATES, HA_COALESCE_WINDOW,
+    HA_HISTORY_MAX_POINTS, HA_HISTORY_CACHE_DIR, HA_HISTORY_CACHE_MAX_POINTS, HA_BULK_CONCURRENCY,
+    HA_COMPACT_STATES, HA_KEEP_CONTEXT,
+    get_ha_ws_url
+)
+from .errorlog import ErrorLogFollower
+from .history import Point, history_points, reduce_history
+from .history_cache import HistoryCache
+from .jsonstream import JSONArrayStream
+from .mirror import EntityMirror
+from .pagination import cursor_scope, encode_cursor, decode_cursor, page_after
+from .projection import Projection, compile_projection
+from .reconcile import plan_states
+from .search import SearchIndex
+from .store import EntityStore, StoreListener
+from .transport import PooledTransport, create_client, endpoint_timeout, http2_enabled
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -13,8 +37,52 @@ logger = logging.getLogger(__name__)
 T = TypeVar('T')
 F = TypeVar('F', bound=Callable[..., Awaitable[Any]])
 
-# HTTP client
+# HTTP client and its connection pool
 _client: Optional[httpx.AsyncClient] = None
+_transport: Optional[PooledTransport] = None
+
+# Single-flight GETs: requests in progress and recently completed results,
+# keyed by (method, url, token)
+_inflight: Dict[Tuple[str, str, str], "asyncio.Future[Any]"] = {}
+_recent: Dict[Tuple[str, str, str], Tuple[float, Any]] = {}
+_request_stats = {"requests": 0, "shared": 0, "reused": 0}
+
+# Most completed GET results kept for reuse (oldest are dropped first)
+RECENT_MAX_ENTRIES = 64
+
+# Bumped by every write; results of GETs started before a write are not reused
+_write_generation = 0
+
+# Entity state cache shared by all read paths
+_store = EntityStore(compact=HA_COMPACT_STATES, keep_context=HA_KEEP_CONTEXT)
+
+# Search index kept in sync with the cache
+_search_index = SearchIndex()
+_store.add_listener(_search_index.update)
+
+# Per-domain counters kept in sync with the cache
+_aggregates = EntityAggregates()
+_store.add_listener(_aggregates.update)
+
+# WebSocket entity mirror (keeps _store live while connected)
+_mirror: Optional[EntityMirror] = None
+
+# Incremental reader of /api/error_log; the lock serializes refreshes
+_error_log = ErrorLogFollower()
+_error_log_lock = asyncio.Lock()
+
+# Cache of fetched history ranges (created on first use)
+_history_cache: Optional[HistoryCache] = None
+
+# Without the mirror, invalidated entities are refetched one by one up to this
+# count; beyond it a full /api/states snapshot is cheaper
+MAX_PARTIAL_REFETCH = 20
+
+# Text that starts every item of the /api/states array (compact JSON)
+STATE_ITEM_HINT = '{"entity_id":'
+
+# Service data keys that target entities indirectly
+INDIRECT_TARGET_KEYS = ("area_id", "device_id", "floor_id", "label_id")
 
 # Default field sets for different verbosity levels
 # Lean fields for standard requests (optimized for token efficiency)
@@ -88,30 +156,275 @@ def handle_api_errors(func: F) -> F:
 # Persistent HTTP client
 async def get_client() -> httpx.AsyncClient:
     """Get a persistent httpx client for Home Assistant API calls"""
-    global _client
+    global _client, _transport
     if _client is None:
         logger.debug("Creating new HTTP client")
-        _client = httpx.AsyncClient(timeout=10.0)
+        _transport = PooledTransport(http2=http2_enabled())
+        _client = create_client(_transport)
     return _client
 
 async def cleanup_client() -> None:
-    """Close the HTTP client when shutting down"""
-    global _client
+    """Close the HTTP client and entity mirror when shutting down"""
+    global _client, _transport, _mirror
+    if _mirror:
+        logger.debug("Stopping entity mirror")
+        await _mirror.stop()
+        _mirror = None
     if _client:
         logger.debug("Closing HTTP client")
         await _client.aclose()
         _client = None
+        _transport = None
+
+def get_mirror() -> Optional[EntityMirror]:
+    """
+    Get the WebSocket entity mirror, starting it on first use
+
+    Returns:
+        The mirror (which may still be connecting), or None when disabled
+    """
+    global _mirror
+    if not HA_MIRROR_ENABLED or not HA_TOKEN:
+        return None
+    if _mirror is None:
+        _mirror = EntityMirror(get_ha_ws_url(), HA_TOKEN, _store)
+    # (Re)start the background task; this is a no-op while it is running
+    _mirror.start()
+    return _mirror
+
+def add_state_listener(listener: StoreListener) -> None:
+    """
+    Register a callback for entity additions, changes and removals
+
+    Listeners are called with (entity_id, old state, new state), where a
+    missing state is None, and only for entities that actually changed.
+    """
+    _store.add_listener(listener)
+
+def get_history_cache() -> HistoryCache:
+    """Get the history segment cache, creating (and loading) it on first use"""
+    global _history_cache
+    if _history_cache is None:
+        _history_cache = HistoryCache(HA_HISTORY_CACHE_DIR or None, HA_HISTORY_CACHE_MAX_POINTS)
+    return _history_cache
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Return entity cache hit/miss counters and snapshot metadata"""
+    stats = _store.stats()
+    if _history_cache is not None:
+        stats["history"] = _history_cache.stats()
+    return stats
+
+def get_request_stats() -> Dict[str, Any]:
+    """Return counters for GETs sent, shared while in flight, and reused"""
+    return {**_request_stats, "in_flight": len(_inflight)}
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return connection pool usage (in use, idle, waits) of the HTTP client"""
+    if _transport is None:
+        return {"connections": 0}
+    return _transport.stats()
+
+def _remember(key: Tuple[str, str, str], result: Any) -> None:
+    """Keep a completed result for reuse, dropping expired and surplus entries"""
+    now = time.monotonic()
+    _recent.pop(key, None)
+    _recent[key] = (now, result)
+    # Entries are in completion order, so expired ones are at the front
+    for old_key, (completed, _) in list(_recent.items()):
+        if len(_recent) > RECENT_MAX_ENTRIES or now - completed > HA_COALESCE_WINDOW:
+            del _recent[old_key]
+        else:
+            break
+
+async def _single_flight(
+    method: str,
+    url: str,
+    fetch: Callable[[], Awaitable[T]],
+    reuse: bool = True
+) -> T:
+    """
+    Run fetch once for all concurrent callers asking for the same request
+    
+    Callers that arrive while the request is in flight await the same
+    future; callers within HA_COALESCE_WINDOW seconds after it completed get
+    its result (at most RECENT_MAX_ENTRIES results are kept). Failures are
+    shared with the callers already waiting but are never reused. The
+    request runs in its own task, so a cancelled caller does not cancel it
+    for the others.
+    
+    Args:
+        method: The HTTP method (part of the key)
+        url: The request URL (part of the key)
+        fetch: Coroutine function performing the request and its side effects
+        reuse: Keep the result for callers arriving after it completed; off
+               for URLs that are unique per call (e.g. ending at "now")
+        
+    Returns:
+        The result of fetch
+    """
+    key = (method, url, HA_TOKEN)
+    now = time.monotonic()
+    recent = _recent.get(key)
+    if recent is not None:
+        if now - recent[0] <= HA_COALESCE_WINDOW:
+            _request_stats["reused"] += 1
+            return recent[1]
+        del _recent[key]
+    
+    task = _inflight.get(key)
+    if task is None:
+        _request_stats["requests"] += 1
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+        generation = _write_generation
+        
+        def finish(done: "asyncio.Future[Any]") -> None:
+            if _inflight.get(key) is done:
+                del _inflight[key]
+            if done.cancelled() or done.exception() is not None:
+                return
+            if reuse and HA_COALESCE_WINDOW > 0 and generation == _write_generation:
+                _remember(key, done.result())
+        
+        task.add_done_callback(finish)
+    else:
+        _request_stats["shared"] += 1
+    return await asyncio.shield(task)
+
+def _forget_recent() -> None:
+    """Drop reusable GET results after a write so later reads see its effects"""
+    global _write_generation
+    _write_generation += 1
+    _recent.clear()
+
+async def _fetch_entity(entity_id: str) -> Dict[str, Any]:
+    """
+    Fetch a single entity over REST (coalesced) and store it in the cache
+
+    While the mirror is live, a cached entity that is no longer invalidated
+    when the response arrives has been updated by the mirror in the meantime,
+    and that newer state is kept.
+    """
+    url = f"/api/states/{entity_id}"
+    
+    async def fetch() -> Dict[str, Any]:
+        client = await get_client()
+        response = await client.get(url)
+        if response.status_code == 404:
+            _store.remove(entity_id)
+        response.raise_for_status()
+        entity_data = response.json()
+        if not (_store.live and entity_id in _store and entity_id not in _store.invalidated):
+            _store.upsert(entity_data)
+        return entity_data
+    
+    return await _single_flight("GET", url, fetch)
+
+async def _refetch_invalidated() -> None:
+    """Refetch invalidated entities individually instead of a full snapshot"""
+    entity_ids = list(_store.invalidated)
+    results = await asyncio.gather(
+        *(_fetch_entity(entity_id) for entity_id in entity_ids),
+        return_exceptions=True
+    )
+    for entity_id, result in zip(entity_ids, results):
+        if isinstance(result, httpx.HTTPStatusError) and result.response.status_code == 404:
+            continue
+        if isinstance(result, Exception):
+            raise result
+
+async def _get_state_list(
+    max_age: Optional[float] = None,
+    domain: Optional[str] = None,
+    device_class: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get entity states from the cache, refreshing it when needed
+    
+    The cache is kept live by the WebSocket mirror while it is connected.
+    Otherwise a snapshot from GET /api/states is served for up to max_age
+    seconds. Either way, entities invalidated by a service call are
+    refetched individually first.
+    
+    Args:
+        max_age: Maximum tolerated snapshot age in seconds (default: HA_CACHE_MAX_AGE)
+        domain: Optional domain partition to return
+        device_class: Optional device_class partition to return
+    """
+    await _refresh_states(max_age)
+    return _store.select(domain, device_class)
+
+async def _refresh_states(max_age: Optional[float] = None) -> None:
+    """
+    Make sure the cache may be served, without reading from it
+    
+    Entities a service call invalidated are refetched over REST even while
+    the mirror is live: its update only arrives once Home Assistant has
+    processed the change, and until then the cached state is stale. A full
+    snapshot is never loaded while live, since it would be older than the
+    mirror's state.
+    
+    Args:
+        max_age: Maximum tolerated snapshot age in seconds (default: HA_CACHE_MAX_AGE)
+    """
+    if max_age is None:
+        max_age = HA_CACHE_MAX_AGE
+    get_mirror()
+    
+    if _store.invalidated and (
+        _store.live
+        or (_store.is_fresh(max_age) and len(_store.invalidated) <= MAX_PARTIAL_REFETCH)
+    ):
+        await _refetch_invalidated()
+    
+    if not _store.usable(max_age):
+        await _single_flight("GET", "/api/states", _load_snapshot)
+
+async def _load_snapshot() -> None:
+    """
+    Replace the cache with a full GET /api/states snapshot
+    
+    Concurrent readers share one load through _single_flight. With
+    HA_STREAM_STATES the body is decoded item by item while it downloads,
+    so neither the raw body nor a second full list of states is ever held in
+    memory. Entities equal to the cached ones keep their existing objects and
+    the duplicates are dropped as soon as they are decoded.
+    
+    If the mirror became live while the body was downloading, the snapshot
+    is older than the mirror's state and is dropped.
+    """
+    client = await get_client()
+    if not HA_STREAM_STATES:
+        response = await client.get("/api/states")
+        response.raise_for_status()
+        entities = response.json()
+        if _store.live:
+            logger.debug("Entity mirror went live during the snapshot load; dropping the snapshot")
+            return
+        _store.replace_all(entities)
+        return
+    
+    entities = []
+    # Home Assistant serializes every state with entity_id as the first key
+    parser = JSONArrayStream(item_hint=STATE_ITEM_HINT)
+    async with client.stream("GET", "/api/states") as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            for entity in parser.feed(chunk):
+                entities.append(_store.canonical(entity))
+    parser.close()
+    if _store.live:
+        logger.debug("Entity mirror went live during the snapshot load; dropping the snapshot")
+        return
+    _store.replace_all(entities)
 
 # Direct entity retrieval function
-async def get_all_entity_states() -> Dict[str, Dict[str, Any]]:
+async def get_all_entity_states(max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
     """Fetch all entity states from Home Assistant"""
-    client = await get_client()
-    response = await client.get(f"{HA_URL}/api/states", headers=get_ha_headers())
-    response.raise_for_status()
-    entities = response.json()
+    await _refresh_states(max_age)
     
-    # Create a mapping for easier access
-    return {entity["entity_id"]: entity for entity in entities}
+    return {entity_id: plain(entity) for entity_id, entity in _store.mapping().items()}
 
 def filter_fields(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
     """
@@ -132,46 +445,55 @@ def filter_fields(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
         A filtered dictionary with only the requested fields
     """
     if not fields:
-        return data
-        
-    result = {"entity_id": data["entity_id"]}
-    
-    for field in fields:
-        if field == "state":
-            result["state"] = data.get("state")
-        elif field == "attributes":
-            result["attributes"] = data.get("attributes", {})
-        elif field.startswith("attr.") and len(field) > 5:
-            attr_name = field[5:]
-            attributes = data.get("attributes", {})
-            if attr_name in attributes:
-                if "attributes" not in result:
-                    result["attributes"] = {}
-                result["attributes"][attr_name] = attributes[attr_name]
-        elif field == "context":
-            if "context" in data:
-                result["context"] = data["context"]
-        elif field in ["last_updated", "last_changed"]:
-            if field in data:
-                result[field] = data[field]
+        return plain(data)
     
-    return result
+    # The field list is parsed once per distinct list, not per entity
+    return compile_projection(tuple(fields)).apply(data)
+
+@functools.lru_cache(maxsize=None)
+def get_lean_projection(domain: str) -> Projection:
+    """
+    Get the compiled lean projection for a domain
+    
+    Lean responses contain DEFAULT_LEAN_FIELDS plus the domain's entries in
+    DOMAIN_IMPORTANT_ATTRIBUTES.
+    
+    Args:
+        domain: The entity domain (e.g., 'light')
+    
+    Returns:
+        The cached Projection for the domain
+    """
+    fields = DEFAULT_LEAN_FIELDS + [f"attr.{attr}" for attr in DOMAIN_IMPORTANT_ATTRIBUTES.get(domain, [])]
+    return compile_projection(tuple(fields))
+
+def lean_entity(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a full entity to its domain's lean fields"""
+    return get_lean_projection(entity["entity_id"].split(".", 1)[0]).apply(entity)
 
 # API Functions
 @handle_api_errors
 async def get_hass_version() -> str:
     """Get the Home Assistant version from the API"""
-    client = await get_client()
-    response = await client.get(f"{HA_URL}/api/config", headers=get_ha_headers())
-    response.raise_for_status()
-    data = response.json()
+    url = "/api/config"
+    
+    async def fetch() -> Dict[str, Any]:
+        client = await get_client()
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+    
+    data = await _single_flight("GET", url, fetch)
     return data.get("version", "unknown")
 
 @handle_api_errors
 async def get_entity_state(
     entity_id: str,
     fields: Optional[List[str]] = None,
-    lean: bool = False
+    lean: bool = False,
+    detailed: bool = False,
+    use_cache: bool = True,
+    max_age: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Get the state of a Home Assistant entity
@@ -181,37 +503,85 @@ async def get_entity_state(
         fields: Optional list of specific fields to include in the response
         lean: If True, returns a token-efficient version with minimal fields
               (overridden by fields parameter if provided)
+        detailed: If True, returns the full entity data (overrides lean)
+        use_cache: If False, always fetch the entity from Home Assistant
+        max_age: Maximum tolerated age of a cached state in seconds
+                 (default: HA_CACHE_MAX_AGE; always current while the mirror is live)
     
     Returns:
         Entity state dictionary, optionally filtered to include only specified fields
     """
-    # Fetch directly
-    client = await get_client()
-    response = await client.get(
-        f"{HA_URL}/api/states/{entity_id}", 
-        headers=get_ha_headers()
-    )
-    response.raise_for_status()
-    entity_data = response.json()
+    if max_age is None:
+        max_age = HA_CACHE_MAX_AGE
+    get_mirror()
+    
+    if fields and "context" in fields and not _store.keep_context:
+        # The cache drops context; only Home Assistant has it
+        use_cache = False
+    
+    entity_data = _store.get(entity_id, max_age) if use_cache else None
+    if entity_data is None:
+        entity_data = await _fetch_entity(entity_id)
     
     # Apply field filtering if requested
     if fields:
         # User-specified fields take precedence
         return filter_fields(entity_data, fields)
-    elif lean:
-        # Build domain-specific lean fields
-        lean_fields = DEFAULT_LEAN_FIELDS.copy()
-        
-        # Add domain-specific important attributes
-        domain = entity_id.split('.')[0]
-        if domain in DOMAIN_IMPORTANT_ATTRIBUTES:
-            for attr in DOMAIN_IMPORTANT_ATTRIBUTES[domain]:
-                lean_fields.append(f"attr.{attr}")
-        
-        return filter_fields(entity_data, lean_fields)
+    elif lean and not detailed:
+        # Apply the domain-specific lean projection
+        return get_lean_projection(entity_id.split('.')[0]).apply(entity_data)
     else:
         # Return full entity data
-        return entity_data
+        return plain(entity_data)
+
+@handle_api_errors
+async def get_entities_by_id(
+    entity_ids: List[str],
+    fields: Optional[List[str]] = None,
+    lean: bool = True,
+    max_age: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get several entities in one round trip
+    
+    All entities are resolved from the cache; if any of them is missing or
+    too old, a single /api/states snapshot refreshes them all instead of one
+    request per entity.
+    
+    Args:
+        entity_ids: The entity IDs to get (duplicates are returned once)
+        fields: Optional list of specific fields to include in each entity
+        lean: If True (default), returns token-efficient versions with minimal fields
+              (overridden by fields parameter if provided)
+        max_age: Maximum tolerated age of the cached states in seconds
+                 (default: HA_CACHE_MAX_AGE; always current while the mirror is live)
+    
+    Returns:
+        One entry per entity ID in the requested order; unknown entities are
+        reported as {"entity_id": ..., "error": "Entity not found"}
+    """
+    if max_age is None:
+        max_age = HA_CACHE_MAX_AGE
+    get_mirror()
+    
+    entity_ids = list(dict.fromkeys(entity_ids))
+    found = [_store.get(entity_id, max_age) for entity_id in entity_ids]
+    if any(entity is None for entity in found):
+        await _refresh_states(max_age)
+        found = [_store.peek(entity_id) for entity_id in entity_ids]
+    
+    projection = compile_projection(tuple(fields)) if fields else None
+    results = []
+    for entity_id, entity in zip(entity_ids, found):
+        if entity is None:
+            results.append({"entity_id": entity_id, "error": "Entity not found"})
+        elif projection is not None:
+            results.append(projection.apply(entity))
+        elif lean:
+            results.append(get_lean_projection(entity_id.split('.', 1)[0]).apply(entity))
+        else:
+            results.append(plain(entity))
+    return results
 
 @handle_api_errors
 async def get_entities(
@@ -219,7 +589,10 @@ async def get_entities(
     search_query: Optional[str] = None, 
     limit: int = 100,
     fields: Optional[List[str]] = None,
-    lean: bool = True
+    lean: bool = True,
+    max_age: Optional[float] = None,
+    rank: bool = False,
+    device_class: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Get a list of all entities from Home Assistant with optional filtering and search
@@ -227,86 +600,149 @@ async def get_entities(
     Args:
         domain: Optional domain to filter entities by (e.g., 'light', 'switch')
         search_query: Optional case-insensitive search term to filter by entity_id, friendly_name or other attributes
+                      (with several words, every word has to match)
         limit: Maximum number of entities to return (default: 100)
         fields: Optional list of specific fields to include in each entity
         lean: If True (default), returns token-efficient versions with minimal fields
+        max_age: Maximum tolerated age of the cached snapshot in seconds
+        rank: If True, search results are ordered by relevance (entity_id matches
+              before friendly_name, state and attribute matches) instead of
+              Home Assistant's order, so a small limit keeps the best matches
+        device_class: Optional device_class to filter entities by (e.g., 'temperature')
     
     Returns:
         List of entity dictionaries, optionally filtered by domain and search terms,
         and optionally limited to specific fields
     """
-    # Get all entities directly
-    client = await get_client()
-    response = await client.get(f"{HA_URL}/api/states", headers=get_ha_headers())
-    response.raise_for_status()
-    entities = response.json()
+    # Read only the matching domain/device_class partition of the cache
+    entities = await _get_state_list(max_age, domain, device_class)
     
-    # Filter by domain if specified
-    if domain:
-        entities = [entity for entity in entities if entity["entity_id"].startswith(f"{domain}.")]
-    
-    # Search if query is provided
+    # Search if query is provided (entity_id, friendly_name, state and scalar attributes)
     if search_query and search_query.strip():
-        search_term = search_query.lower().strip()
-        filtered_entities = []
-        
-        for entity in entities:
-            # Search in entity_id
-            if search_term in entity["entity_id"].lower():
-                filtered_entities.append(entity)
-                continue
-                
-            # Search in friendly_name
-            friendly_name = entity.get("attributes", {}).get("friendly_name", "").lower()
-            if friendly_name and search_term in friendly_name:
-                filtered_entities.append(entity)
-                continue
-                
-            # Search in other common attributes (state, area_id, etc.)
-            if search_term in entity.get("state", "").lower():
-                filtered_entities.append(entity)
-                continue
-                
-            # Search in other attributes
-            for attr_name, attr_value in entity.get("attributes", {}).items():
-                # Check if attribute value can be converted to string
-                if isinstance(attr_value, (str, int, float, bool)):
-                    if search_term in str(attr_value).lower():
-                        filtered_entities.append(entity)
-                        break
-        
-        entities = filtered_entities
+        if rank:
+            accept = None
+            if domain or device_class:
+                allowed = {entity["entity_id"] for entity in entities}
+                accept = allowed.__contains__
+            ranked = _search_index.rank(search_query, limit=max(limit, 0), accept=accept)
+            entities = [_store.peek(entity_id) for _, entity_id in ranked]
+        else:
+            matches = _search_index.search(search_query)
+            entities = [entity for entity in entities if entity["entity_id"] in matches]
     
     # Apply the limit
     if limit > 0 and len(entities) > limit:
         entities = entities[:limit]
     
+    return _project(entities, fields, lean)
+
+def _project(entities: List[Dict[str, Any]], fields: Optional[List[str]], lean: bool) -> List[Dict[str, Any]]:
+    """Shape cached entities for a response"""
     # Apply field filtering if requested
     if fields:
-        # Use explicit field list when provided
-        return [filter_fields(entity, fields) for entity in entities]
+        # Use explicit field list when provided (compiled once for all entities)
+        return compile_projection(tuple(fields)).apply_all(entities)
     elif lean:
-        # Apply domain-specific lean fields to each entity
-        result = []
-        for entity in entities:
-            # Get the entity's domain
-            entity_domain = entity["entity_id"].split('.')[0]
-            
-            # Start with basic lean fields
-            lean_fields = DEFAULT_LEAN_FIELDS.copy()
-            
-            # Add domain-specific important attributes
-            if entity_domain in DOMAIN_IMPORTANT_ATTRIBUTES:
-                for attr in DOMAIN_IMPORTANT_ATTRIBUTES[entity_domain]:
-                    lean_fields.append(f"attr.{attr}")
-            
-            # Filter and add to result
-            result.append(filter_fields(entity, lean_fields))
-        
-        return result
+        # Apply the compiled domain-specific lean projection to each entity
+        return [
+            get_lean_projection(entity["entity_id"].split('.', 1)[0]).apply(entity)
+            for entity in entities
+        ]
     else:
-        # Return full entities
-        return entities
+        # Return full entities as plain dictionaries
+        return [plain(entity) for entity in entities]
+
+@handle_api_errors
+async def get_entities_page(
+    domain: Optional[str] = None,
+    search_query: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[List[str]] = None,
+    lean: bool = True,
+    max_age: Optional[float] = None,
+    rank: bool = False,
+    device_class: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Get one page of entities, continuing after a cursor
+    
+    Pages are cut from the sorted snapshot by key (entity_id, or relevance
+    then entity_id for ranked searches), so following next_cursor never
+    repeats or skips an entity that existed throughout. A page of an
+    unsearched partition is a bisect into its cached sorted ID list.
+    
+    Args:
+        domain: Optional domain to filter entities by (e.g., 'light', 'switch')
+        search_query: Optional search term (every word has to match)
+        limit: Page size (0 for everything after the cursor)
+        fields: Optional list of specific fields to include in each entity
+        lean: If True (default), returns token-efficient versions with minimal fields
+        max_age: Maximum tolerated age of the cached snapshot in seconds
+        rank: If True, search results are ordered by relevance instead of entity_id
+        device_class: Optional device_class to filter entities by (e.g., 'temperature')
+        cursor: next_cursor from the previous page, or None for the first page
+    
+    Returns:
+        A dictionary with:
+        - entities: The entities of this page
+        - count: Number of entities on this page
+        - next_cursor: Cursor for the next page, or None after the last one
+        - snapshot_version: Version of the snapshot the page was read from
+        - snapshot_changed: Present (True) when entities changed since the cursor was issued
+    """
+    await _refresh_states(max_age)
+    query = search_query.strip() if search_query else ""
+    ranked = bool(query) and rank
+    scope = cursor_scope(domain, device_class, query.lower(), ranked)
+    
+    after: Optional[List[Any]] = None
+    cursor_version = None
+    if cursor:
+        try:
+            cursor_version, after = decode_cursor(cursor, scope)
+            if len(after) != (2 if ranked else 1):
+                raise ValueError("malformed cursor (wrong key length)")
+            if ranked:
+                after = [float(after[0]), str(after[1])]
+        except (ValueError, TypeError) as e:
+            return {"error": f"Invalid cursor: {str(e)}"}
+    
+    # Read one entity past the page to know whether there is a next one
+    size = limit + 1 if limit > 0 else len(_store) + 1
+    if ranked:
+        accept = None
+        if domain or device_class:
+            allowed = set(_store.sorted_ids(domain, device_class))
+            accept = allowed.__contains__
+        # Only the page (and one more) is selected from the matches, with a bounded heap
+        ranked_after = (after[0], after[1]) if after is not None else None
+        keys = [
+            [score, entity_id]
+            for score, entity_id in _search_index.rank(query, limit=size, accept=accept, after=ranked_after)
+        ]
+    else:
+        accept = _search_index.search(query).__contains__ if query else None
+        after_id = after[0] if after else None
+        keys = [
+            [entity_id]
+            for entity_id in page_after(_store.sorted_ids(domain, device_class), after_id, size, accept)
+        ]
+    
+    more = limit > 0 and len(keys) > limit
+    if more:
+        keys = keys[:limit]
+    entities = [_store.peek(key[-1]) for key in keys]
+    
+    page = {
+        "entities": _project([entity for entity in entities if entity is not None], fields, lean),
+        "count": len(keys),
+        "next_cursor": encode_cursor(_store.version, keys[-1], scope) if more else None,
+        "snapshot_version": _store.version,
+    }
+    if cursor_version is not None and cursor_version != _store.version:
+        page["snapshot_changed"] = True
+    return page
 
 @handle_api_errors
 async def call_service(domain: str, service: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -316,89 +752,379 @@ async def call_service(domain: str, service: str, data: Optional[Dict[str, Any]]
     
     client = await get_client()
     response = await client.post(
-        f"{HA_URL}/api/services/{domain}/{service}", 
-        headers=get_ha_headers(),
-        json=data
+        f"/api/services/{domain}/{service}",
+        json=data,
+        timeout=endpoint_timeout("services")
     )
+    _forget_recent()
     response.raise_for_status()
+    result = response.json()
     
-    # Invalidate cache after service calls as they might change entity states
-    global _entities_timestamp
-    _entities_timestamp = 0
+    # Home Assistant returns the states that changed during the call
+    changed_ids = set()
+    if isinstance(result, list):
+        for entity in result:
+            if isinstance(entity, dict) and "entity_id" in entity:
+                _store.upsert(entity)
+                changed_ids.add(entity["entity_id"])
     
-    return response.json()
+    # Invalidate the other targeted entities, which may still change asynchronously
+    target_ids = _service_target_ids(data)
+    if target_ids is not None:
+        _store.invalidate(target_ids - changed_ids)
+    elif not _store.live:
+        # Area/device targeting: we cannot tell which entities are affected
+        _store.invalidate()
+    
+    return result
+
+def _service_target_ids(data: Dict[str, Any]) -> Optional[Set[str]]:
+    """
+    Get the entity IDs targeted by service call data
+    
+    Returns:
+        The set of targeted entity IDs, or None when the call targets entities
+        indirectly (areas, devices, "all") or in a form that is not understood,
+        so the affected set is unknown
+    """
+    targets = [data]
+    if "target" in data:
+        if not isinstance(data["target"], dict):
+            return None
+        targets.append(data["target"])
+    
+    entity_ids: Set[str] = set()
+    for target in targets:
+        if any(key in target for key in INDIRECT_TARGET_KEYS):
+            return None
+        value = target.get("entity_id")
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = [part.strip() for part in value.split(",") if part.strip()]
+        elif not isinstance(value, (list, tuple, set)) or not all(isinstance(item, str) for item in value):
+            return None
+        for entity_id in value:
+            if entity_id == "all":
+                return None
+            entity_ids.add(entity_id)
+    return entity_ids
+
+def _bulk_group_key(domain: str, service: str, data: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """
+    Get the key under which a bulk operation can share a call with others
+
+    Operations share a call when they have the same domain, service and data
+    apart from a plain top-level entity_id. Calls targeting areas, devices,
+    a "target" block or "all" are never merged.
+
+    Returns:
+        The grouping key, or None if the operation has to run on its own
+    """
+    if "target" in data or any(key in data for key in INDIRECT_TARGET_KEYS):
+        return None
+    target_ids = _service_target_ids(data)
+    if not target_ids:
+        return None
+    rest = {key: value for key, value in data.items() if key != "entity_id"}
+    try:
+        encoded = json.dumps(rest, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return (domain, service, encoded)
 
 @handle_api_errors
-async def summarize_domain(domain: str, example_limit: int = 3) -> Dict[str, Any]:
+async def bulk_call_service(
+    operations: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run several service calls, merging the ones that can share a call
+
+    Operations with the same domain, service and data (apart from entity_id)
+    are sent as one call with entity_id as a list; the resulting calls run
+    concurrently on the shared client, at most max_concurrency at a time.
+
+    Args:
+        operations: List of {"domain", "service", "data"} dictionaries
+        max_concurrency: Maximum number of calls in flight (default: HA_BULK_CONCURRENCY)
+
+    Returns:
+        A dictionary with the number of calls made and a compact status table
+        with one row per operation: [index, "domain.service", targets, status,
+        changed], where status is "ok" or an error message and changed is the
+        number of the operation's entities Home Assistant reported as changed
+    """
+    statuses: List[Optional[str]] = [None] * len(operations)
+    targets: List[Optional[Set[str]]] = [set() for _ in operations]
+    names: List[str] = [""] * len(operations)
+
+    # Each call: (domain, service, data, indices of the operations it serves)
+    calls: List[Tuple[str, str, Dict[str, Any], List[int]]] = []
+    groups: Dict[Tuple[str, str, str], int] = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            statuses[index] = "error: operation must be an object"
+            continue
+        domain = operation.get("domain")
+        service = operation.get("service")
+        data = operation.get("data") or {}
+        if isinstance(domain, str) and isinstance(service, str):
+            names[index] = f"{domain}.{service}"
+        if not names[index] or not isinstance(data, dict):
+            statuses[index] = "error: domain and service must be strings and data an object"
+            continue
+
+        targets[index] = _service_target_ids(data)
+        key = _bulk_group_key(domain, service, data)
+        if key is None:
+            calls.append((domain, service, data, [index]))
+        elif key in groups:
+            call = calls[groups[key]]
+            merged = call[2]["entity_id"]
+            for entity_id in _ordered_entity_ids(data["entity_id"]):
+                if entity_id not in merged:
+                    merged.append(entity_id)
+            call[3].append(index)
+        else:
+            groups[key] = len(calls)
+            calls.append((domain, service, {**data, "entity_id": _ordered_entity_ids(data["entity_id"])}, [index]))
+
+    semaphore = asyncio.Semaphore(max(max_concurrency or HA_BULK_CONCURRENCY, 1))
+
+    async def run(domain: str, service: str, data: Dict[str, Any]) -> Any:
+        async with semaphore:
+            return await call_service(domain, service, data)
+
+    results = await asyncio.gather(*(run(domain, service, data) for domain, service, data, _ in calls))
+
+    changed: Dict[int, int] = {}
+    for (_, _, _, indices), result in zip(calls, results):
+        failed = isinstance(result, dict) and "error" in result
+        changed_ids = [
+            entity["entity_id"] for entity in result
+            if isinstance(entity, dict) and "entity_id" in entity
+        ] if isinstance(result, list) else []
+        for index in indices:
+            statuses[index] = f"error: {result['error']}" if failed else "ok"
+            if targets[index] is None or len(indices) == 1:
+                changed[index] = len(changed_ids)
+            else:
+                changed[index] = sum(1 for entity_id in changed_ids if entity_id in targets[index])
+
+    rows = [
+        [
+            index,
+            names[index],
+            len(targets[index]) if targets[index] is not None else "indirect",
+            statuses[index],
+            changed.get(index, 0)
+        ]
+        for index in range(len(operations))
+    ]
+    return {
+        "calls": len(calls),
+        "failed": sum(1 for status in statuses if status != "ok"),
+        "columns": ["index", "service", "targets", "status", "changed"],
+        "rows": rows,
+    }
+
+@handle_api_errors
+async def apply_states(
+    targets: Dict[str, Any],
+    dry_run: bool = False,
+    max_age: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Bring entities to target states with only the service calls that are needed
+
+    Each target is diffed against the cached snapshot; entities already in
+    their target state are skipped and the remaining operations are run
+    through bulk_call_service, which merges identical calls. An entity's
+    operations are sent in the planned order (see _run_in_waves).
+
+    Args:
+        targets: Map of entity ID to a state ("off") or a {"state": ..., attribute: value} dictionary
+        dry_run: If True, only return the planned operations
+        max_age: Maximum tolerated age of the cached snapshot in seconds
+
+    Returns:
+        A dictionary with the number of unchanged entities, per-entity errors,
+        the planned operations and, unless dry_run, the bulk_call_service result
+    """
+    await _refresh_states(max_age)
+    current = {entity_id: _store.peek(entity_id) for entity_id in targets}
+    operations, unchanged, errors = plan_states(targets, current)
+
+    result: Dict[str, Any] = {
+        "unchanged": len(unchanged),
+        "errors": errors,
+        "planned": [
+            [operation["data"]["entity_id"], f"{operation['domain']}.{operation['service']}"]
+            for operation in operations
+        ],
+    }
+    if operations and not dry_run:
+        result.update(await _run_in_waves(operations))
+    return result
+
+async def _run_in_waves(operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run planned operations so that each entity's operations keep their order
+
+    plan_entity orders an entity's operations deliberately (set_hvac_mode
+    before set_temperature, turn_on before volume_set), so wave n holds the
+    n-th operation of every entity and the waves run one after another
+    through bulk_call_service. Only operations of different entities run
+    concurrently. Once an operation fails, the entity's later operations
+    are skipped.
+
+    Returns:
+        The bulk_call_service result for all waves, with rows indexed by
+        position in operations
+    """
+    waves: List[List[int]] = []
+    counts: Dict[str, int] = {}
+    for index, operation in enumerate(operations):
+        entity_id = operation["data"]["entity_id"]
+        wave = counts.get(entity_id, 0)
+        counts[entity_id] = wave + 1
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(index)
+
+    rows: List[Optional[List[Any]]] = [None] * len(operations)
+    failed_ids: Set[str] = set()
+    calls = 0
+    columns: List[str] = []
+    for wave in waves:
+        indices = [index for index in wave if operations[index]["data"]["entity_id"] not in failed_ids]
+        if not indices:
+            continue
+        outcome = await bulk_call_service([operations[index] for index in indices])
+        if "error" in outcome:
+            return outcome
+        calls += outcome["calls"]
+        columns = outcome["columns"]
+        for index, row in zip(indices, outcome["rows"]):
+            rows[index] = [index] + row[1:]
+            if row[3] != "ok":
+                failed_ids.add(operations[index]["data"]["entity_id"])
+
+    for index, row in enumerate(rows):
+        if row is None:
+            operation = operations[index]
+            rows[index] = [index, f"{operation['domain']}.{operation['service']}", 1, "skipped: an earlier operation failed", 0]
+    return {
+        "calls": calls,
+        "failed": sum(1 for row in rows if row[3] != "ok"),
+        "columns": columns,
+        "rows": rows,
+    }
+
+def _ordered_entity_ids(value: Union[str, List[str]]) -> List[str]:
+    """Normalize an entity_id value (string, comma list or list) to a list"""
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return list(value)
+
+def _snapshot_info() -> Dict[str, Any]:
+    """Describe the snapshot derived results reflect"""
+    age = _store.age()
+    return {
+        "snapshot_version": _store.version,
+        "snapshot_age_seconds": round(age, 3) if age is not None else None,
+    }
+
+@handle_api_errors
+async def get_snapshot_info(max_age: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Refresh the entity cache if needed and describe the snapshot it holds
+    
+    Args:
+        max_age: Maximum tolerated snapshot age in seconds (default: HA_CACHE_MAX_AGE)
+    
+    Returns:
+        A dictionary with "snapshot_version" and "snapshot_age_seconds"
+    """
+    await _refresh_states(max_age)
+    return _snapshot_info()
+
+def _friendly_name(entity_id: str) -> str:
+    entity = _store.peek(entity_id) or {}
+    return (entity.get("attributes") or {}).get("friendly_name", entity_id)
+
+@handle_api_errors
+async def summarize_domain(domain: str, example_limit: int = 3, sample: bool = False) -> Dict[str, Any]:
     """
     Generate a summary of entities in a domain
     
+    The counts come from the incrementally maintained per-domain aggregates,
+    so they are exact for every entity of the domain without rescanning it,
+    and no entity is projected or copied into a list.
+    
     Args:
         domain: The domain to summarize (e.g., 'light', 'switch')
         example_limit: Maximum number of examples to include for each state
+        sample: If True, examples are a uniform random sample of each state
+                (reservoir sampling) instead of the first entities in it
         
     Returns:
-        Dictionary with summary information
+        Dictionary with summary information and the snapshot version it reflects
     """
-    entities = await get_entities(domain=domain)
-    
-    # Check if we got an error response
-    if isinstance(entities, dict) and "error" in entities:
-        return entities  # Just pass through the error
+    await _refresh_states()
     
     try:
-        # Initialize summary data
-        total_count = len(entities)
-        state_counts = {}
-        state_examples = {}
-        attributes_summary = {}
-        
-        # Process entities to build the summary
-        for entity in entities:
-            state = entity.get("state", "unknown")
-            
-            # Count states
-            if state not in state_counts:
-                state_counts[state] = 0
-                state_examples[state] = []
-            state_counts[state] += 1
-            
-            # Add examples (up to the limit)
-            if len(state_examples[state]) < example_limit:
-                example = {
-                    "entity_id": entity["entity_id"],
-                    "friendly_name": entity.get("attributes", {}).get("friendly_name", entity["entity_id"])
-                }
-                state_examples[state].append(example)
-            
-            # Collect attribute keys for summary
-            for attr_key in entity.get("attributes", {}):
-                if attr_key not in attributes_summary:
-                    attributes_summary[attr_key] = 0
-                attributes_summary[attr_key] += 1
-        
-        # Create the summary
-        summary = {
-            "domain": domain,
-            "total_count": total_count,
-            "state_distribution": state_counts,
-            "examples": state_examples,
-            "common_attributes": sorted(
-                [(k, v) for k, v in attributes_summary.items()], 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:10]  # Top 10 most common attributes
-        }
-        
+        aggregate = _aggregates.domain(domain)
+        if aggregate is None:
+            summary = {
+                "domain": domain,
+                "total_count": 0,
+                "state_distribution": {},
+                "examples": {},
+                "common_attributes": []
+            }
+        else:
+            summary = {
+                "domain": domain,
+                "total_count": aggregate.count,
+                "state_distribution": aggregate.state_counts(),
+                "examples": {
+                    state: [
+                        {"entity_id": entity_id, "friendly_name": _friendly_name(entity_id)}
+                        for entity_id in aggregate.examples(state, example_limit, sample)
+                    ]
+                    for state in aggregate.states
+                },
+                "common_attributes": aggregate.top_attributes(10)  # Top 10 most common attributes
+            }
+        summary.update(_snapshot_info())
         return summary
     except Exception as e:
         return {"error": f"Error generating domain summary: {str(e)}"}
 
+@handle_api_errors
+async def get_entities_by_domain(max_age: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get all entities grouped by domain, read from the store's domain partitions
+    
+    Args:
+        max_age: Optional maximum age in seconds of the cached snapshot
+    
+    Returns:
+        A dictionary mapping each domain to its entity states
+    """
+    await _refresh_states(max_age)
+    return {
+        domain: [plain(entity) for entity in partition.values()]
+        for domain, partition in _store.partitions().items()
+    }
+
 @handle_api_errors
 async def get_automations() -> List[Dict[str, Any]]:
     """Get a list of all automations from Home Assistant"""
-    # Reuse the get_entities function with domain filtering
-    automation_entities = await get_entities(domain="automation")
+    # Read the automation partition directly (full attributes, no limit)
+    automation_entities = await _get_state_list(domain="automation")
     
     # Check if we got an error response
     if isinstance(automation_entities, dict) and "error" in automation_entities:
@@ -437,75 +1163,236 @@ async def restart_home_assistant() -> Dict[str, Any]:
     """Restart Home Assistant"""
     return await call_service("homeassistant", "restart", {})
 
+async def _fetch_history(
+    entity_id: str,
+    start: float,
+    end: float,
+    significant_changes_only: bool = True
+) -> List[Point]:
+    """Fetch one entity's history points for [start, end] (epoch seconds) from Home Assistant"""
+    params = {
+        "filter_entity_id": entity_id,
+        "end_time": datetime.fromtimestamp(end, timezone.utc).isoformat(),
+        "minimal_response": "",
+        "no_attributes": "",
+        "significant_changes_only": "1" if significant_changes_only else "0",
+    }
+    start_time = datetime.fromtimestamp(start, timezone.utc).isoformat()
+    url = f"/api/history/period/{quote(start_time)}?{urlencode(params)}"
+    
+    async def fetch() -> List[List[Dict[str, Any]]]:
+        client = await get_client()
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+    
+    # The URL ends at the time of the call, so a completed result is never asked for again
+    data = await _single_flight("GET", url, fetch, reuse=False)
+    return history_points(data[0] if data else [])
+
 @handle_api_errors
-async def get_hass_error_log() -> Dict[str, Any]:
+async def get_entity_history(
+    entity_id: str,
+    hours: float = 24,
+    max_points: Optional[int] = None,
+    method: str = "buckets",
+    significant_changes_only: bool = True
+) -> Dict[str, Any]:
+    """
+    Get an entity's state history, reduced to a point budget
+    
+    Calls /api/history/period/{start} with minimal_response and no_attributes,
+    then collapses runs of identical states and buckets numeric series
+    (see history.reduce_history). Fetched ranges are kept in the history
+    segment cache, so a repeated or sliding window only fetches the part
+    that is not cached yet.
+    
+    Args:
+        entity_id: The entity ID to get history for
+        hours: Number of hours of history, ending now
+        max_points: Maximum number of returned points (default: HA_HISTORY_MAX_POINTS)
+        method: "buckets" (min/max/mean) or "lttb" (representative samples) for numeric series
+        significant_changes_only: Skip attribute-only changes on the Home Assistant side
+    
+    Returns:
+        A dictionary with entity_id, start, end, count (raw points), kind,
+        states (reduced), first_changed and last_changed
+    """
+    if max_points is None:
+        max_points = HA_HISTORY_MAX_POINTS
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(hours=hours)
+    
+    async def fetch(entity_id: str, range_start: float, range_end: float) -> List[Point]:
+        return await _fetch_history(entity_id, range_start, range_end, significant_changes_only)
+    
+    points = await get_history_cache().get_points(
+        entity_id, start.timestamp(), end.timestamp(), fetch, significant_changes_only
+    )
+    
+    result = {
+        "entity_id": entity_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "count": len(points),
+        "first_changed": points[0][1] if points else None,
+        "last_changed": points[-1][1] if points else None,
+    }
+    result.update(reduce_history(points, max_points, method, end.timestamp()))
+    return result
+
+def _parse_log_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse a "generation:line" error log cursor"""
+    if not cursor:
+        return None
+    try:
+        generation, line = cursor.split(":", 1)
+        return int(generation), int(line)
+    except ValueError:
+        return None
+
+async def _refresh_error_log() -> None:
+    """Fetch and parse only the part of the error log that is new since the last call"""
+    client = await get_client()
+    url = "/api/error_log"
+    # A replaced log is detected on the first request and read in full on the second
+    for _ in range(2):
+        range_header = _error_log.range_header()
+        headers = {"Range": range_header} if range_header else None
+        response = await client.get(url, headers=headers, timeout=endpoint_timeout("error_log"))
+        if response.status_code not in (200, 206, 416):
+            response.raise_for_status()
+        new_lines = _error_log.apply(
+            response.status_code, response.content, response.headers.get("content-range")
+        )
+        if new_lines is not None:
+            return
+
+@handle_api_errors
+async def get_hass_error_log(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    refresh: bool = True
+) -> Dict[str, Any]:
     """
     Get the Home Assistant error log for troubleshooting
     
+    The log is followed incrementally: only bytes appended since the previous
+    call are fetched (Range request) and parsed, and the counters are kept
+    up to date from the new lines.
+    
+    Args:
+        limit: Maximum number of lines to return
+        cursor: next_cursor from a previous call, to page further back
+        since: follow_cursor from a previous call, to get only newer lines
+        refresh: If False, page the log as already fetched (new_lines is kept)
+    
     Returns:
         A dictionary containing:
-        - log_text: The full error log text
-        - error_count: Number of ERROR entries found
-        - warning_count: Number of WARNING entries found
-        - integration_mentions: Map of integration names to mention counts
+        - lines: Up to limit log lines, newest first
+        - next_cursor: Cursor for the next (older) page, or None
+        - follow_cursor: Cursor to pass as since to get lines added later
+        - new_lines: Number of lines added since the previous call
+        - error_count: Number of ERROR (or CRITICAL) records found
+        - warning_count: Number of WARNING records found
+        - integration_mentions: Map of integration names to record counts
+        - record_groups: Number of distinct record fingerprints (see search_hass_error_log)
+        - total_lines / log_size: Size of the current log
+        - log_replaced: True when a cursor belongs to a previous log (after a restart)
         - error: Error message if retrieval failed
     """
     try:
-        # Call the Home Assistant API error_log endpoint
-        url = f"{HA_URL}/api/error_log"
-        headers = get_ha_headers()
+        if refresh:
+            async with _error_log_lock:
+                await _refresh_error_log()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                log_text = response.text
-                
-                # Count errors and warnings
-                error_count = log_text.count("ERROR")
-                warning_count = log_text.count("WARNING")
-                
-                # Extract integration mentions
-                import re
-                integration_mentions = {}
-                
-                # Look for patterns like [mqtt], [zwave], etc.
-                for match in re.finditer(r'\[([a-zA-Z0-9_]+)\]', log_text):
-                    integration = match.group(1).lower()
-                    if integration not in integration_mentions:
-                        integration_mentions[integration] = 0
-                    integration_mentions[integration] += 1
-                
-                return {
-                    "log_text": log_text,
-                    "error_count": error_count,
-                    "warning_count": warning_count,
-                    "integration_mentions": integration_mentions
-                }
+        generation = _error_log.generation
+        before = after = None
+        replaced = False
+        parsed_cursor = _parse_log_cursor(cursor)
+        parsed_since = _parse_log_cursor(since)
+        if parsed_cursor is not None:
+            if parsed_cursor[0] == generation:
+                before = parsed_cursor[1]
             else:
-                return {
-                    "error": f"Error retrieving error log: {response.status_code} {response.reason_phrase}",
-                    "details": response.text,
-                    "log_text": "",
-                    "error_count": 0,
-                    "warning_count": 0,
-                    "integration_mentions": {}
-                }
+                replaced = True
+        if parsed_since is not None:
+            if parsed_since[0] == generation:
+                after = parsed_since[1]
+            else:
+                # The log was recreated: everything in it is new
+                replaced = True
+                after = 0
+        
+        lines, next_before = _error_log.page(limit, before=before, after=after)
+        result = {
+            "lines": [text for _, text in lines],
+            "next_cursor": f"{generation}:{next_before}" if next_before is not None else None,
+            "follow_cursor": f"{generation}:{_error_log.total_lines}",
+            "new_lines": _error_log.last_new_lines,
+            **_error_log.stats()
+        }
+        if replaced:
+            result["log_replaced"] = True
+        return result
     except Exception as e:
         logger.error(f"Error retrieving Home Assistant error log: {str(e)}")
         return {
             "error": f"Error retrieving error log: {str(e)}",
-            "log_text": "",
+            "lines": [],
             "error_count": 0,
             "warning_count": 0,
             "integration_mentions": {}
         }
 
+@handle_api_errors
+async def search_hass_error_log(
+    level: Optional[str] = None,
+    integration: Optional[str] = None,
+    since: Optional[str] = None,
+    text: Optional[str] = None,
+    limit: int = 20,
+    refresh: bool = True
+) -> Dict[str, Any]:
+    """
+    Search the structured error log index
+    
+    Records are grouped by fingerprint (level, logger and message with
+    numbers and ids normalised), so repeats come back as one group with a
+    count and first/last-seen times.
+    
+    Args:
+        level: Minimum level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        integration: Integration (e.g. 'mqtt') or logger prefix
+        since: Only groups seen at or after this local time ('YYYY-MM-DD HH:MM:SS')
+        text: Case-insensitive text to find in the message or traceback
+        limit: Maximum number of groups to return
+        refresh: If False, search the log as already fetched
+    
+    Returns:
+        A dictionary with the matching groups (most recently seen first),
+        total_groups (number of matches before the limit) and the log counters
+    """
+    if refresh:
+        async with _error_log_lock:
+            await _refresh_error_log()
+    
+    groups, total = _error_log.index.search(level, integration, since, text, limit)
+    return {
+        "groups": groups,
+        "total_groups": total,
+        **_error_log.stats()
+    }
+
 @handle_api_errors
 async def get_system_overview() -> Dict[str, Any]:
     """
     Get a comprehensive overview of the entire Home Assistant system
     
+    Counts are read from the incrementally maintained per-domain aggregates,
+    so building the overview takes O(domains) instead of a pass over every entity.
+    
     Returns:
         A dictionary containing:
         - total_entities: Total count of all entities
@@ -513,111 +1400,45 @@ async def get_system_overview() -> Dict[str, Any]:
         - domain_samples: Representative sample entities for each domain (2-3 per domain)
         - domain_attributes: Common attributes for each domain
         - area_distribution: Entities grouped by area (if available)
+        - snapshot_version: Version of the entity snapshot the numbers reflect
     """
     try:
-        # Get ALL entities with minimal fields for efficiency
-        # We retrieve all entities since API calls don't consume tokens, only responses do
-        client = await get_client()
-        response = await client.get(f"{HA_URL}/api/states", headers=get_ha_headers())
-        response.raise_for_status()
-        all_entities_raw = response.json()
-        
-        # Apply lean formatting to reduce token usage in the response
-        all_entities = []
-        for entity in all_entities_raw:
-            domain = entity["entity_id"].split(".")[0]
-            
-            # Start with basic lean fields
-            lean_fields = ["entity_id", "state", "attr.friendly_name"]
-            
-            # Add domain-specific important attributes
-            if domain in DOMAIN_IMPORTANT_ATTRIBUTES:
-                for attr in DOMAIN_IMPORTANT_ATTRIBUTES[domain]:
-                    lean_fields.append(f"attr.{attr}")
-            
-            # Filter and add to result
-            all_entities.append(filter_fields(entity, lean_fields))
+        await _refresh_states()
         
         # Initialize overview structure
         overview = {
-            "total_entities": len(all_entities),
+            "total_entities": len(_store),
             "domains": {},
             "domain_samples": {},
             "domain_attributes": {},
-            "area_distribution": {}
+            "area_distribution": _aggregates.area_distribution()
         }
         
-        # Group entities by domain
-        domain_entities = {}
-        for entity in all_entities:
-            domain = entity["entity_id"].split(".")[0]
-            if domain not in domain_entities:
-                domain_entities[domain] = []
-            domain_entities[domain].append(entity)
-        
-        # Process each domain
-        for domain, entities in domain_entities.items():
-            # Count entities in this domain
-            count = len(entities)
-            
-            # Collect state distribution
-            state_distribution = {}
-            for entity in entities:
-                state = entity.get("state", "unknown")
-                if state not in state_distribution:
-                    state_distribution[state] = 0
-                state_distribution[state] += 1
-            
+        partitions = _store.partitions()
+        for domain, aggregate in _aggregates.domains.items():
             # Store domain information
             overview["domains"][domain] = {
-                "count": count,
-                "states": state_distribution
+                "count": aggregate.count,
+                "states": aggregate.state_counts()
             }
             
-            # Select representative samples (2-3 per domain)
-            sample_limit = min(3, count)
+            # Select representative samples (2-3 per domain) from the domain partition
             samples = []
-            for i in range(sample_limit):
-                entity = entities[i]
+            for entity in islice(partitions.get(domain, {}).values(), 3):
                 samples.append({
                     "entity_id": entity["entity_id"],
                     "state": entity.get("state", "unknown"),
-                    "friendly_name": entity.get("attributes", {}).get("friendly_name", entity["entity_id"])
+                    "friendly_name": (entity.get("attributes") or {}).get("friendly_name", entity["entity_id"])
                 })
             overview["domain_samples"][domain] = samples
             
-            # Collect common attributes for this domain
-            attribute_counts = {}
-            for entity in entities:
-                for attr in entity.get("attributes", {}):
-                    if attr not in attribute_counts:
-                        attribute_counts[attr] = 0
-                    attribute_counts[attr] += 1
-            
             # Get top 5 most common attributes for this domain
-            common_attributes = sorted(attribute_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-            overview["domain_attributes"][domain] = [attr for attr, count in common_attributes]
-            
-            # Group by area if available
-            for entity in entities:
-                area_id = entity.get("attributes", {}).get("area_id", "Unknown")
-                area_name = entity.get("attributes", {}).get("area_name", area_id)
-                
-                if area_name not in overview["area_distribution"]:
-                    overview["area_distribution"][area_name] = {}
-                
-                if domain not in overview["area_distribution"][area_name]:
-                    overview["area_distribution"][area_name][domain] = 0
-                    
-                overview["area_distribution"][area_name][domain] += 1
+            overview["domain_attributes"][domain] = [attr for attr, _ in aggregate.top_attributes(5)]
         
         # Add summary information
-        overview["domain_count"] = len(domain_entities)
-        overview["most_common_domains"] = sorted(
-            [(domain, len(entities)) for domain, entities in domain_entities.items()],
-            key=lambda x: x[1],
-            reverse=True
-        )[:5]
+        overview["domain_count"] = len(_aggregates.domains)
+        overview["most_common_domains"] = _aggregates.most_common_domains(5)
+        overview.update(_snapshot_info())
         
         return overview
     except Exception as e:
@@ -0,0 +1,215 @@
+import math
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# States that mark a gap in a numeric series rather than a value
+GAP_STATES = ("unavailable", "unknown", "")
+
+# A history point: (epoch seconds, ISO timestamp, state)
+Point = Tuple[float, str, str]
+
+def parse_timestamp(value: str) -> float:
+    """Convert an ISO timestamp from the history API to epoch seconds"""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value).timestamp()
+
+def history_points(states: List[Dict[str, Any]]) -> List[Point]:
+    """
+    Extract (epoch, timestamp, state) points from one entity's history list
+
+    With minimal_response only the first item is a full state object; the
+    others carry just "state" and "last_changed".
+    """
+    points = []
+    for item in states:
+        timestamp = item.get("last_changed") or item.get("last_updated")
+        if not timestamp:
+            continue
+        points.append((parse_timestamp(timestamp), timestamp, str(item.get("state", ""))))
+    return points
+
+def is_numeric(points: List[Point]) -> bool:
+    """Check whether every non-gap state is a finite number (and there is one)"""
+    found = False
+    for _, _, state in points:
+        if state in GAP_STATES:
+            continue
+        try:
+            if not math.isfinite(float(state)):
+                return False
+        except ValueError:
+            return False
+        found = True
+    return found
+
+def collapse_runs(points: List[Point], end: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Run-length collapse consecutive identical states
+
+    Args:
+        points: History points in time order
+        end: Epoch seconds the last run lasts until (default: its own start)
+
+    Returns:
+        One {"state", "last_changed", "duration_seconds"} entry per run
+    """
+    runs: List[Dict[str, Any]] = []
+    run_start: Optional[Point] = None
+    for point in points:
+        if run_start is not None and point[2] == run_start[2]:
+            continue
+        if run_start is not None:
+            runs[-1]["duration_seconds"] = round(point[0] - run_start[0], 1)
+        run_start = point
+        runs.append({"state": point[2], "last_changed": point[1]})
+    if run_start is not None:
+        runs[-1]["duration_seconds"] = round(max((end or run_start[0]) - run_start[0], 0.0), 1)
+    return runs
+
+def bucket_numeric(points: List[Point], max_points: int) -> List[Dict[str, Any]]:
+    """
+    Reduce a numeric series to at most max_points min/max/mean buckets
+
+    The time range is split into equal spans; empty spans are skipped, so
+    gaps in the data stay visible as jumps in "start".
+
+    Returns:
+        {"start", "end", "min", "max", "mean", "count"} entries in time order,
+        with "unavailable" added when a bucket contains gap states
+    """
+    if not points:
+        return []
+    first, last = points[0][0], points[-1][0]
+    span = (last - first) / max_points or 1.0
+
+    buckets: List[Dict[str, Any]] = []
+    current_index = -1
+    values: List[float] = []
+    gaps = 0
+    bucket_start = bucket_end = ""
+
+    def flush() -> None:
+        if not values and not gaps:
+            return
+        bucket = {"start": bucket_start, "end": bucket_end, "count": len(values)}
+        if values:
+            bucket.update(
+                min=min(values),
+                max=max(values),
+                mean=round(sum(values) / len(values), 3)
+            )
+        if gaps:
+            bucket["unavailable"] = gaps
+        buckets.append(bucket)
+
+    for epoch, timestamp, state in points:
+        index = min(int((epoch - first) / span), max_points - 1)
+        if index != current_index:
+            flush()
+            current_index = index
+            values, gaps = [], 0
+            bucket_start = timestamp
+        bucket_end = timestamp
+        if state in GAP_STATES:
+            gaps += 1
+        else:
+            values.append(float(state))
+    flush()
+    return buckets
+
+def lttb(points: List[Point], max_points: int) -> List[Dict[str, Any]]:
+    """
+    Largest-Triangle-Three-Buckets downsampling of a numeric series
+
+    Keeps actual samples (first, last, and per bucket the one forming the
+    largest triangle with its neighbours), which preserves the visual shape
+    of the series. Gap states are dropped.
+
+    Returns:
+        {"state", "last_changed"} entries in time order
+    """
+    series = [(epoch, float(state), timestamp, state) for epoch, timestamp, state in points if state not in GAP_STATES]
+    if max_points < 3 or len(series) <= max_points:
+        selected = series if len(series) <= max_points else [series[0], series[-1]]
+        return [{"state": state, "last_changed": timestamp} for _, _, timestamp, state in selected]
+
+    selected = [series[0]]
+    bucket_size = (len(series) - 2) / (max_points - 2)
+    previous = series[0]
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third vertex of the triangle
+        next_start, next_stop = stop, min(int((bucket + 2) * bucket_size) + 1, len(series))
+        following = series[next_start:next_stop] or [series[-1]]
+        avg_x = sum(item[0] for item in following) / len(following)
+        avg_y = sum(item[1] for item in following) / len(following)
+
+        best, best_area = series[start], -1.0
+        for item in series[start:stop]:
+            area = abs(
+                (previous[0] - avg_x) * (item[1] - previous[1])
+                - (previous[0] - item[0]) * (avg_y - previous[1])
+            )
+            if area > best_area:
+                best, best_area = item, area
+        selected.append(best)
+        previous = best
+    selected.append(series[-1])
+    return [{"state": state, "last_changed": timestamp} for _, _, timestamp, state in selected]
+
+def reduce_history(
+    points: List[Point],
+    max_points: int,
+    method: str = "buckets",
+    end: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Reduce one entity's history to at most max_points entries
+
+    Discrete states are run-length collapsed (keeping the most recent runs
+    when there are still too many). Numeric series within the budget are
+    returned as-is; larger ones are reduced to min/max/mean buckets or, with
+    method="lttb", to representative samples.
+
+    Args:
+        points: History points in time order
+        max_points: Point budget for the returned "states"
+        method: "buckets" or "lttb" for numeric series
+        end: Epoch seconds of the end of the queried period
+
+    Returns:
+        A dictionary with "kind", "states", "reduced" and, for discrete
+        states, a "state_durations" summary in seconds
+    """
+    max_points = max(max_points, 1)
+    if is_numeric(points):
+        if len(points) <= max_points:
+            states = [{"state": state, "last_changed": timestamp} for _, timestamp, state in points]
+            return {"kind": "numeric", "states": states, "reduced": False}
+        if method == "lttb":
+            states = lttb(points, max_points)
+        else:
+            method = "buckets"
+            states = bucket_numeric(points, max_points)
+        return {"kind": "numeric", "states": states, "reduced": True, "method": method}
+
+    runs = collapse_runs(points, end)
+    durations: Dict[str, float] = {}
+    for run in runs:
+        durations[run["state"]] = round(durations.get(run["state"], 0.0) + run["duration_seconds"], 1)
+    result: Dict[str, Any] = {
+        "kind": "discrete",
+        "states": runs[-max_points:],
+        "reduced": len(runs) < len(points) or len(runs) > max_points,
+        "state_durations": durations,
+    }
+    if len(runs) > max_points:
+        result["omitted_runs"] = len(runs) - max_points
+    return result
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+
+from .history import Point
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The recorder commits in batches, so the newest seconds of a fetched range
+# may still be incomplete; they are refetched instead of cached
+SETTLE_SECONDS = 30.0
+
+# Timestamps within this many seconds count as the same instant (ISO round trips)
+TIME_TOLERANCE = 0.001
+
+# Fetches history points for (entity_id, start epoch, end epoch)
+HistoryFetcher = Callable[[str, float, float], Awaitable[List[Point]]]
+
+class Segment:
+    """An immutable time range of one entity's history that is fully known"""
+
+    __slots__ = ("start", "end", "points")
+
+    def __init__(self, start: float, end: float, points: Tuple[Point, ...]):
+        self.start = start
+        self.end = end
+        self.points = points
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"start": self.start, "end": self.end, "points": [list(point) for point in self.points]}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Segment":
+        return cls(data["start"], data["end"], tuple(tuple(point) for point in data["points"]))
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def merge_segments(segments: List[Segment]) -> List[Segment]:
+    """
+    Merge overlapping or touching segments into new segments
+
+    Points are de-duplicated by timestamp. A fetched range starts with the
+    state at its start time, so a first point that only repeats the previous
+    segment's last state is dropped.
+    """
+    merged: List[Segment] = []
+    for segment in sorted(segments, key=lambda item: item.start):
+        if merged and segment.start <= merged[-1].end:
+            previous = merged[-1]
+            points = list(previous.points)
+            for point in segment.points:
+                if points and point[0] <= points[-1][0]:
+                    continue
+                if points and abs(point[0] - segment.start) < TIME_TOLERANCE and point[2] == points[-1][2]:
+                    continue
+                points.append(point)
+            merged[-1] = Segment(previous.start, max(previous.end, segment.end), tuple(points))
+        else:
+            merged.append(segment)
+    return merged
+
+def missing_ranges(segments: List[Segment], start: float, end: float) -> List[Tuple[float, float]]:
+    """Return the parts of [start, end] not covered by the (merged) segments"""
+    missing = []
+    cursor = start
+    for segment in segments:
+        if segment.end < cursor:
+            continue
+        if segment.start > end:
+            break
+        if segment.start > cursor:
+            missing.append((cursor, segment.start))
+        cursor = max(cursor, segment.end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+def slice_points(segments: List[Segment], start: float, end: float) -> List[Point]:
+    """
+    Collect the points in [start, end], led by the state at start
+
+    Like the history API, the state in effect at start is reported with the
+    start time when no change happened exactly then.
+    """
+    before: Optional[Point] = None
+    points: List[Point] = []
+    for segment in segments:
+        if segment.start > end:
+            break
+        for point in segment.points:
+            if point[0] < start:
+                before = point
+            elif point[0] <= end:
+                if points and point[0] <= points[-1][0]:
+                    continue
+                points.append(point)
+    if before is not None and (not points or points[0][0] - start >= TIME_TOLERANCE):
+        points.insert(0, (start, _iso(start), before[2]))
+    return points
+
+class HistoryCache:
+    """
+    Per-entity cache of fetched history ranges with an optional on-disk store
+
+    Fetched ranges are kept as immutable segments per (entity_id,
+    significant_changes_only) key; a query only fetches the parts of its
+    window that no segment covers (typically the new tail of a sliding
+    window, or an older head when the window grows). Entries are evicted
+    least recently used once the cached points exceed max_points. With a
+    directory, each entry is persisted as a small JSON file so the cache
+    survives restarts of the add-on.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_points: int = 500000):
+        self.directory = directory
+        self.max_points = max_points
+        self._entries: "OrderedDict[str, List[Segment]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.fetched_ranges = 0
+        self.evictions = 0
+
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._index_directory()
+            except OSError as e:
+                logger.warning(f"History cache directory {directory} unavailable, caching in memory only: {str(e)}")
+                self.directory = None
+
+    @staticmethod
+    def _key(entity_id: str, significant_changes_only: bool) -> str:
+        return f"{entity_id}|{int(significant_changes_only)}"
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _index_directory(self) -> None:
+        """Register persisted entries in LRU order (oldest modification first)"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json") and entry.is_file():
+                files.append((entry.stat().st_mtime, entry.path))
+        for _, path in sorted(files):
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    data = json.load(handle)
+                segments = [Segment.from_json(item) for item in data["segments"]]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Dropping unreadable history cache file {path}: {str(e)}")
+                self._unlink(path)
+                continue
+            self._store(data["key"], segments, persist=False)
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _store(self, key: str, segments: List[Segment], persist: bool = True) -> None:
+        """Replace an entry, mark it most recently used and enforce the budget"""
+        self._entries[key] = segments
+        self._entries.move_to_end(key)
+        self._sizes[key] = sum(len(segment.points) for segment in segments)
+        if persist and self.directory:
+            self._persist(key, segments)
+
+        while len(self._entries) > 1 and sum(self._sizes.values()) > self.max_points:
+            evicted, _ = self._entries.popitem(last=False)
+            self._sizes.pop(evicted, None)
+            self.evictions += 1
+            if self.directory:
+                self._unlink(self._path(evicted))
+
+    def _persist(self, key: str, segments: List[Segment]) -> None:
+        """Write an entry atomically (temporary file + rename)"""
+        path = self._path(key)
+        temporary = f"{path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as handle:
+                json.dump({"key": key, "segments": [segment.to_json() for segment in segments]}, handle)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.warning(f"Could not persist history cache entry: {str(e)}")
+            self._unlink(temporary)
+
+    async def get_points(
+        self,
+        entity_id: str,
+        start: float,
+        end: float,
+        fetch: HistoryFetcher,
+        significant_changes_only: bool = True,
+        now: Optional[float] = None
+    ) -> List[Point]:
+        """
+        Get an entity's history points for [start, end], fetching only what is missing
+
+        Args:
+            entity_id: The entity ID
+            start: Window start in epoch seconds
+            end: Window end in epoch seconds
+            fetch: Coroutine fetching points for (entity_id, start, end) from Home Assistant
+            significant_changes_only: Part of the cache key, as it changes the data
+            now: Current epoch seconds (ranges newer than now - SETTLE_SECONDS are not cached)
+
+        Returns:
+            The points in the window, led by the state in effect at start
+        """
+        key = self._key(entity_id, significant_changes_only)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            segments = self._entries.get(key, [])
+            gaps = missing_ranges(segments, start, end)
+            if not gaps:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return slice_points(segments, start, end)
+            if sum(gap_end - gap_start for gap_start, gap_end in gaps) < end - start:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+
+            settled = (now if now is not None else end) - SETTLE_SECONDS
+            fetched = await asyncio.gather(*(fetch(entity_id, gap_start, gap_end) for gap_start, gap_end in gaps))
+            self.fetched_ranges += len(gaps)
+
+            new_segments = list(segments)
+            transient: List[Segment] = []
+            for (gap_start, gap_end), points in zip(gaps, fetched):
+                if gap_end <= settled:
+                    new_segments.append(Segment(gap_start, gap_end, tuple(points)))
+                elif gap_start < settled:
+                    # Cache the settled part; the newest seconds are refetched next time
+                    new_segments.append(Segment(gap_start, settled, tuple(p for p in points if p[0] <= settled)))
+                    transient.append(Segment(gap_start, gap_end, tuple(points)))
+                else:
+                    transient.append(Segment(gap_start, gap_end, tuple(points)))
+
+            merged = merge_segments(new_segments)
+            self._store(key, merged, persist=False)
+            if self.directory and key in self._entries:
+                # Write off the event loop; the entry is already served from memory
+                await asyncio.get_running_loop().run_in_executor(None, self._persist, key, merged)
+            return slice_points(merge_segments(merged + transient), start, end)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and size"""
+        return {
+            "entries": len(self._entries),
+            "points": sum(self._sizes.values()),
+            "max_points": self.max_points,
+            "persistent": bool(self.directory),
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "fetched_ranges": self.fetched_ranges,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,127 @@
+import json
+import re
+import logging
+from typing import Any, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Parser states
+_EXPECT_OPEN = 0           # before '['
+_EXPECT_FIRST = 1          # after '[': first item or ']'
+_EXPECT_ITEM = 2           # after ',': an item
+_EXPECT_SEPARATOR = 3      # after an item: ',' or ']'
+_DONE = 4                  # after ']'
+
+class JSONArrayStream:
+    """
+    Incremental decoder for the items of a top-level JSON array
+
+    Text is fed in chunks as it arrives; every item that is complete is
+    decoded with the C decoder and returned, and only the unparsed tail is
+    kept. Peak memory is therefore about one chunk instead of the whole body
+    plus the whole decoded list.
+
+    When every item starts with a known prefix (item_hint), the complete
+    items of a chunk are found with a single rfind and decoded in one call,
+    which also lets them share their key strings like a single json.loads
+    would. Otherwise, or if that batch turns out not to be a clean boundary,
+    items are decoded one at a time with raw_decode.
+
+    Example:
+        stream = JSONArrayStream()
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                handle(item)
+        stream.close()
+    """
+
+    def __init__(self, item_hint: Optional[str] = None):
+        self._decoder = json.JSONDecoder()
+        self._boundary = "," + item_hint if item_hint else None
+        self._buffer = ""
+        self._state = _EXPECT_OPEN
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Add a chunk of text and decode every item completed by it
+
+        Args:
+            text: The next chunk of the JSON document
+
+        Returns:
+            The items completed by this chunk, in document order
+
+        Raises:
+            ValueError: If the document is not a JSON array
+        """
+        buffer = self._buffer + text if self._buffer else text
+        items = []
+        pos = 0
+        end = len(buffer)
+
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= end:
+                break
+            char = buffer[pos]
+
+            if self._state == _EXPECT_OPEN:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array, got {char!r}")
+                self._state = _EXPECT_FIRST
+                pos += 1
+            elif self._state == _EXPECT_SEPARATOR or (self._state == _EXPECT_FIRST and char == "]"):
+                if char == ",":
+                    self._state = _EXPECT_ITEM
+                elif char == "]":
+                    self._state = _DONE
+                else:
+                    raise ValueError(f"Expected ',' or ']' at offset {pos}, got {char!r}")
+                pos += 1
+            elif self._state == _DONE:
+                raise ValueError(f"Unexpected data after the JSON array: {char!r}")
+            else:
+                if self._boundary is not None:
+                    cut = buffer.rfind(self._boundary, pos)
+                    if cut > pos:
+                        try:
+                            batch = json.loads("[" + buffer[pos:cut] + "]")
+                        except json.JSONDecodeError:
+                            # The hint matched inside an item; decode one by one
+                            batch = None
+                        if batch is not None:
+                            items.extend(batch)
+                            self._state = _EXPECT_SEPARATOR
+                            pos = cut
+                            continue
+                try:
+                    item, item_end = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely the item continues in the next chunk
+                    break
+                if item_end >= end and not isinstance(item, (dict, list, str)):
+                    # A number or literal at the end of the buffer may be truncated
+                    break
+                items.append(item)
+                self._state = _EXPECT_SEPARATOR
+                pos = item_end
+
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self) -> None:
+        """
+        Finish the document
+
+        Raises:
+            ValueError: If the array is incomplete or an item is malformed
+        """
+        if self._state == _EXPECT_ITEM or self._state == _EXPECT_FIRST:
+            # A trailing item that never became decodable is malformed
+            if self._buffer.strip():
+                self._decoder.raw_decode(self._buffer.strip())
+        if self._state != _DONE:
+            raise ValueError("Incomplete JSON array")
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from .store import EntityStore
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - websockets is listed in pyproject
+    websockets = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Reconnect backoff bounds in seconds
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Message id used for the subscribe_entities subscription
+SUBSCRIBE_ID = 1
+
+def _iso_timestamp(value: float) -> str:
+    """Convert a compressed-state epoch timestamp to the REST API's ISO format"""
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+def _expand_context(context: Any) -> Dict[str, Any]:
+    """Expand a compressed context (either an id string or a dict)"""
+    if isinstance(context, str):
+        return {"id": context, "parent_id": None, "user_id": None}
+    return context
+
+def expand_state(entity_id: str, compressed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a REST-style state object from a subscribe_entities addition
+
+    Args:
+        entity_id: The entity ID the compressed state belongs to
+        compressed: The compressed state ({"s", "a", "c", "lc", "lu"})
+
+    Returns:
+        A state dictionary shaped like the items returned by /api/states
+    """
+    last_changed = _iso_timestamp(compressed["lc"]) if "lc" in compressed else None
+    last_updated = _iso_timestamp(compressed["lu"]) if "lu" in compressed else last_changed
+
+    state = {
+        "entity_id": entity_id,
+        "state": compressed.get("s"),
+        "attributes": compressed.get("a", {}),
+        "last_changed": last_changed,
+        "last_updated": last_updated,
+    }
+    if "c" in compressed:
+        state["context"] = _expand_context(compressed["c"])
+    return state
+
+def apply_diff(current: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply a subscribe_entities change ({"+": ..., "-": ...}) to a state
+
+    A new dictionary is returned so snapshots handed out earlier are never
+    mutated underneath their readers.
+
+    Args:
+        current: The current REST-style state object
+        diff: The compressed change for this entity
+
+    Returns:
+        The updated state dictionary
+    """
+    state = dict(current)
+    additions = diff.get("+")
+    removals = diff.get("-")
+
+    if additions:
+        if "s" in additions:
+            state["state"] = additions["s"]
+        if "c" in additions:
+            state["context"] = _expand_context(additions["c"])
+        if "lc" in additions:
+            state["last_changed"] = state["last_updated"] = _iso_timestamp(additions["lc"])
+        elif "lu" in additions:
+            state["last_updated"] = _iso_timestamp(additions["lu"])
+        if "a" in additions:
+            state["attributes"] = {**state.get("attributes", {}), **additions["a"]}
+
+    if removals and "a" in removals:
+        attributes = dict(state.get("attributes", {}))
+        for key in removals["a"]:
+            attributes.pop(key, None)
+        state["attributes"] = attributes
+
+    return state
+
+class EntityMirror:
+    """
+    In-process mirror of all entity states kept current over the WebSocket API
+
+    A background task authenticates against the Home Assistant WebSocket API,
+    subscribes with subscribe_entities (a compressed initial snapshot followed
+    by diffs) and applies them to the shared EntityStore. The store is marked
+    live while the subscription is healthy; otherwise readers fall back to the
+    REST API.
+    """
+
+    def __init__(self, url: str, token: str, store: EntityStore):
+        self.url = url
+        self.token = token
+        self.store = store
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self._auth_failed = False
+
+        if websockets is None:
+            logger.warning("websockets is not installed; entity mirror disabled")
+
+    def start(self) -> bool:
+        """
+        Start the background connection task if it is not already running
+
+        Returns:
+            True if the mirror task is running, False if it could not be started
+        """
+        if websockets is None or self._auth_failed:
+            return False
+        if self._task is not None and not self._task.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        self._stopped = False
+        self._task = loop.create_task(self._run())
+        return True
+
+    async def stop(self) -> None:
+        """Stop the background task; the store keeps the last snapshot"""
+        self._stopped = True
+        self._set_ready(False)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        """Connect, subscribe and reconnect with exponential backoff"""
+        delay = RECONNECT_MIN_DELAY
+        while not self._stopped:
+            try:
+                await self._connect_and_listen()
+                delay = RECONNECT_MIN_DELAY
+            except asyncio.CancelledError:
+                raise
+            except PermissionError as e:
+                # Retrying with the same token will not help
+                logger.error(f"Entity mirror disabled: {str(e)}")
+                self._auth_failed = True
+                self._set_ready(False)
+                return
+            except Exception as e:
+                logger.warning(f"Entity mirror connection lost: {str(e)}")
+            self._set_ready(False)
+
+            if self._stopped:
+                break
+            logger.debug(f"Reconnecting entity mirror in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _connect_and_listen(self) -> None:
+        """Run a single WebSocket session until it closes or fails"""
+        async with websockets.connect(self.url, max_size=None) as ws:
+            message = json.loads(await ws.recv())
+            if message.get("type") == "auth_required":
+                await ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+                message = json.loads(await ws.recv())
+            if message.get("type") == "auth_invalid":
+                raise PermissionError(message.get("message", "authentication failed"))
+            if message.get("type") != "auth_ok":
+                raise ConnectionError(f"Unexpected auth response: {message.get('type')}")
+
+            await ws.send(json.dumps({"id": SUBSCRIBE_ID, "type": "subscribe_entities"}))
+            logger.info(f"Entity mirror connected to {self.url}")
+
+            async for raw in ws:
+                message = json.loads(raw)
+                if message.get("id") != SUBSCRIBE_ID:
+                    continue
+                if message.get("type") == "result":
+                    if not message.get("success", False):
+                        error = message.get("error", {}).get("message", "unknown error")
+                        raise ConnectionError(f"subscribe_entities failed: {error}")
+                elif message.get("type") == "event":
+                    self._apply_event(message.get("event", {}))
+
+    def _set_ready(self, ready: bool) -> None:
+        """Track subscription health and mirror it onto the store"""
+        self.ready = ready
+        self.store.set_live(ready)
+
+    def _apply_event(self, event: Dict[str, Any]) -> None:
+        """Apply one subscribe_entities event (additions, changes, removals)"""
+        additions = event.get("a", {})
+
+        if not self.ready:
+            # The first event after (re)subscribing is the full snapshot
+            self.store.replace_all(
+                (expand_state(entity_id, compressed) for entity_id, compressed in additions.items()),
+                live=True
+            )
+            self.ready = True
+            logger.info(f"Entity mirror ready with {len(self.store)} entities")
+            return
+
+        for entity_id, compressed in additions.items():
+            self.store.upsert(expand_state(entity_id, compressed))
+
+        for entity_id, diff in event.get("c", {}).items():
+            current = self.store.peek(entity_id)
+            if current is None:
+                continue
+            self.store.upsert(apply_diff(current, diff))
+
+        for entity_id in event.get("r", []):
+            self.store.remove(entity_id)
@@ -0,0 +1,88 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+from mcp.server.sse import SseServerTransport
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+
+from .hass import cleanup_client, get_snapshot_info
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds open event streams may delay shutdown before they are closed
+SHUTDOWN_GRACE_SECONDS = 5
+
+class _SseEndpoint:
+    """ASGI endpoint running one MCP session per SSE connection"""
+
+    def __init__(self, mcp: FastMCP, sse: SseServerTransport):
+        self._server = mcp._mcp_server
+        self._sse = sse
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        async with self._sse.connect_sse(scope, receive, send) as streams:
+            await self._server.run(streams[0], streams[1], self._server.create_initialization_options())
+
+def create_app(mcp: FastMCP) -> Starlette:
+    """
+    Create the SSE application serving every session from this process
+
+    All sessions share the module-level HTTP client, entity snapshot,
+    WebSocket mirror and caches. The snapshot is loaded at startup, so the
+    first session does not pay for it, and the client is closed on shutdown.
+
+    Args:
+        mcp: The FastMCP server
+
+    Returns:
+        A Starlette app with GET /sse (event stream) and POST /messages/
+    """
+    sse = SseServerTransport("/messages/")
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        info = await get_snapshot_info()
+        if "error" in info:
+            logger.warning(f"Could not load the entity snapshot at startup: {info['error']}")
+        else:
+            logger.info(f"Entity snapshot loaded (version {info['snapshot_version']})")
+        try:
+            yield
+        finally:
+            await cleanup_client()
+
+    return Starlette(
+        debug=mcp.settings.debug,
+        routes=[
+            Route("/sse", endpoint=_SseEndpoint(mcp, sse)),
+            Mount("/messages/", app=sse.handle_post_message),
+        ],
+        lifespan=lifespan
+    )
+
+async def serve(mcp: FastMCP, host: str, port: int, socket_path: Optional[str] = None) -> None:
+    """
+    Serve MCP over SSE on host:port, or on a unix socket when socket_path is set
+
+    Args:
+        mcp: The FastMCP server
+        host: Interface to bind (keep it local; there is no authentication)
+        port: TCP port
+        socket_path: Optional unix socket path used instead of host and port
+    """
+    config = uvicorn.Config(
+        create_app(mcp),
+        host=host,
+        port=port,
+        uds=socket_path or None,
+        log_level=mcp.settings.log_level.lower(),
+        # Event streams stay open until the client leaves; do not wait for them forever
+        timeout_graceful_shutdown=SHUTDOWN_GRACE_SECONDS
+    )
+    where = f"unix:{socket_path}" if socket_path else f"http://{host}:{port}"
+    logger.info(f"Serving MCP over SSE at {where} (GET /sse)")
+    await uvicorn.Server(config).serve()
@@ -0,0 +1,67 @@
+import base64
+import hashlib
+import json
+import logging
+from bisect import bisect_right
+from itertools import islice
+from typing import Any, Callable, List, Optional, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def cursor_scope(*parameters: Any) -> str:
+    """Fingerprint the query a cursor belongs to, so it cannot be reused with another one"""
+    return hashlib.sha1(json.dumps(parameters, default=str).encode()).hexdigest()[:8]
+
+def encode_cursor(version: int, key: List[Any], scope: str) -> str:
+    """
+    Encode an opaque page cursor
+
+    Args:
+        version: The snapshot version the page was read from
+        key: Sort key of the last entity returned
+        scope: cursor_scope() of the query
+
+    Returns:
+        A URL-safe base64 string
+    """
+    data = json.dumps({"v": version, "k": key, "s": scope}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, scope: str) -> Tuple[int, List[Any]]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        (snapshot version, sort key)
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another query
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        version, key, issued_scope = int(data["v"]), list(data["k"]), data["s"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"malformed cursor ({str(e)})")
+    if issued_scope != scope:
+        raise ValueError("cursor belongs to a different query")
+    return version, key
+
+def page_after(
+    sorted_ids: List[str],
+    after: Optional[str],
+    size: int,
+    accept: Optional[Callable[[str], bool]] = None
+) -> List[str]:
+    """
+    Return up to size IDs that sort after `after` (keyset pagination)
+
+    Seeks with bisect, so a page costs O(log n + size) however deep it is;
+    with an accept filter, rejected IDs are skipped on the way.
+    """
+    start = bisect_right(sorted_ids, after) if after is not None else 0
+    if accept is None:
+        return sorted_ids[start:start + size]
+    candidates = (sorted_ids[position] for position in range(start, len(sorted_ids)))
+    return list(islice((entity_id for entity_id in candidates if accept(entity_id)), size))
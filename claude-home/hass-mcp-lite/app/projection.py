@@ -0,0 +1,99 @@
+import functools
+import logging
+from typing import Dict, Any, List, Tuple, Iterable
+
+from .compact import plain_attributes
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Step kinds of a compiled projection
+_REQUIRED = 0      # copied even when missing (as None)
+_OPTIONAL = 1      # copied only when present
+_ATTRIBUTES = 2    # the attributes block (all or selected keys)
+
+class Projection:
+    """
+    A field selection compiled once and applied to many entities
+
+    The field strings accepted by filter_fields ("state", "attributes",
+    "attr.X", "context", "last_updated", "last_changed") are parsed when the
+    projection is compiled, so applying it is a loop over precomputed steps
+    with no string inspection per entity.
+    """
+
+    __slots__ = ("steps", "full_attributes", "attr_keys")
+
+    def __init__(self, fields: Tuple[str, ...]):
+        steps: List[Tuple[str, int]] = []
+        seen = set()
+        attr_keys: List[str] = []
+        full_attributes = False
+
+        for field in fields:
+            if field == "state":
+                step = ("state", _REQUIRED)
+            elif field in ("context", "last_updated", "last_changed"):
+                step = (field, _OPTIONAL)
+            elif field == "attributes":
+                full_attributes = True
+                step = ("attributes", _ATTRIBUTES)
+            elif field.startswith("attr.") and len(field) > 5:
+                if field[5:] not in attr_keys:
+                    attr_keys.append(field[5:])
+                step = ("attributes", _ATTRIBUTES)
+            else:
+                # entity_id is always included; unknown fields are ignored
+                continue
+            if step[0] not in seen:
+                seen.add(step[0])
+                steps.append(step)
+
+        self.steps = tuple(steps)
+        self.full_attributes = full_attributes
+        self.attr_keys = tuple(attr_keys)
+
+    def apply(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Project one entity
+
+        Args:
+            data: The complete entity data (a dictionary or a CompactEntity)
+
+        Returns:
+            A new plain dictionary with entity_id and the selected fields
+        """
+        result = {"entity_id": data["entity_id"]}
+        for key, kind in self.steps:
+            if kind == _REQUIRED:
+                result[key] = data.get(key)
+            elif kind == _OPTIONAL:
+                if key in data:
+                    result[key] = data[key]
+            else:
+                attributes = data.get("attributes", {})
+                if self.full_attributes:
+                    result["attributes"] = plain_attributes(attributes)
+                else:
+                    selected = {name: attributes[name] for name in self.attr_keys if name in attributes}
+                    if selected:
+                        result["attributes"] = selected
+        return result
+
+    def apply_all(self, entities: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Project every entity in entities"""
+        apply = self.apply
+        return [apply(entity) for entity in entities]
+
+@functools.lru_cache(maxsize=256)
+def compile_projection(fields: Tuple[str, ...]) -> Projection:
+    """
+    Compile (or fetch the cached) projection for a tuple of field strings
+
+    Args:
+        fields: Field strings as accepted by filter_fields
+
+    Returns:
+        The compiled Projection
+    """
+    return Projection(fields)
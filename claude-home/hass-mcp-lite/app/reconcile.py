@@ -0,0 +1,231 @@
+import logging
+import math
+from typing import Dict, Any, Optional, List, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Services that reach a target state, for domains that do not use turn_on/turn_off
+STATE_SERVICES = {
+    "cover": {"open": "open_cover", "closed": "close_cover"},
+    "valve": {"open": "open_valve", "closed": "close_valve"},
+    "lock": {"locked": "lock", "unlocked": "unlock"},
+    "vacuum": {"cleaning": "start", "docked": "return_to_base", "paused": "pause"},
+    "alarm_control_panel": {
+        "disarmed": "alarm_disarm",
+        "armed_home": "alarm_arm_home",
+        "armed_away": "alarm_arm_away",
+        "armed_night": "alarm_arm_night",
+        "armed_vacation": "alarm_arm_vacation",
+    },
+}
+
+# Domains whose state is a value set by one service: (service, parameter)
+VALUE_SERVICES = {
+    "input_number": ("set_value", "value"),
+    "number": ("set_value", "value"),
+    "input_text": ("set_value", "value"),
+    "text": ("set_value", "value"),
+    "input_select": ("select_option", "option"),
+    "select": ("select_option", "option"),
+    "climate": ("set_hvac_mode", "hvac_mode"),
+}
+
+# Attributes set by a dedicated service instead of turn_on:
+# target key -> (service, parameter, attribute holding the current value)
+ATTRIBUTE_SERVICES = {
+    "climate": {
+        "temperature": ("set_temperature", "temperature", "temperature"),
+        "fan_mode": ("set_fan_mode", "fan_mode", "fan_mode"),
+        "preset_mode": ("set_preset_mode", "preset_mode", "preset_mode"),
+        "swing_mode": ("set_swing_mode", "swing_mode", "swing_mode"),
+    },
+    "cover": {
+        "position": ("set_cover_position", "position", "current_position"),
+        "tilt_position": ("set_cover_tilt_position", "tilt_position", "current_tilt_position"),
+    },
+    "media_player": {
+        "volume_level": ("volume_set", "volume_level", "volume_level"),
+        "source": ("select_source", "source", "source"),
+    },
+    "fan": {
+        "percentage": ("set_percentage", "percentage", "percentage"),
+        "preset_mode": ("set_preset_mode", "preset_mode", "preset_mode"),
+    },
+}
+
+# turn_on parameters that are reported back as attributes of the same name
+REPORTED_ATTRIBUTES = (
+    "brightness", "color_temp", "color_temp_kelvin", "rgb_color", "rgbw_color", "rgbww_color",
+    "hs_color", "xy_color", "effect", "color_mode", "percentage", "preset_mode",
+)
+
+# States in which attributes cannot be set (they are ignored in the target)
+INACTIVE_STATES = ("off", "closed", "locked", "docked", "disarmed")
+
+# Domains whose state is a user-defined value, compared with its case kept
+CASE_SENSITIVE_DOMAINS = ("input_text", "text", "input_select", "select")
+
+def same_value(current: Any, target: Any) -> bool:
+    """
+    Compare a current value with a target value the way Home Assistant reports it
+
+    Numbers compare numerically (so "20.0" equals 20) and sequences
+    element-wise (rgb_color is a tuple in one place and a list in another).
+    """
+    if isinstance(current, (list, tuple)) and isinstance(target, (list, tuple)):
+        return len(current) == len(target) and all(same_value(a, b) for a, b in zip(current, target))
+    if isinstance(current, bool) or isinstance(target, bool):
+        return current == target
+    try:
+        return math.isclose(float(current), float(target), abs_tol=1e-6)
+    except (TypeError, ValueError):
+        pass
+    return current == target
+
+def _same_attribute(attributes: Dict[str, Any], key: str, target: Any) -> bool:
+    """Check whether a turn_on parameter already matches the entity's attributes"""
+    if key == "brightness_pct" and attributes.get("brightness") is not None:
+        return same_value(round(attributes["brightness"] * 100 / 255), target)
+    if key not in attributes:
+        # Call options such as transition or flash are not state and never differ
+        return key not in REPORTED_ATTRIBUTES
+    return same_value(attributes[key], target)
+
+def _state_text(domain: str, state: Any) -> str:
+    """Convert a target state to Home Assistant's form (True -> "on", "OFF" -> "off")"""
+    if isinstance(state, bool):
+        return "on" if state else "off"
+    text = str(state)
+    return text if domain in CASE_SENSITIVE_DOMAINS else text.lower()
+
+def normalize_target(entity_id: str, target: Any) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Split a target into its state and attributes
+
+    A target is a state ("off", 21, true), or a dictionary with an optional
+    "state" and attributes. Booleans mean "on"/"off" and states are lower-cased
+    except for free-text and select domains. Attributes without a state imply
+    "on" for domains that are switched with turn_on.
+
+    Returns:
+        (state or None, attributes)
+    """
+    domain = entity_id.split(".", 1)[0]
+    if not isinstance(target, dict):
+        return _state_text(domain, target), {}
+    attributes = {key: value for key, value in target.items() if key != "state"}
+    state = target.get("state")
+    if state is None and attributes:
+        if domain not in VALUE_SERVICES and domain not in STATE_SERVICES:
+            state = "on"
+    return (_state_text(domain, state) if state is not None else None), attributes
+
+def plan_entity(entity_id: str, current: Dict[str, Any], target: Any) -> List[Dict[str, Any]]:
+    """
+    Plan the service calls that bring one entity to its target
+
+    Args:
+        entity_id: The entity ID
+        current: The entity's current state object
+        target: The target state or {"state": ..., attribute: value} dictionary
+
+    Returns:
+        {"domain", "service", "data"} operations, empty if the entity is
+        already in the target state
+
+    Raises:
+        ValueError: If the target cannot be reached with a known service
+    """
+    domain = entity_id.split(".", 1)[0]
+    state, attributes = normalize_target(entity_id, target)
+    current_state = current.get("state")
+    current_attributes = current.get("attributes") or {}
+    operations: List[Dict[str, Any]] = []
+
+    def operation(service: str, **data: Any) -> Dict[str, Any]:
+        return {"domain": domain, "service": service, "data": {"entity_id": entity_id, **data}}
+
+    dedicated = ATTRIBUTE_SERVICES.get(domain, {})
+    if state is not None and state.lower() in INACTIVE_STATES:
+        # A dedicated service (a climate temperature) cannot act in this state
+        unreachable = sorted(key for key in attributes if key in dedicated)
+        if unreachable:
+            raise ValueError(f"Cannot set {', '.join(unreachable)} while {domain} is '{state}'")
+        # Other attributes of something switched off are meaningless
+        attributes = {}
+
+    # Attributes with their own service; a cover position replaces open/close
+    for key in [key for key in attributes if key in dedicated]:
+        service, parameter, attribute = dedicated[key]
+        value = attributes.pop(key)
+        if not same_value(current_attributes.get(attribute), value):
+            operations.append(operation(service, **{parameter: value}))
+            if domain == "cover" and key == "position":
+                state = None
+
+    if domain in VALUE_SERVICES:
+        service, parameter = VALUE_SERVICES[domain]
+        if state is not None and not same_value(current_state, state):
+            value = target if parameter == "value" and not isinstance(target, dict) else state
+            operations.insert(0, operation(service, **{parameter: value}))
+        if attributes:
+            raise ValueError(f"Unsupported attributes for {domain}: {', '.join(sorted(attributes))}")
+        return operations
+
+    if state is None:
+        if attributes:
+            raise ValueError(f"Unsupported attributes for {domain}: {', '.join(sorted(attributes))}")
+        return operations
+
+    if domain in STATE_SERVICES:
+        services = STATE_SERVICES[domain]
+        if state not in services:
+            raise ValueError(f"Cannot set {domain} to '{state}' (supported: {', '.join(services)})")
+        if attributes:
+            raise ValueError(f"Unsupported attributes for {domain}: {', '.join(sorted(attributes))}")
+        if not same_value(current_state, state):
+            operations.insert(0, operation(services[state]))
+        return operations
+
+    if state not in ("on", "off"):
+        raise ValueError(f"Cannot set {domain} to '{state}' (supported: on, off)")
+    stale = [key for key, value in attributes.items() if not _same_attribute(current_attributes, key, value)]
+    if state != current_state or stale:
+        # Send every target attribute so identical targets merge into one call
+        operations.insert(0, operation(f"turn_{state}", **attributes))
+    return operations
+
+def plan_states(
+    targets: Dict[str, Any],
+    current: Dict[str, Optional[Dict[str, Any]]]
+) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, str]]:
+    """
+    Diff target states against current states
+
+    Args:
+        targets: Map of entity ID to target state or {"state": ..., attribute: value}
+        current: Map of entity ID to its current state object (None if unknown)
+
+    Returns:
+        (operations for bulk_call_service, IDs of entities already in their
+        target state, map of entity ID to the reason it cannot be applied)
+    """
+    operations: List[Dict[str, Any]] = []
+    unchanged: List[str] = []
+    errors: Dict[str, str] = {}
+    for entity_id, target in targets.items():
+        entity = current.get(entity_id)
+        if entity is None:
+            errors[entity_id] = "Entity not found"
+            continue
+        try:
+            planned = plan_entity(entity_id, entity, target)
+        except ValueError as e:
+            errors[entity_id] = str(e)
+            continue
+        if planned:
+            operations.extend(planned)
+        else:
+            unchanged.append(entity_id)
+    return operations, unchanged, errors
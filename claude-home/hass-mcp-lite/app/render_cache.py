@@ -0,0 +1,60 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class RenderCache:
+    """
+    Size-bounded LRU cache of rendered resource text keyed by (uri, version)
+
+    A resource rendered from entity snapshot `version` stays valid until the
+    snapshot changes, so only the newest version is kept per URI and a
+    re-read of an unchanged resource is a dictionary lookup. Entries are
+    evicted least recently used once their total length exceeds max_chars.
+    """
+
+    def __init__(self, max_chars: int = 4000000):
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, uri: str, version: int) -> Optional[str]:
+        """Return the text rendered for uri at version, if cached"""
+        entry = self._entries.get(uri)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(uri)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, uri: str, version: int, text: str) -> str:
+        """Cache text rendered for uri at version and return it"""
+        if len(text) > self.max_chars:
+            return text
+        previous = self._entries.pop(uri, None)
+        if previous is not None:
+            self._chars -= len(previous[1])
+        self._entries[uri] = (version, text)
+        self._chars += len(text)
+        while self._chars > self.max_chars:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._chars -= len(evicted)
+            self.evictions += 1
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and size"""
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "max_chars": self.max_chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
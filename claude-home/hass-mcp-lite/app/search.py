@@ -0,0 +1,269 @@
+import re
+import math
+import heapq
+import logging
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Iterable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Separates fields in a document's haystack. Query words are split on
+# whitespace, so they can never match across two fields.
+FIELD_SEPARATOR = "\n"
+
+# Alphanumeric runs used as tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Relevance weights for entity_id, friendly_name and state; every other field
+# is an attribute value
+FIELD_WEIGHTS = (4.0, 3.0, 2.0)
+ATTRIBUTE_WEIGHT = 1.0
+
+# Score factor for a word found inside a longer token rather than as a whole token
+PARTIAL_MATCH_FACTOR = 0.5
+
+def trigrams(text: str) -> Set[str]:
+    """Return the distinct three-character substrings of text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def haystack_keys(haystack: str) -> Tuple[Set[str], Set[str]]:
+    """Return the (trigrams, tokens) of a document haystack"""
+    grams: Set[str] = set()
+    for field in haystack.split(FIELD_SEPARATOR):
+        grams |= trigrams(field)
+    return grams, set(TOKEN_PATTERN.findall(haystack))
+
+def entity_fields(entity: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Extract the searchable, lowercased fields of an entity
+
+    Returns:
+        (entity_id, friendly_name, state, *scalar attribute values)
+    """
+    attributes = entity.get("attributes") or {}
+    fields = [
+        entity["entity_id"].lower(),
+        str(attributes.get("friendly_name") or "").lower(),
+        str(entity.get("state") or "").lower(),
+    ]
+    for attr_name, attr_value in attributes.items():
+        if attr_name != "friendly_name" and isinstance(attr_value, (str, int, float, bool)):
+            fields.append(str(attr_value).lower())
+    return tuple(fields)
+
+def matches(query: str, entity: Dict[str, Any]) -> bool:
+    """Check a single entity against a query the way SearchIndex.search does"""
+    words = query.lower().split()
+    haystack = FIELD_SEPARATOR.join(entity_fields(entity))
+    return bool(words) and all(word in haystack for word in words)
+
+class SearchIndex:
+    """
+    Token and trigram inverted index over entity_id, friendly_name, state and
+    scalar attribute values
+
+    Each entity is a document with a precomputed lowercased haystack. Query
+    words of three or more characters select candidates by intersecting
+    trigram postings; candidates are then verified with plain substring
+    checks, so a single-word query matches exactly what a linear scan would.
+    The index is registered as an EntityStore listener and updated per
+    changed entity.
+    """
+
+    def __init__(self):
+        self._doc_ids: Dict[str, int] = {}
+        self._entity_ids: Dict[int, str] = {}
+        self._next_doc_id = 0
+        self._haystacks: Dict[int, str] = {}
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._tokens: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def update(self, entity_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """EntityStore listener: index, reindex or drop one entity"""
+        if new is None:
+            self._remove(entity_id)
+            return
+
+        haystack = FIELD_SEPARATOR.join(entity_fields(new))
+        doc_id = self._doc_ids.get(entity_id)
+        if doc_id is None:
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            self._doc_ids[entity_id] = doc_id
+            self._entity_ids[doc_id] = entity_id
+            old_trigrams, old_tokens = set(), set()
+        else:
+            old_haystack = self._haystacks[doc_id]
+            if old_haystack == haystack:
+                # Nothing searchable changed (e.g. only timestamps or list attributes)
+                return
+            old_trigrams, old_tokens = haystack_keys(old_haystack)
+
+        new_trigrams, new_tokens = haystack_keys(haystack)
+        self._replace_postings(self._trigrams, doc_id, old_trigrams, new_trigrams)
+        self._replace_postings(self._tokens, doc_id, old_tokens, new_tokens)
+        self._haystacks[doc_id] = haystack
+
+    def _remove(self, entity_id: str) -> None:
+        """Drop an entity and its postings"""
+        doc_id = self._doc_ids.pop(entity_id, None)
+        if doc_id is None:
+            return
+        del self._entity_ids[doc_id]
+        old_trigrams, old_tokens = haystack_keys(self._haystacks.pop(doc_id))
+        self._replace_postings(self._trigrams, doc_id, old_trigrams, set())
+        self._replace_postings(self._tokens, doc_id, old_tokens, set())
+
+    @staticmethod
+    def _replace_postings(index: Dict[str, Set[int]], doc_id: int, old_keys: Set[str], new_keys: Set[str]) -> None:
+        """Move a document's postings from old_keys to new_keys"""
+        for key in old_keys - new_keys:
+            postings = index[key]
+            postings.discard(doc_id)
+            if not postings:
+                del index[key]
+        for key in new_keys - old_keys:
+            postings = index.get(key)
+            if postings is None:
+                index[key] = {doc_id}
+            else:
+                postings.add(doc_id)
+
+    def _candidates(self, words: List[str]) -> Optional[Set[int]]:
+        """
+        Intersect trigram postings for all words of three or more characters
+
+        Returns:
+            Candidate document ids, or None when no word is long enough to
+            narrow the search (every document is a candidate)
+        """
+        candidates: Optional[Set[int]] = None
+        # Rarest trigrams first keeps the intersections small
+        keys = sorted(
+            {gram for word in words for gram in trigrams(word)},
+            key=lambda gram: len(self._trigrams.get(gram, ()))
+        )
+        for gram in keys:
+            postings = self._trigrams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                break
+        return candidates
+
+    def _matching_docs(self, words: List[str]) -> Set[int]:
+        """Return the ids of documents containing every word"""
+        haystacks = self._haystacks
+        candidates = self._candidates(words)
+        if candidates is None:
+            items = haystacks.items()
+        else:
+            # A trigram posting is already an exact match for a three-character word
+            words = [word for word in words if len(word) != 3]
+            if not words:
+                return candidates
+            items = [(doc_id, haystacks[doc_id]) for doc_id in candidates]
+
+        if len(words) == 1:
+            word = words[0]
+            return {doc_id for doc_id, haystack in items if word in haystack}
+        return {
+            doc_id for doc_id, haystack in items
+            if all(word in haystack for word in words)
+        }
+
+    def search(self, query: str) -> Set[str]:
+        """
+        Find entities where every query word occurs in some searchable field
+
+        Args:
+            query: Case-insensitive search text; whitespace separates words
+
+        Returns:
+            The set of matching entity IDs
+        """
+        words = query.lower().split()
+        if not words:
+            return set()
+        entity_ids = self._entity_ids
+        return {entity_ids[doc_id] for doc_id in self._matching_docs(words)}
+
+    def rank(
+        self,
+        query: str,
+        limit: int = 0,
+        accept: Optional[Callable[[str], bool]] = None,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[Tuple[float, str]]:
+        """
+        Find matching entities ordered by relevance
+
+        Each query word scores the best field it occurs in (entity_id >
+        friendly_name > state > attributes), halved when it only occurs inside a
+        longer token, and weighted by how rare the word is as a token. Only the
+        top `limit` results are kept, using a bounded heap (O(n log k)); with
+        `after`, those are the top results ranked below it (the next page).
+
+        Args:
+            query: Case-insensitive search text; whitespace separates words
+            limit: Maximum number of results (0 for all matches)
+            accept: Optional entity_id filter applied before scoring
+            after: Optional (score, entity_id) of the last result already
+                   returned; only results ranked after it are considered
+
+        Returns:
+            (score, entity_id) pairs, best first; ties prefer shorter entity IDs
+        """
+        words = query.lower().split()
+        if not words:
+            return []
+
+        entity_ids = self._entity_ids
+        haystacks = self._haystacks
+        doc_ids: Iterable[int] = self._matching_docs(words)
+        if accept is not None:
+            doc_ids = [doc_id for doc_id in doc_ids if accept(entity_ids[doc_id])]
+
+        total = max(len(self._doc_ids), 1)
+        weighted_words = [
+            (
+                word,
+                re.compile(rf"(?<![a-z0-9]){re.escape(word)}(?![a-z0-9])"),
+                math.log(1 + total / (1 + len(self._tokens.get(word, ()))))
+            )
+            for word in dict.fromkeys(words)
+        ]
+
+        # Attribute values are scored as one block after the weighted fields
+        weights = FIELD_WEIGHTS + (ATTRIBUTE_WEIGHT,)
+
+        def score(doc_id: int) -> float:
+            fields = haystacks[doc_id].split(FIELD_SEPARATOR, len(FIELD_WEIGHTS))
+            total_score = 0.0
+            for word, whole_token, idf in weighted_words:
+                best = 0.0
+                for field, weight in zip(fields, weights):
+                    if best >= weight:
+                        # Later fields cannot score higher
+                        break
+                    if word not in field:
+                        continue
+                    if whole_token.search(field):
+                        best = weight
+                        break
+                    best = max(best, weight * PARTIAL_MATCH_FACTOR)
+                total_score += best * idf
+            return total_score
+
+        scored = ((score(doc_id), entity_ids[doc_id]) for doc_id in doc_ids)
+        key = lambda item: (-item[0], len(item[1]), item[1])
+        if after is not None:
+            after_key = key(after)
+            scored = (item for item in scored if key(item) > after_key)
+        if limit > 0:
+            return heapq.nsmallest(limit, scored, key=key)
+        return sorted(scored, key=key)
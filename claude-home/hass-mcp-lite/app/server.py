@@ -2,7 +2,7 @@ import functools
 import logging
 import json
 import httpx
-from typing import List, Dict, Any, Optional, Callable, Awaitable, TypeVar, cast
+from typing import List, Dict, Any, Optional, Callable, Awaitable, TypeVar, Union, cast
 
 # Set up logging
 logging.basicConfig(
@@ -18,8 +18,20 @@ from .hass import (
     get_hass_version, get_entity_state, call_service, get_entities,
     get_automations, restart_home_assistant, 
     cleanup_client, filter_fields, summarize_domain, get_system_overview,
-    get_hass_error_log
+    get_hass_error_log, get_cache_stats, get_entities_by_domain,
+    get_request_stats, get_pool_stats, get_entity_history, search_hass_error_log,
+    bulk_call_service, apply_states, get_entities_by_id, get_snapshot_info,
+    add_state_listener, get_entities_page, lean_entity
 )
+from .budget import (
+    budget_bytes, estimate_bytes, fit_to_budget, drop_large_attributes, lean_entities, drop_attributes,
+    summarize_lists, shorten_strings, Step
+)
+from .config import HA_RENDER_CACHE_MAX_CHARS, HA_SESSION_CONCURRENCY
+from .render_cache import RenderCache
+from .sessions import SessionLimiter
+from .subscriptions import ResourceSubscriptions, resource_scope
+from .tabular import FORMATS, encode_rows, to_table
 
 # Type variable for generic functions
 T = TypeVar('T')
@@ -28,15 +40,120 @@ T = TypeVar('T')
 from mcp.server.fastmcp import FastMCP, Context, Image
 from mcp.server.stdio import stdio_server
 import mcp.types as types
+from pydantic import AnyUrl
 mcp = FastMCP("Hass-MCP", capabilities={
     "resources": {},
     "tools": {},
     "prompts": {}
 })
 
+# resources/subscribe: clients are pushed notifications/resources/updated
+# when an entity a subscribed resource is rendered from changes
+_subscriptions = ResourceSubscriptions()
+add_state_listener(_subscriptions.update)
+
+# Per-session cap on concurrent tool calls and resource reads, so sessions
+# sharing one server (see network.py) cannot flood Home Assistant
+_session_limiter = SessionLimiter(HA_SESSION_CONCURRENCY)
+
+def _current_session() -> Optional[Any]:
+    """Return the MCP session of the request being handled (None outside a request)"""
+    try:
+        return mcp._mcp_server.request_context.session
+    except LookupError:
+        return None
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri: AnyUrl) -> None:
+    """Subscribe the requesting session to updates of a resource"""
+    logger.info(f"Subscribing to resource: {uri}")
+    if resource_scope(str(uri)) is not None:
+        # Load the snapshot (and start the WebSocket mirror) first, so changes
+        # are noticed as they stream in and the initial load is not one
+        await get_snapshot_info()
+    _subscriptions.subscribe(str(uri), mcp._mcp_server.request_context.session)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri: AnyUrl) -> None:
+    """Unsubscribe the requesting session from updates of a resource"""
+    logger.info(f"Unsubscribing from resource: {uri}")
+    _subscriptions.unsubscribe(str(uri), mcp._mcp_server.request_context.session)
+
+def _get_capabilities(*args: Any, **kwargs: Any) -> types.ServerCapabilities:
+    # The low-level server always reports subscribe=False; advertise the handlers above
+    capabilities = _get_base_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
+
+_get_base_capabilities = mcp._mcp_server.get_capabilities
+mcp._mcp_server.get_capabilities = _get_capabilities
+
+# Entities per page of the hass://entities/domain/{domain} resource
+DOMAIN_PAGE_SIZE = 50
+
+# Rendered markdown resources, reused until the entity snapshot changes
+_render_cache = RenderCache(HA_RENDER_CACHE_MAX_CHARS)
+
+async def _snapshot_version() -> Optional[int]:
+    """Return the current entity snapshot version, or None if it is unavailable"""
+    snapshot = await get_snapshot_info()
+    return snapshot.get("snapshot_version")
+
+def _cache_render(uri: str, version: Optional[int], text: str) -> str:
+    """Remember a rendered resource for its snapshot version and return it"""
+    if version is None:
+        return text
+    return _render_cache.put(uri, version, text)
+
+def _entity_steps(*list_keys: str) -> List[Step]:
+    """
+    Degradation steps for entity responses, cheapest loss first
+
+    Responses with a main list (the first of list_keys; the rest are kept
+    whole too) are truncated after these steps; a single entity is kept to
+    its state as a last resort instead.
+    """
+    steps = [drop_large_attributes(), lean_entities(lean_entity), summarize_lists(skip=list_keys)]
+    if not list_keys:
+        steps.append(drop_attributes())
+    return steps
+
+def _encode_list(response: Any, output_format: str, list_key: str) -> Any:
+    """Replace the entity list of a response with its table, CSV or TSV encoding"""
+    if output_format == "json":
+        return response
+    if isinstance(response, list):
+        return encode_rows(response, output_format)
+    if not isinstance(response, dict) or not isinstance(response.get(list_key), list):
+        # Errors pass through unchanged
+        return response
+    encoded: Dict[str, Any] = {}
+    for key, value in response.items():
+        if key == list_key:
+            encoded.update(encode_rows(value, output_format))
+        else:
+            encoded[key] = value
+    if "budget" in encoded:
+        encoded["budget"] = {**encoded["budget"], "bytes": estimate_bytes(encoded)}
+    return encoded
+
+def _unknown_format(output_format: str) -> Optional[Dict[str, Any]]:
+    if output_format in FORMATS:
+        return None
+    return {"error": f"Unknown format '{output_format}' (supported: {', '.join(FORMATS)})"}
+
+def _entity_line(entity: Dict[str, Any]) -> str:
+    """Format one entity as a markdown list item"""
+    friendly_name = entity.get("attributes", {}).get("friendly_name", "")
+    if friendly_name and friendly_name != entity["entity_id"]:
+        return f"- **{entity['entity_id']}**: {entity['state']} ({friendly_name})\n"
+    return f"- **{entity['entity_id']}**: {entity['state']}\n"
+
 def async_handler(command_type: str):
     """
-    Simple decorator that logs the command
+    Simple decorator that logs the command and holds a slot of the
+    requesting session's concurrency limit while it runs
     
     Args:
         command_type: The type of command (for logging)
@@ -45,7 +162,8 @@ def async_handler(command_type: str):
         @functools.wraps(func)
         async def wrapper(*args: Any, **kwargs: Any) -> T:
             logger.info(f"Executing command: {command_type}")
-            return await func(*args, **kwargs)
+            async with _session_limiter.slot(_current_session()):
+                return await func(*args, **kwargs)
         return cast(Callable[..., Awaitable[T]], wrapper)
     return decorator
 
@@ -63,7 +181,14 @@ async def get_version() -> str:
 
 @mcp.tool()
 @async_handler("get_entity")
-async def get_entity(entity_id: str, fields: Optional[List[str]] = None, detailed: bool = False) -> dict:
+async def get_entity(
+    entity_id: str,
+    fields: Optional[List[str]] = None,
+    detailed: bool = False,
+    max_age: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> dict:
     """
     Get the state of a Home Assistant entity with optional field filtering
     
@@ -71,22 +196,75 @@ async def get_entity(entity_id: str, fields: Optional[List[str]] = None, detaile
         entity_id: The entity ID to get (e.g. 'light.living_room')
         fields: Optional list of fields to include (e.g. ['state', 'attr.brightness'])
         detailed: If True, returns all entity fields without filtering
+        max_age: Optional maximum age in seconds of a cached state (0 requires a current state)
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
                 
     Examples:
         entity_id="light.living_room" - basic state check
         entity_id="light.living_room", fields=["state", "attr.brightness"] - specific fields
         entity_id="light.living_room", detailed=True - all details
+        entity_id="sensor.power", max_age=0 - never serve a cached REST snapshot
+        entity_id="media_player.tv", detailed=True, max_tokens=300 - details within a budget
     """
     logger.info(f"Getting entity state: {entity_id}")
     if detailed:
         # Return all fields
-        return await get_entity_state(entity_id, lean=False)
+        result = await get_entity_state(entity_id, lean=False, max_age=max_age)
     elif fields:
         # Return only the specified fields
-        return await get_entity_state(entity_id, fields=fields)
+        result = await get_entity_state(entity_id, fields=fields, max_age=max_age)
     else:
         # Return lean format with essential fields
-        return await get_entity_state(entity_id, lean=True)
+        result = await get_entity_state(entity_id, lean=True, max_age=max_age)
+    return await fit_to_budget(result, budget_bytes(max_tokens, max_bytes), _entity_steps())
+
+@mcp.tool()
+@async_handler("get_entities_by_id")
+async def get_entities_by_id_tool(
+    entity_ids: List[str],
+    fields: Optional[List[str]] = None,
+    detailed: bool = False,
+    max_age: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Get the states of several Home Assistant entities in one call
+    
+    Args:
+        entity_ids: The entity IDs to get (e.g. ['light.living_room', 'sensor.power'])
+        fields: Optional list of fields to include (e.g. ['state', 'attr.brightness'])
+        detailed: If True, returns all entity fields without filtering
+        max_age: Optional maximum age in seconds of cached states (0 requires current states)
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+    
+    Returns:
+        One entry per entity ID in the requested order; unknown entity IDs are
+        reported inline with an "error" key. A response cut to fit a budget is a
+        dictionary with entities, remaining_entity_ids, elided and budget
+    
+    Examples:
+        entity_ids=["light.kitchen", "switch.fan"] - lean states
+        entity_ids=["sensor.a", "sensor.b"], fields=["state", "attr.unit_of_measurement"]
+    """
+    logger.info(f"Getting {len(entity_ids)} entity states")
+    result = await get_entities_by_id(entity_ids, fields=fields, lean=not detailed, max_age=max_age)
+    # The result has one entry per distinct ID, in the requested order
+    unique_ids = list(dict.fromkeys(entity_ids))
+    
+    async def shrink(count: int) -> Dict[str, Any]:
+        return {"entities": result[:count], "remaining_entity_ids": unique_ids[count:]}
+    
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), _entity_steps("entities", "remaining_entity_ids"),
+        shrink, len(result), "entities"
+    )
 
 @mcp.tool()
 @async_handler("entity_action")
@@ -237,8 +415,16 @@ async def list_entities(
     search_query: Optional[str] = None, 
     limit: int = 100,
     fields: Optional[List[str]] = None,
-    detailed: bool = False
-) -> List[Dict[str, Any]]:
+    detailed: bool = False,
+    max_age: Optional[float] = None,
+    rank: bool = False,
+    device_class: Optional[str] = None,
+    paginate: bool = False,
+    cursor: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    format: str = "json"
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """
     Get a list of Home Assistant entities with optional filtering
     
@@ -249,26 +435,54 @@ async def list_entities(
         limit: Maximum number of entities to return (default: 100)
         fields: Optional list of specific fields to include in each entity
         detailed: If True, returns all entity fields without filtering
+        max_age: Optional maximum age in seconds of the cached snapshot (0 requires a current snapshot)
+        rank: If True, search results are ordered by relevance so a small limit keeps the best matches
+        device_class: Optional device_class to filter by (e.g., 'temperature', 'motion')
+        paginate: If True, return one page of `limit` entities (sorted by entity_id,
+                  or by relevance with rank=True) together with a next_cursor
+        cursor: next_cursor from the previous page (implies paginate)
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+        format: "json" (default) for a list of dictionaries, "table" for shared
+                columns (entity_id, state, attr.<name>, ...) plus value rows, or
+                "csv"/"tsv" for the same table as text
     
     Returns:
-        A list of entity dictionaries with lean formatting by default
+        A list of entity dictionaries with lean formatting by default, or with
+        paginate/cursor a dictionary with entities, count, next_cursor (None on
+        the last page), snapshot_version and snapshot_changed (present when
+        entities changed between pages). A response over budget is degraded to
+        a page: large attributes, then full attributes are dropped, and finally
+        only the first entities are kept (with a next_cursor to continue from
+        when paginating)
     
     Examples:
         domain="light" - get all lights
         search_query="kitchen", limit=20 - search entities
+        search_query="kitchen ceiling", limit=5, rank=True - best 5 matches
         domain="sensor", detailed=True - full sensor details
+        domain="sensor", device_class="temperature" - temperature sensors only
+        domain="sensor", limit=100, paginate=True - first 100 sensors and a next_cursor
+        domain="sensor", limit=100, cursor="eyJ2Ijo..." - the next 100 sensors
+        domain="sensor", detailed=True, max_tokens=4000 - as much detail as fits
+        domain="sensor", limit=500, format="table" - columns once, then one row per sensor
     
     Best Practices:
         - Use lean format (default) for most operations
         - Prefer domain filtering over no filtering
         - For domain overviews, use domain_summary_tool instead of list_entities
         - Only request detailed=True when necessary for full attribute inspection
+        - Use format="table" or "csv" for long listings; key names are not repeated per entity
         - To get all entity types/domains, use list_entities without a domain filter, 
           then extract domains from entity_ids
     """
     log_message = "Getting entities"
     if domain:
         log_message += f" for domain: {domain}"
+    if device_class:
+        log_message += f" with device_class: {device_class}"
     if search_query:
         log_message += f" matching: '{search_query}'"
     if limit != 100:
@@ -282,19 +496,57 @@ async def list_entities(
     
     logger.info(log_message)
     
+    unknown = _unknown_format(format)
+    if unknown:
+        return unknown
+    
     # Handle special case where search_query is a wildcard/asterisk - just ignore it
     if search_query == "*":
         search_query = None
         logger.info("Converting '*' search query to None (retrieving all entities)")
     
-    # Use the updated get_entities function with field filtering
-    return await get_entities(
-        domain=domain, 
-        search_query=search_query, 
-        limit=limit,
-        fields=fields,
-        lean=not detailed  # Use lean format unless detailed is requested
+    async def page(count: int) -> Dict[str, Any]:
+        return await get_entities_page(
+            domain=domain,
+            search_query=search_query,
+            limit=count,
+            fields=fields,
+            lean=not detailed,
+            max_age=max_age,
+            rank=rank,
+            device_class=device_class,
+            cursor=cursor
+        )
+    
+    if paginate or cursor:
+        result = await page(limit)
+        size = len(result.get("entities", []))
+        shrink = page
+    else:
+        # Use the updated get_entities function with field filtering
+        result = await get_entities(
+            domain=domain, 
+            search_query=search_query, 
+            limit=limit,
+            fields=fields,
+            lean=not detailed,  # Use lean format unless detailed is requested
+            max_age=max_age,
+            rank=rank,
+            device_class=device_class
+        )
+        size = len(result) if isinstance(result, list) else 0
+        built = result
+        
+        async def shrink(count: int) -> List[Dict[str, Any]]:
+            # The first entities of the list already built, in its order
+            return built[:count]
+    
+    # Over budget, fewer entities are returned (as a page that can be
+    # continued when paginating)
+    result = await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), _entity_steps("entities"), shrink, size, "entities"
     )
+    return _encode_list(result, format, "entities")
 
 @mcp.resource("hass://entities")
 @async_handler("get_all_entities_resource")
@@ -322,48 +574,48 @@ async def get_all_entities_resource() -> str:
         - Consider starting with a search if looking for specific entities
     """
     logger.info("Getting all entities as a resource")
-    entities = await get_entities(lean=True)
+    uri = "hass://entities"
+    version = await _snapshot_version()
+    cached = _render_cache.get(uri, version) if version is not None else None
+    if cached is not None:
+        return cached
     
-    # Check if there was an error
-    if isinstance(entities, dict) and "error" in entities:
-        return f"Error retrieving entities: {entities['error']}"
-    if len(entities) == 1 and isinstance(entities[0], dict) and "error" in entities[0]:
-        return f"Error retrieving entities: {entities[0]['error']}"
-    
-    # Format the entities as a string
-    result = "# Home Assistant Entities\n\n"
-    result += f"Total entities: {len(entities)}\n\n"
-    result += "⚠️ **Note**: For better performance and token efficiency, consider using:\n"
-    result += "- Domain filtering: `hass://entities/domain/{domain}`\n"
-    result += "- Domain summaries: `hass://entities/domain/{domain}/summary`\n"
-    result += "- Entity search: `hass://search/{query}`\n\n"
+    # Entities come pre-grouped from the store's domain partitions
+    domains = await get_entities_by_domain()
     
-    # Group entities by domain for better organization
-    domains = {}
-    for entity in entities:
-        domain = entity["entity_id"].split(".")[0]
-        if domain not in domains:
-            domains[domain] = []
-        domains[domain].append(entity)
+    # Check if there was an error
+    if isinstance(domains, dict) and "error" in domains:
+        return f"Error retrieving entities: {domains['error']}"
+    
+    # Collect the parts and join them once
+    parts = [
+        "# Home Assistant Entities\n\n",
+        f"Total entities: {sum(len(entities) for entities in domains.values())}\n\n",
+        "⚠️ **Note**: For better performance and token efficiency, consider using:\n",
+        "- Domain filtering: `hass://entities/domain/{domain}`\n",
+        "- Domain summaries: `hass://entities/domain/{domain}/summary`\n",
+        "- Entity search: `hass://search/{query}`\n\n",
+    ]
     
-    # Build the string with entities grouped by domain
+    # List the entities grouped by domain
     for domain in sorted(domains.keys()):
-        domain_count = len(domains[domain])
-        result += f"## {domain.capitalize()} ({domain_count})\n\n"
-        for entity in sorted(domains[domain], key=lambda e: e["entity_id"]):
-            # Get a friendly name if available
-            friendly_name = entity.get("attributes", {}).get("friendly_name", "")
-            result += f"- **{entity['entity_id']}**: {entity['state']}"
-            if friendly_name and friendly_name != entity["entity_id"]:
-                result += f" ({friendly_name})"
-            result += "\n"
-        result += "\n"
+        parts.append(f"## {domain.capitalize()} ({len(domains[domain])})\n\n")
+        parts.extend(_entity_line(entity) for entity in sorted(domains[domain], key=lambda e: e["entity_id"]))
+        parts.append("\n")
     
-    return result
+    return _cache_render(uri, version, "".join(parts))
 
 @mcp.tool()
 @async_handler("search_entities_tool")
-async def search_entities_tool(query: str, limit: int = 20) -> Dict[str, Any]:
+async def search_entities_tool(
+    query: str,
+    limit: int = 20,
+    rank: bool = True,
+    cursor: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    format: str = "json"
+) -> Dict[str, Any]:
     """
     Search for entities matching a query string
     
@@ -371,21 +623,53 @@ async def search_entities_tool(query: str, limit: int = 20) -> Dict[str, Any]:
         query: The search query to match against entity IDs, names, and attributes.
               (Note: Does not support wildcards. To get all entities, leave this blank or use list_entities tool)
         limit: Maximum number of results to return (default: 20)
+        rank: If True (default), results are ordered by relevance: entity_id matches
+              first, then friendly_name, state and attribute matches; otherwise
+              results are ordered by entity_id
+        cursor: next_cursor from a previous call with the same query, for the next results
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+        format: "json" (default) for results as dictionaries, "table" for shared
+                columns plus value rows, or "csv"/"tsv" for the same table as text
     
     Returns:
         A dictionary containing search results and metadata:
         - count: Total number of matching entities found
         - results: List of matching entities with essential information
+          (replaced by columns and rows, csv or tsv with another format)
         - domains: Map of domains with counts (e.g. {"light": 3, "sensor": 2})
+        - next_cursor: Cursor for the next results (None when there are no more)
         
     Examples:
         query="temperature" - find temperature entities
         query="living room", limit=10 - find living room entities
+        query="living room", limit=10, cursor="eyJ2Ijo..." - the next 10
         query="", limit=500 - list all entity types
+        query="temperature", limit=100, format="csv" - compact CSV listing
         
     """
     logger.info(f"Searching for entities matching: '{query}' with limit: {limit}")
+    unknown = _unknown_format(format)
+    if unknown:
+        return {**unknown, "count": 0, "results": [], "domains": {}}
+    
+    result = await _search_entities(query, limit, rank, cursor)
+    if "error" in result:
+        return result
     
+    async def shrink(count: int) -> Dict[str, Any]:
+        # Fewer results; next_cursor continues after them
+        return await _search_entities(query, count, rank, cursor)
+    
+    result = await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [], shrink, len(result["results"]), "results"
+    )
+    return _encode_list(result, format, "results")
+
+async def _search_entities(query: str, limit: int, rank: bool, cursor: Optional[str]) -> Dict[str, Any]:
+    """Search entities and simplify the results for search_entities_tool"""
     # Special case - treat "*" as empty query to just return entities without filtering
     if query == "*":
         query = ""
@@ -394,11 +678,12 @@ async def search_entities_tool(query: str, limit: int = 20) -> Dict[str, Any]:
     # Handle empty query as a special case to just return entities up to the limit
     if not query or not query.strip():
         logger.info(f"Empty query - retrieving up to {limit} entities without filtering")
-        entities = await get_entities(limit=limit, lean=True)
+        page = await get_entities_page(limit=limit, lean=True, cursor=cursor)
         
         # Check if there was an error
-        if isinstance(entities, dict) and "error" in entities:
-            return {"error": entities["error"], "count": 0, "results": [], "domains": {}}
+        if "error" in page:
+            return {"error": page["error"], "count": 0, "results": [], "domains": {}}
+        entities = page["entities"]
         
         # No query, but we'll return a structured result anyway
         domains_count = {}
@@ -440,15 +725,17 @@ async def search_entities_tool(query: str, limit: int = 20) -> Dict[str, Any]:
             "count": len(simplified_entities),
             "results": simplified_entities,
             "domains": domains_count,
-            "query": "all entities (no filtering)"
+            "query": "all entities (no filtering)",
+            "next_cursor": page["next_cursor"]
         }
     
     # Normal search with non-empty query
-    entities = await get_entities(search_query=query, limit=limit, lean=True)
+    page = await get_entities_page(search_query=query, limit=limit, lean=True, rank=rank, cursor=cursor)
     
     # Check if there was an error
-    if isinstance(entities, dict) and "error" in entities:
-        return {"error": entities["error"], "count": 0, "results": [], "domains": {}}
+    if "error" in page:
+        return {"error": page["error"], "count": 0, "results": [], "domains": {}}
+    entities = page["entities"]
     
     # Prepare the results
     domains_count = {}
@@ -490,9 +777,10 @@ async def search_entities_tool(query: str, limit: int = 20) -> Dict[str, Any]:
         "count": len(simplified_entities),
         "results": simplified_entities,
         "domains": domains_count,
-        "query": query
+        "query": query,
+        "next_cursor": page["next_cursor"]
     }
-    
+
 @mcp.resource("hass://search/{query}/{limit}")
 @async_handler("search_entities_resource_with_limit")
 async def search_entities_resource_with_limit(query: str, limit: str) -> str:
@@ -537,44 +825,42 @@ async def search_entities_resource_with_limit(query: str, limit: str) -> str:
     if not query or not query.strip():
         return "# Entity Search\n\nError: No search query provided"
     
-    entities = await get_entities(search_query=query, limit=limit_int, lean=True)
+    uri = f"hass://search/{query}/{limit_int}"
+    version = await _snapshot_version()
+    cached = _render_cache.get(uri, version) if version is not None else None
+    if cached is not None:
+        return cached
+    
+    # Rank so the limit keeps the most relevant matches
+    entities = await get_entities(search_query=query, limit=limit_int, lean=True, rank=True)
     
     # Check if there was an error
     if isinstance(entities, dict) and "error" in entities:
         return f"# Entity Search\n\nError retrieving entities: {entities['error']}"
     
     # Format the search results
-    result = f"# Entity Search Results for '{query}' (Limit: {limit_int})\n\n"
+    parts = [f"# Entity Search Results for '{query}' (Limit: {limit_int})\n\n"]
     
     if not entities:
-        result += "No entities found matching your search query.\n"
-        return result
+        parts.append("No entities found matching your search query.\n")
+        return _cache_render(uri, version, "".join(parts))
     
-    result += f"Found {len(entities)} matching entities:\n\n"
+    parts.append(f"Found {len(entities)} matching entities:\n\n")
     
     # Group entities by domain for better organization
     domains = {}
     for entity in entities:
-        domain = entity["entity_id"].split(".")[0]
-        if domain not in domains:
-            domains[domain] = []
-        domains[domain].append(entity)
+        domains.setdefault(entity["entity_id"].split(".")[0], []).append(entity)
     
-    # Build the string with entities grouped by domain
+    # List the entities grouped by domain
     for domain in sorted(domains.keys()):
-        result += f"## {domain.capitalize()}\n\n"
-        for entity in sorted(domains[domain], key=lambda e: e["entity_id"]):
-            # Get a friendly name if available
-            friendly_name = entity.get("attributes", {}).get("friendly_name", entity["entity_id"])
-            result += f"- **{entity['entity_id']}**: {entity['state']}"
-            if friendly_name != entity["entity_id"]:
-                result += f" ({friendly_name})"
-            result += "\n"
-        result += "\n"
-    
-    # Add a more structured summary section for easy LLM processing
-    result += "## Summary in JSON format\n\n"
-    result += "```json\n"
+        parts.append(f"## {domain.capitalize()}\n\n")
+        parts.extend(_entity_line(entity) for entity in sorted(domains[domain], key=lambda e: e["entity_id"]))
+        parts.append("\n")
+    
+    # Add a more structured summary section for easy LLM processing, as one
+    # compact table instead of a second indented copy of every key
+    parts.append("## Summary in JSON format (columns and rows)\n\n```json\n")
     
     # Create a simplified JSON representation with only essential fields
     simplified_entities = []
@@ -602,22 +888,33 @@ async def search_entities_resource_with_limit(query: str, limit: str) -> str:
         
         simplified_entities.append(simplified_entity)
     
-    result += json.dumps(simplified_entities, indent=2)
-    result += "\n```\n"
+    parts.append(json.dumps(to_table(simplified_entities), separators=(",", ":"), ensure_ascii=False))
+    parts.append("\n```\n")
     
-    return result
+    return _cache_render(uri, version, "".join(parts))
 
 # The domain_summary_tool is already implemented, no need to duplicate it
 
 @mcp.tool()
 @async_handler("domain_summary")
-async def domain_summary_tool(domain: str, example_limit: int = 3) -> Dict[str, Any]:
+async def domain_summary_tool(
+    domain: str,
+    example_limit: int = 3,
+    sample: bool = False,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Get a summary of entities in a specific domain
     
     Args:
         domain: The domain to summarize (e.g., 'light', 'switch', 'sensor')
         example_limit: Maximum number of examples to include for each state
+        sample: If True, pick the examples at random from all entities in each state
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
     
     Returns:
         A dictionary containing:
@@ -625,21 +922,33 @@ async def domain_summary_tool(domain: str, example_limit: int = 3) -> Dict[str,
         - state_distribution: Count of entities in each state
         - examples: Sample entities for each state
         - common_attributes: Most frequently occurring attributes
+        - snapshot_version, snapshot_age_seconds: Entity snapshot the numbers reflect
         
     Examples:
         domain="light" - get light summary
         domain="climate", example_limit=5 - climate summary with more examples
+        domain="sensor", sample=True - random examples from a large domain
     Best Practices:
         - Use this before retrieving all entities in a domain to understand what's available    """
     logger.info(f"Getting domain summary for: {domain}")
-    return await summarize_domain(domain, example_limit)
+    result = await summarize_domain(domain, example_limit, sample)
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [summarize_lists(), shorten_strings()],
+        protect=("domain", "total_count", "state_distribution", "error")
+    )
 
 @mcp.tool()
 @async_handler("system_overview")
-async def system_overview() -> Dict[str, Any]:
+async def system_overview(max_tokens: Optional[int] = None, max_bytes: Optional[int] = None) -> Dict[str, Any]:
     """
     Get a comprehensive overview of the entire Home Assistant system
     
+    Args:
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+    
     Returns:
         A dictionary containing:
         - total_entities: Total count of all entities
@@ -647,6 +956,7 @@ async def system_overview() -> Dict[str, Any]:
         - domain_samples: Representative sample entities for each domain (2-3 per domain)
         - domain_attributes: Common attributes for each domain
         - area_distribution: Entities grouped by area (if available)
+        - snapshot_version, snapshot_age_seconds: Entity snapshot the numbers reflect
         
     Examples:
         Returns domain counts, sample entities, and common attributes
@@ -656,7 +966,11 @@ async def system_overview() -> Dict[str, Any]:
         - After getting an overview, use domain_summary_tool to dig deeper into specific domains
     """
     logger.info("Generating complete system overview")
-    return await get_system_overview()
+    result = await get_system_overview()
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [summarize_lists(), shorten_strings()],
+        protect=("total_entities", "domain_count", "most_common_domains", "error")
+    )
 
 @mcp.resource("hass://entities/{entity_id}/detailed")
 @async_handler("get_entity_resource_detailed")
@@ -774,7 +1088,7 @@ async def list_states_by_domain_resource(domain: str) -> str:
         domain: The domain to filter by (e.g., 'light', 'switch', 'sensor')
     
     Returns:
-        A markdown formatted string with all entities in the specified domain
+        A markdown formatted string with the first page of entities in the specified domain
         
     Examples:
         ```
@@ -792,54 +1106,77 @@ async def list_states_by_domain_resource(domain: str) -> str:
         - Use this endpoint when you need detailed information about all entities of a specific type
         - For a more concise overview, use the domain summary endpoint: hass://entities/domain/{domain}/summary
         - For sensors and other high-count domains, consider using a search to further filter results
+        - Entities are listed 50 per page; follow the "Next page" link for more
     """
     logger.info(f"Getting entities for domain: {domain}")
+    return await _render_domain_page(domain)
+
+@mcp.resource("hass://entities/domain/{domain}/page/{cursor}")
+@async_handler("list_states_by_domain_page_resource")
+async def list_states_by_domain_page_resource(domain: str, cursor: str) -> str:
+    """
+    Get a further page of the entities of a domain as a resource
     
-    # Fixed pagination values for now
-    page = 1
-    page_size = 50
-    
-    # Get all entities for the specified domain (using lean format for token efficiency)
-    entities = await get_entities(domain=domain, lean=True)
-    
-    # Check if there was an error
-    if isinstance(entities, dict) and "error" in entities:
-        return f"Error retrieving entities: {entities['error']}"
-    
-    # Format the entities as a string
-    result = f"# {domain.capitalize()} Entities\n\n"
-    
-    # Pagination info (fixed for now due to MCP limitations)
-    total_entities = len(entities)
+    Args:
+        domain: The domain to filter by (e.g., 'light', 'switch', 'sensor')
+        cursor: The cursor from the "Next page" link of the previous page
     
-    # List the entities
-    for entity in sorted(entities, key=lambda e: e["entity_id"]):
-        # Get a friendly name if available
-        friendly_name = entity.get("attributes", {}).get("friendly_name", entity["entity_id"])
-        result += f"- **{entity['entity_id']}**: {entity['state']}"
-        if friendly_name != entity["entity_id"]:
-            result += f" ({friendly_name})"
-        result += "\n"
+    Returns:
+        A markdown formatted string with the next entities in the specified domain
+    """
+    logger.info(f"Getting a page of entities for domain: {domain}")
+    return await _render_domain_page(domain, cursor)
+
+async def _render_domain_page(domain: str, cursor: Optional[str] = None) -> str:
+    """Render one page of a domain's entities, sorted by entity_id"""
+    uri = f"hass://entities/domain/{domain}" + (f"/page/{cursor}" if cursor else "")
+    version = await _snapshot_version()
+    cached = _render_cache.get(uri, version) if version is not None else None
+    if cached is not None:
+        return cached
     
-    # Add link to summary
-    result += f"\n## Related Resources\n\n"
-    result += f"- [View domain summary](/api/resource/hass://entities/domain/{domain}/summary)\n"
+    # Get one page of the domain (using lean format for token efficiency)
+    page = await get_entities_page(domain=domain, limit=DOMAIN_PAGE_SIZE, lean=True, cursor=cursor)
     
-    return result
+    # Check if there was an error
+    if "error" in page:
+        return f"Error retrieving entities: {page['error']}"
+    
+    # List the entities, then link to the next page and the summary
+    parts = [f"# {domain.capitalize()} Entities\n\n"]
+    parts.extend(_entity_line(entity) for entity in page["entities"])
+    if page.get("snapshot_changed"):
+        parts.append("\n_Entities changed since the previous page was read._\n")
+    parts.append("\n## Related Resources\n\n")
+    if page["next_cursor"]:
+        parts.append(f"- [Next page](hass://entities/domain/{domain}/page/{page['next_cursor']})\n")
+    parts.append(f"- [View domain summary](/api/resource/hass://entities/domain/{domain}/summary)\n")
+    
+    return _cache_render(uri, version, "".join(parts))
 
 # Automation management MCP tools
 @mcp.tool()
 @async_handler("list_automations")
-async def list_automations() -> List[Dict[str, Any]]:
+async def list_automations(
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """
     Get a list of all automations from Home Assistant
     
     This function retrieves all automations configured in Home Assistant,
     including their IDs, entity IDs, state, and display names.
     
+    Args:
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+    
     Returns:
         A list of automation dictionaries, each containing id, entity_id, 
-        state, and alias (friendly name) fields.
+        state, and alias (friendly name) fields. Over budget, a dictionary
+        with the first automations, elided and budget.
         
     Examples:
         Returns all automation objects with state and friendly names
@@ -859,8 +1196,14 @@ async def list_automations() -> List[Dict[str, Any]]:
         if isinstance(automations, list) and len(automations) == 1 and isinstance(automations[0], dict) and "error" in automations[0]:
             logger.warning(f"Error getting automations: {automations[0]['error']}")
             return []
-            
-        return automations
+        
+        async def shrink(count: int) -> List[Dict[str, Any]]:
+            return automations[:count]
+        
+        return await fit_to_budget(
+            automations, budget_bytes(max_tokens, max_bytes), [shorten_strings()],
+            shrink, len(automations), "automations"
+        )
     except Exception as e:
         logger.error(f"Error in list_automations: {str(e)}")
         return []
@@ -887,6 +1230,11 @@ async def call_service_tool(domain: str, service: str, data: Optional[Dict[str,
     """
     Call any Home Assistant service (low-level API access)
     
+    Entities named by entity_id are read fresh from Home Assistant on the
+    next read. Changes to entities targeted through area_id, device_id,
+    floor_id or label_id only show up once Home Assistant pushes them to the
+    live mirror (or, without it, on the next full refresh).
+    
     Args:
         domain: The domain of the service (e.g., 'light', 'switch', 'automation')
         service: The service to call (e.g., 'turn_on', 'turn_off', 'toggle')
@@ -904,6 +1252,63 @@ async def call_service_tool(domain: str, service: str, data: Optional[Dict[str,
     logger.info(f"Calling Home Assistant service: {domain}.{service} with data: {data}")
     return await call_service(domain, service, data or {})
 
+@mcp.tool()
+@async_handler("bulk_call_service")
+async def bulk_call_service_tool(
+    operations: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Call several Home Assistant services in one request
+    
+    Operations with the same domain, service and data are merged into a single
+    call with a list of entity IDs (e.g. turning off 40 lights is one call);
+    the remaining calls run concurrently.
+    
+    Args:
+        operations: List of {"domain": ..., "service": ..., "data": {...}} operations
+        max_concurrency: Optional maximum number of calls running at the same time
+    
+    Returns:
+        The number of calls made, the number of failed operations and a status
+        table with one row per operation: [index, service, targets, status, changed]
+    
+    Examples:
+        operations=[{"domain": "light", "service": "turn_off", "data": {"entity_id": "light.hall"}},
+                    {"domain": "light", "service": "turn_off", "data": {"entity_id": "light.stairs"}},
+                    {"domain": "cover", "service": "close_cover", "data": {"entity_id": "cover.garage"}}]
+    """
+    logger.info(f"Calling {len(operations)} Home Assistant service operations in bulk")
+    return await bulk_call_service(operations, max_concurrency)
+
+@mcp.tool()
+@async_handler("apply_states")
+async def apply_states_tool(targets: Dict[str, Any], dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Bring Home Assistant entities to target states, calling only what is needed
+    
+    Entities that are already in their target state are skipped; the other
+    changes are merged into as few service calls as possible. Calls for the
+    same entity are made one after another (e.g. set_hvac_mode before
+    set_temperature) and stop at the first failure.
+    
+    Args:
+        targets: Map of entity ID to a target state, or to a dictionary with
+                 "state" and attributes to set
+        dry_run: If True, only report the service calls that would be made
+    
+    Returns:
+        The number of unchanged entities, errors per entity, the planned
+        [entity_id, service] operations and the status table of the calls made
+    
+    Examples:
+        targets={"light.kitchen": {"state": "on", "brightness": 128}, "switch.fan": "off"}
+        targets={"cover.blinds": {"position": 40}, "climate.living_room": {"state": "heat", "temperature": 21}}
+        targets={"input_number.target": 20, "lock.front_door": "locked"}
+    """
+    logger.info(f"Applying target states to {len(targets)} entities")
+    return await apply_states(targets, dry_run)
+
 # Prompt functionality
 @mcp.prompt()
 def create_automation(trigger_type: str, entity_id: str = None):
@@ -1127,95 +1532,204 @@ You'll help the user create optimized dashboards by:
 # Documentation endpoint
 @mcp.tool()
 @async_handler("get_history")
-async def get_history(entity_id: str, hours: int = 24) -> Dict[str, Any]:
+async def get_history(
+    entity_id: str,
+    hours: int = 24,
+    max_points: Optional[int] = None,
+    method: str = "buckets",
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Get the history of an entity's state changes
     
     Args:
         entity_id: The entity ID to get history for
         hours: Number of hours of history to retrieve (default: 24)
+        max_points: Maximum number of points to return (default: 200)
+        method: Reduction for numeric sensors: "buckets" (min/max/mean per time bucket)
+                or "lttb" (representative samples that keep the curve's shape)
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
     
     Returns:
         A dictionary containing:
         - entity_id: The entity ID requested
-        - states: List of state objects with timestamps
-        - count: Number of state changes found
+        - kind: "numeric" or "discrete"
+        - states: Reduced list of states with timestamps; numeric buckets carry
+          start, end, min, max, mean and count instead of a single state
+        - count: Number of raw state changes found
+        - reduced: Whether states were collapsed or bucketed
+        - state_durations: Seconds spent in each state (discrete entities)
         - first_changed: Timestamp of earliest state change
         - last_changed: Timestamp of most recent state change
         
     Examples:
         entity_id="light.living_room" - get 24h history
-        entity_id="sensor.temperature", hours=168 - get 7 day history
+        entity_id="sensor.temperature", hours=168 - get 7 day history as ~200 buckets
+        entity_id="sensor.power", hours=24, max_points=50, method="lttb" - 50 representative samples
     Best Practices:
-        - Keep hours reasonable (24-72) for token efficiency
-        - Use for entities with discrete state changes rather than continuously changing sensors
-        - Consider the state distribution rather than every individual state    
+        - Runs of identical states are collapsed, so discrete entities stay compact
+        - Lower max_points for long periods when only the trend matters
+        - Use state_durations rather than individual runs for "how long was it on" questions
     """
     logger.info(f"Getting history for entity: {entity_id}, hours: {hours}")
     
-    try:
-        # Get current state to ensure entity exists
-        current = await get_entity_state(entity_id, detailed=True)
-        if isinstance(current, dict) and "error" in current:
-            return {
-                "entity_id": entity_id,
-                "error": current["error"],
-                "states": [],
-                "count": 0
-            }
-        
-        # For now, this is a stub that returns minimal dummy data
-        # In a real implementation, this would call the Home Assistant history API
-        now = current.get("last_updated", "2023-03-15T12:00:00.000Z")
-        
-        # Create a dummy history (would be replaced with real API call)
-        states = [
-            {
-                "state": current.get("state", "unknown"),
-                "last_changed": now,
-                "attributes": current.get("attributes", {})
-            }
-        ]
-        
-        # Add a note about this being placeholder data
-        return {
-            "entity_id": entity_id,
-            "states": states,
-            "count": len(states),
-            "first_changed": now,
-            "last_changed": now,
-            "note": "This is placeholder data. Future versions will include real historical data."
-        }
-    except Exception as e:
-        logger.error(f"Error retrieving history for {entity_id}: {str(e)}")
+    result = await get_entity_history(entity_id, hours=hours, max_points=max_points, method=method)
+    if isinstance(result, dict) and "error" in result:
         return {
             "entity_id": entity_id,
-            "error": f"Error retrieving history: {str(e)}",
+            "error": result["error"],
             "states": [],
             "count": 0
         }
+    
+    async def shrink(count: int) -> Dict[str, Any]:
+        # Fewer points cover the same period more coarsely
+        return await get_entity_history(entity_id, hours=hours, max_points=count, method=method)
+    
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [], shrink, len(result.get("states", [])), "states"
+    )
+
+@mcp.resource("hass://diagnostics")
+@async_handler("get_diagnostics_resource")
+async def get_diagnostics_resource() -> str:
+    """
+    Get hass-mcp diagnostics as a resource
+    
+    Reports the entity cache (snapshot version, age, hit/miss counters),
+    request coalescing counters and connection pool usage so cache behaviour
+    and pool sizing can be checked during a session.
+    
+    Returns:
+        A markdown formatted string with a JSON diagnostics block
+    """
+    logger.info("Getting diagnostics")
+    diagnostics = {
+        "cache": get_cache_stats(),
+        "requests": get_request_stats(),
+        "pool": get_pool_stats(),
+        "rendered_resources": _render_cache.stats(),
+        "subscriptions": _subscriptions.stats(),
+        "sessions": _session_limiter.stats()
+    }
+    return f"# Hass-MCP Diagnostics\n\n```json\n{json.dumps(diagnostics, indent=2)}\n```\n"
 
 @mcp.tool()
 @async_handler("get_error_log")
-async def get_error_log() -> Dict[str, Any]:
+async def get_error_log(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Get the Home Assistant error log for troubleshooting
     
+    Args:
+        limit: Maximum number of log lines to return (default: 50)
+        cursor: next_cursor from a previous call to page further back in the log
+        since: follow_cursor from a previous call to get only lines added since then
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+    
     Returns:
         A dictionary containing:
-        - log_text: The full error log text
-        - error_count: Number of ERROR entries found
-        - warning_count: Number of WARNING entries found
-        - integration_mentions: Map of integration names to mention counts
+        - lines: Log lines, newest first
+        - next_cursor: Cursor for the next older page (None when there are no more lines)
+        - follow_cursor: Pass as since later to get only new lines
+        - new_lines: Number of lines added since the previous call
+        - error_count: Number of ERROR records found
+        - warning_count: Number of WARNING records found
+        - integration_mentions: Map of integration names to record counts
+        - log_replaced: Present when Home Assistant started a new log since the cursor was issued
         - error: Error message if retrieval failed
         
     Examples:
-        Returns errors, warnings count and integration mentions
+        limit=50 - the 50 most recent lines plus counters
+        cursor="3:950" - the next 50 older lines
+        since="3:1000" - only lines written after a previous call
     Best Practices:
         - Use this tool when troubleshooting specific Home Assistant errors
-        - Look for patterns in repeated errors
-        - Pay attention to timestamps to correlate errors with events
-        - Focus on integrations with many mentions in the log    
+        - Start with the newest lines and page back only as far as needed
+        - Use since=follow_cursor to watch for new errors after a change
+        - Focus on integrations with many mentions in the log
+        - Prefer search_error_log to see repeated errors as grouped records    
+    """
+    logger.info(f"Getting Home Assistant error log (limit: {limit})")
+    result = await get_hass_error_log(limit=limit, cursor=cursor, since=since)
+    if "error" in result:
+        return result
+    
+    async def shrink(count: int) -> Dict[str, Any]:
+        # Fewer lines of the log just fetched; next_cursor continues after them
+        return await get_hass_error_log(limit=count, cursor=cursor, since=since, refresh=False)
+    
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [shorten_strings()], shrink, len(result["lines"]), "lines"
+    )
+
+@mcp.tool()
+@async_handler("search_error_log")
+async def search_error_log(
+    level: Optional[str] = None,
+    integration: Optional[str] = None,
+    since: Optional[str] = None,
+    text: Optional[str] = None,
+    limit: int = 20,
+    max_tokens: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
     """
-    logger.info("Getting Home Assistant error log")
-    return await get_hass_error_log()
+    Search the Home Assistant error log as grouped, structured records
+    
+    Each log record is parsed into timestamp, level, logger, message and
+    traceback. Repeats (same level, logger and message apart from numbers and
+    ids) are grouped with a count and first/last-seen times.
+    
+    Args:
+        level: Minimum level, e.g. "WARNING" returns warnings, errors and critical records
+        integration: Integration name (e.g. "mqtt", "zha") or logger prefix
+        since: Only groups seen at or after this time ("YYYY-MM-DD HH:MM:SS", log local time)
+        text: Case-insensitive text to find in the message or traceback
+        limit: Maximum number of groups to return (default: 20)
+        max_tokens: Optional response budget in tokens; a larger response is degraded
+                    step by step and reports what was left out under "elided"
+                    (or is an error with "min_bytes" when it cannot be made to fit)
+        max_bytes: Optional response budget in bytes (the smaller budget wins)
+    
+    Returns:
+        A dictionary containing:
+        - groups: Matching groups, most recently seen first, each with fingerprint, level,
+          integration, logger, message, count, first_seen, last_seen, traceback (if any)
+          and count_since (when since is given)
+        - total_groups: Number of matching groups before the limit
+        - error_count, warning_count, integration_mentions: Counters for the whole log
+        
+    Examples:
+        level="ERROR" - distinct errors in the log
+        integration="mqtt", level="WARNING" - MQTT warnings and errors
+        since="2024-05-01 08:00:00", text="timeout" - recent timeouts
+    Best Practices:
+        - Start here instead of reading raw log lines; repeats are already collapsed
+        - Use get_error_log for the raw lines around a specific time
+    """
+    logger.info(f"Searching error log (level: {level}, integration: {integration}, since: {since}, text: {text})")
+    result = await search_hass_error_log(level=level, integration=integration, since=since, text=text, limit=limit)
+    if "error" in result:
+        return result
+    
+    async def shrink(count: int) -> Dict[str, Any]:
+        return await search_hass_error_log(
+            level=level, integration=integration, since=since, text=text, limit=count, refresh=False
+        )
+    
+    return await fit_to_budget(
+        result, budget_bytes(max_tokens, max_bytes), [shorten_strings()], shrink, len(result["groups"]), "groups"
+    )
@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class SessionLimiter:
+    """
+    Caps how many requests each MCP session runs at the same time
+
+    Sessions are held weakly, each with its own semaphore, so one busy agent
+    cannot flood Home Assistant while other sessions sharing the process
+    still get their turn. A handler called from inside another one (already
+    holding its session's slot) does not take a second slot.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._holding: contextvars.ContextVar[bool] = contextvars.ContextVar("session_slot", default=False)
+        self.active = 0
+        self.waits = 0
+
+    @asynccontextmanager
+    async def slot(self, session: Optional[Any]) -> AsyncIterator[None]:
+        """Hold one of the session's slots (no-op without a session or limit)"""
+        if session is None or self.limit <= 0 or self._holding.get():
+            yield
+            return
+        semaphore = self._semaphores.get(session)
+        if semaphore is None:
+            semaphore = self._semaphores[session] = asyncio.Semaphore(self.limit)
+        if semaphore.locked():
+            self.waits += 1
+        async with semaphore:
+            token = self._holding.set(True)
+            self.active += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._holding.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the limit, known sessions, requests running and requests that waited"""
+        return {
+            "limit": self.limit,
+            "sessions": len(self._semaphores),
+            "active": self.active,
+            "waits": self.waits,
+        }
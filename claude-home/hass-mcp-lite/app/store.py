@@ -0,0 +1,375 @@
+import time
+import logging
+from typing import Dict, Any, Optional, List, Iterable, Set, Callable, Tuple
+
+from .compact import compact_entity
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Called as listener(entity_id, old_state, new_state); either state may be None
+StoreListener = Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]
+
+def _device_class(entity: Dict[str, Any]) -> Any:
+    return (entity.get("attributes") or {}).get("device_class")
+
+class EntityStore:
+    """
+    Versioned in-memory map of entity states shared by all read paths
+
+    The store is filled either by the WebSocket mirror (in which case it is
+    `live` and always current) or by full REST snapshots and single-entity
+    fetches, which age and can be invalidated per entity. Every mutation bumps
+    `version`, so derived data can be keyed by the snapshot it was built from,
+    and is reported to listeners so indexes can be maintained incrementally.
+
+    Entities are also partitioned by domain and by device_class, so domain
+    scoped reads only touch their own partition.
+
+    With compact=True (the default) states are held as CompactEntity
+    records, which read like the original dictionaries but share their key
+    strings and attribute key tuples; context is only kept with keep_context.
+    Entities handed to callers must be converted with compact.plain() before
+    they are serialized.
+    """
+
+    def __init__(self, compact: bool = True, keep_context: bool = False):
+        self.compact = compact
+        self.keep_context = keep_context
+        self._entities: Dict[str, Dict[str, Any]] = {}
+        self._domains: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._device_classes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._invalidated: Set[str] = set()
+        # (domain, device_class) -> sorted entity IDs, kept until membership changes
+        self._sorted_ids: Dict[Tuple[Optional[str], Optional[str]], List[str]] = {}
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.live = False
+        self.hits = 0
+        self.misses = 0
+        self._listeners: List[StoreListener] = []
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._entities
+
+    def _age(self, entity_id: Optional[str] = None) -> Optional[float]:
+        """Seconds since the entity (or the full snapshot) was last refreshed"""
+        if self.live:
+            return 0.0
+        fetched = self.loaded_at
+        if entity_id is not None and entity_id in self._fetched_at:
+            fetched = max(fetched or 0.0, self._fetched_at[entity_id])
+        if fetched is None:
+            return None
+        return time.monotonic() - fetched
+
+    @property
+    def invalidated(self) -> Set[str]:
+        """Entity IDs that must be refetched before they are served again"""
+        return self._invalidated
+
+    def is_fresh(self, max_age: float) -> bool:
+        """
+        Check whether the full snapshot is younger than max_age seconds
+
+        Invalidated entities are not considered here; callers refetch them
+        individually (see `invalidated`).
+        """
+        age = self._age()
+        return age is not None and age <= max_age
+
+    def age(self) -> Optional[float]:
+        """Seconds since the snapshot was loaded (0 while live, None if never loaded)"""
+        return self._age()
+
+    def peek(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Get an entity regardless of freshness, without touching the counters"""
+        return self._entities.get(entity_id)
+
+    def get(self, entity_id: str, max_age: float) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached entity if it is fresh enough
+
+        Args:
+            entity_id: The entity ID to look up
+            max_age: Maximum tolerated age in seconds
+
+        Returns:
+            The cached state, or None on a miss (unknown, stale or invalidated)
+        """
+        entity = self._entities.get(entity_id)
+        if entity is not None and entity_id not in self._invalidated:
+            age = self._age(entity_id)
+            if age is not None and age <= max_age:
+                self.hits += 1
+                return entity
+        self.misses += 1
+        return None
+
+    def values(
+        self,
+        max_age: float,
+        domain: Optional[str] = None,
+        device_class: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get cached entities if the snapshot is fresh enough
+
+        Args:
+            max_age: Maximum tolerated age in seconds
+            domain: Optional domain partition to read
+            device_class: Optional device_class partition to read
+
+        Returns:
+            A list of states, or None when the caller has to refresh the store
+        """
+        if self.usable(max_age):
+            return self.select(domain, device_class)
+        return None
+
+    def usable(self, max_age: float) -> bool:
+        """
+        Check (and count as a hit or miss) whether the snapshot may be served
+
+        Args:
+            max_age: Maximum tolerated age in seconds
+
+        Returns:
+            False when the caller has to refresh the store
+        """
+        if self.is_fresh(max_age) and (self.live or not self._invalidated):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def _prepare(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        """Bring an incoming state into the store's representation"""
+        if self.compact:
+            return compact_entity(entity, self.keep_context)
+        return entity
+
+    def canonical(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return the stored object if it equals entity, otherwise entity in
+        the store's representation
+
+        Used while streaming a snapshot so unchanged entities keep their
+        existing object and the freshly decoded duplicate can be freed at once.
+        """
+        entity = self._prepare(entity)
+        old = self._entities.get(entity["entity_id"])
+        if old is not None and old == entity:
+            return old
+        return entity
+
+    def mapping(self) -> Dict[str, Dict[str, Any]]:
+        """Return a shallow copy of the {entity_id: state} map"""
+        return dict(self._entities)
+
+    def select(self, domain: Optional[str] = None, device_class: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read entities from the matching partition, regardless of freshness"""
+        if domain is None and device_class is None:
+            return list(self._entities.values())
+        if device_class is None:
+            return list(self._domains.get(domain, {}).values())
+
+        by_class = self._device_classes.get(device_class, {})
+        if domain is None:
+            return list(by_class.values())
+        by_domain = self._domains.get(domain, {})
+        if len(by_class) < len(by_domain):
+            return [entity for entity_id, entity in by_class.items() if entity_id in by_domain]
+        return [entity for entity_id, entity in by_domain.items() if entity_id in by_class]
+
+    def sorted_ids(self, domain: Optional[str] = None, device_class: Optional[str] = None) -> List[str]:
+        """
+        Return the entity IDs of a partition in sorted order
+
+        The list is built once and reused until an entity joins or leaves the
+        partition, so keyset pagination can seek into it with bisect. The list
+        is owned by the store; callers must not modify it.
+        """
+        key = (domain, device_class)
+        entity_ids = self._sorted_ids.get(key)
+        if entity_ids is None:
+            entity_ids = self._sorted_ids[key] = sorted(
+                entity["entity_id"] for entity in self.select(domain, device_class)
+            )
+        return entity_ids
+
+    def partitions(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Return the live domain partitions ({domain: {entity_id: state}})
+
+        The mapping is owned by the store; callers must not modify it.
+        """
+        return self._domains
+
+    def _add_to_partitions(self, entity_id: str, entity: Dict[str, Any]) -> None:
+        """Place an entity in its domain and device_class partitions"""
+        domain = entity_id.split(".", 1)[0]
+        partition = self._domains.get(domain)
+        if partition is None:
+            partition = self._domains[domain] = {}
+        partition[entity_id] = entity
+
+        device_class = _device_class(entity)
+        if isinstance(device_class, str):
+            partition = self._device_classes.get(device_class)
+            if partition is None:
+                partition = self._device_classes[device_class] = {}
+            partition[entity_id] = entity
+
+    def _remove_from_partitions(self, entity_id: str, entity: Dict[str, Any], keep_domain: bool = False) -> None:
+        """Take an entity out of its partitions, dropping emptied ones"""
+        if not keep_domain:
+            domain = entity_id.split(".", 1)[0]
+            partition = self._domains.get(domain)
+            if partition is not None:
+                partition.pop(entity_id, None)
+                if not partition:
+                    del self._domains[domain]
+
+        device_class = _device_class(entity)
+        if isinstance(device_class, str):
+            partition = self._device_classes.get(device_class)
+            if partition is not None:
+                partition.pop(entity_id, None)
+                if not partition:
+                    del self._device_classes[device_class]
+
+    def add_listener(self, listener: StoreListener) -> None:
+        """
+        Register a callback for entity additions, changes and removals
+
+        The listener is immediately replayed with the current contents so it
+        starts out in sync with the store.
+        """
+        self._listeners.append(listener)
+        for entity_id, entity in self._entities.items():
+            listener(entity_id, None, entity)
+
+    def _notify(self, entity_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Report one entity change to all listeners"""
+        for listener in self._listeners:
+            listener(entity_id, old, new)
+
+    def replace_all(self, entities: Iterable[Dict[str, Any]], live: Optional[bool] = None) -> None:
+        """
+        Replace the whole snapshot (a REST load or a mirror resubscribe)
+
+        Only entities that were added, changed or removed are reported to
+        listeners, so a refresh of a mostly unchanged snapshot is cheap for
+        them, and `version` is only bumped when something did change.
+
+        Args:
+            entities: The complete set of entity states
+            live: True when the mirror's initial event fills the store; None
+                  (a REST load) keeps the current flag, so a ready mirror is
+                  never demoted by a snapshot
+        """
+        previous = self._entities
+        self._entities = {entity["entity_id"]: entity for entity in map(self._prepare, entities)}
+        self._domains = {}
+        self._device_classes = {}
+        for entity_id, entity in self._entities.items():
+            self._add_to_partitions(entity_id, entity)
+        self._fetched_at = {}
+        self._invalidated = set()
+        self.loaded_at = time.monotonic()
+        if live is not None:
+            self.live = live
+
+        changes = []
+        added = 0
+        for entity_id, entity in self._entities.items():
+            old = previous.get(entity_id)
+            if old is None:
+                added += 1
+                changes.append((entity_id, None, entity))
+            elif old is not entity and old != entity:
+                changes.append((entity_id, old, entity))
+        if len(previous) > len(self._entities) - added:
+            # Some previous entities are gone
+            for entity_id, old in previous.items():
+                if entity_id not in self._entities:
+                    changes.append((entity_id, old, None))
+        if changes or self.version == 0:
+            self.version += 1
+            self._sorted_ids = {}
+        for entity_id, old, new in changes:
+            self._notify(entity_id, old, new)
+
+    def upsert(self, entity: Dict[str, Any]) -> None:
+        """Insert or replace a single entity state"""
+        entity = self._prepare(entity)
+        entity_id = entity["entity_id"]
+        old = self._entities.get(entity_id)
+        self._fetched_at[entity_id] = time.monotonic()
+        self._invalidated.discard(entity_id)
+        if old is not None and (old is entity or old == entity):
+            # Confirmed as unchanged: only its freshness moves
+            return
+        self._entities[entity_id] = entity
+        if old is not None:
+            # The domain partition keeps its slot; only device_class may move
+            self._remove_from_partitions(entity_id, old, keep_domain=True)
+        if old is None or _device_class(old) != _device_class(entity):
+            self._sorted_ids = {}
+        self._add_to_partitions(entity_id, entity)
+        self.version += 1
+        self._notify(entity_id, old, entity)
+
+    def remove(self, entity_id: str) -> None:
+        """Remove an entity that no longer exists"""
+        old = self._entities.pop(entity_id, None)
+        if old is not None:
+            self._remove_from_partitions(entity_id, old)
+            self._sorted_ids = {}
+            self._fetched_at.pop(entity_id, None)
+            self._invalidated.discard(entity_id)
+            self.version += 1
+            self._notify(entity_id, old, None)
+
+    def invalidate(self, entity_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        Mark entities as stale so the next read refetches them
+
+        Args:
+            entity_ids: The entities to invalidate, or None to invalidate everything
+        """
+        if entity_ids is None:
+            self.loaded_at = None
+            self._fetched_at = {}
+            self._invalidated = set(self._entities)
+        else:
+            self._invalidated.update(entity_ids)
+
+    def set_live(self, live: bool) -> None:
+        """Mark whether a live feed (the WebSocket mirror) keeps the store current"""
+        if self.live and not live:
+            # Without the feed the snapshot starts aging from now
+            self.loaded_at = time.monotonic()
+        self.live = live
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and snapshot metadata"""
+        lookups = self.hits + self.misses
+        age = self._age()
+        return {
+            "version": self.version,
+            "entities": len(self._entities),
+            "domains": len(self._domains),
+            "live": self.live,
+            "compact": self.compact,
+            "age_seconds": round(age, 3) if age is not None else None,
+            "invalidated": len(self._invalidated),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import weakref
+from typing import Dict, Any, Optional, Set, Tuple
+from urllib.parse import unquote
+
+from .search import matches
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def resource_scope(uri: str) -> Optional[Tuple[str, str]]:
+    """
+    Work out which entities a hass:// resource is rendered from
+
+    Returns:
+        ("entity", entity_id), ("domain", domain), ("search", query),
+        ("all", "") or None for resources that do not depend on entity states
+    """
+    if not uri.startswith("hass://"):
+        return None
+    parts = [unquote(part) for part in uri[len("hass://"):].split("/")]
+    if parts[0] == "entities":
+        if len(parts) == 1:
+            return ("all", "")
+        if parts[1] == "domain" and len(parts) >= 3:
+            return ("domain", parts[2])
+        if len(parts) == 2 or (len(parts) == 3 and parts[2] == "detailed"):
+            return ("entity", parts[1])
+    if parts[0] == "search" and len(parts) >= 2:
+        return ("search", parts[1])
+    return None
+
+class ResourceSubscriptions:
+    """
+    Subscribed hass:// resources per MCP session, notified on entity changes
+
+    Registered as an EntityStore listener, so it sees exactly the entities
+    that were added, changed or removed. Each change is mapped to the
+    subscribed URIs rendered from that entity (by entity ID, domain or search
+    query) and every affected URI is sent one notifications/resources/updated
+    per burst of changes. Sessions are held weakly and dropped once a
+    notification to them fails.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, "weakref.WeakSet[Any]"] = {}
+        self._by_entity: Dict[str, Set[str]] = {}
+        self._by_domain: Dict[str, Set[str]] = {}
+        self._searches: Dict[str, str] = {}
+        self._everything: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.notifications = 0
+        self.failures = 0
+
+    def subscribe(self, uri: str, session: Any) -> None:
+        """
+        Subscribe a session to a resource URI
+
+        Resources that are not rendered from entity states are accepted but
+        never notified.
+        """
+        scope = resource_scope(uri)
+        self._sessions.setdefault(uri, weakref.WeakSet()).add(session)
+        if scope is None:
+            return
+        kind, key = scope
+        if kind == "entity":
+            self._by_entity.setdefault(key, set()).add(uri)
+        elif kind == "domain":
+            self._by_domain.setdefault(key, set()).add(uri)
+        elif kind == "search":
+            self._searches[uri] = key
+        else:
+            self._everything.add(uri)
+
+    def unsubscribe(self, uri: str, session: Any) -> None:
+        """Unsubscribe a session from a resource URI"""
+        sessions = self._sessions.get(uri)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                self._forget(uri)
+
+    def _forget(self, uri: str) -> None:
+        """Drop a URI nobody is subscribed to any more"""
+        self._sessions.pop(uri, None)
+        self._pending.discard(uri)
+        self._searches.pop(uri, None)
+        self._everything.discard(uri)
+        for index in (self._by_entity, self._by_domain):
+            for key in [key for key, uris in index.items() if uri in uris]:
+                index[key].discard(uri)
+                if not index[key]:
+                    del index[key]
+
+    def update(self, entity_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Store listener: queue the subscribed URIs rendered from this entity"""
+        if not self._sessions:
+            return
+        affected = set(self._everything)
+        affected.update(self._by_entity.get(entity_id, ()))
+        affected.update(self._by_domain.get(entity_id.split(".", 1)[0], ()))
+        for uri, query in self._searches.items():
+            if uri not in affected and any(entity is not None and matches(query, entity) for entity in (old, new)):
+                affected.add(uri)
+        if affected:
+            self._pending |= affected
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop, so no session to notify either
+            self._pending.clear()
+            return
+        # Runs once the current burst of changes (a snapshot reload) is applied
+        self._flush_task = loop.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, set()
+                for uri in pending:
+                    for session in list(self._sessions.get(uri, ())):
+                        try:
+                            await session.send_resource_updated(uri)
+                            self.notifications += 1
+                        except Exception as e:
+                            logger.debug(f"Dropping subscriber of {uri}: {str(e)}")
+                            self.failures += 1
+                            self.unsubscribe(uri, session)
+                    if not self._sessions.get(uri, True):
+                        # Every subscriber is gone (sessions are held weakly)
+                        self._forget(uri)
+        finally:
+            self._flush_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return subscription counts and notification counters"""
+        return {
+            "resources": len(self._sessions),
+            "subscriptions": sum(len(sessions) for sessions in self._sessions.values()),
+            "notifications": self.notifications,
+            "failures": self.failures,
+        }
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import logging
+from typing import Dict, Any, List
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Output formats of list and search results; "json" keeps the list of dictionaries
+FORMATS = ("json", "table", "csv", "tsv")
+
+def table_columns(rows: List[Dict[str, Any]]) -> List[str]:
+    """
+    Collect the columns shared by a list of entity dictionaries
+
+    Top-level fields come first (entity_id, state, ...), then one
+    "attr.<name>" column per attribute any row has, in first-seen order.
+    """
+    fields: Dict[str, None] = {}
+    attributes: Dict[str, None] = {}
+    for row in rows:
+        for key, value in row.items():
+            if key == "attributes" and isinstance(value, dict):
+                for name in value:
+                    attributes[name] = None
+            else:
+                fields[key] = None
+    return list(fields) + [f"attr.{name}" for name in attributes]
+
+def table_rows(rows: List[Dict[str, Any]], columns: List[str]) -> List[List[Any]]:
+    """Return the values of each row in column order (None where a row has no value)"""
+    split = [
+        (column[5:], True) if column.startswith("attr.") else (column, False)
+        for column in columns
+    ]
+    values = []
+    for row in rows:
+        attributes = row.get("attributes")
+        if not isinstance(attributes, dict):
+            attributes = {}
+        values.append([attributes.get(name) if nested else row.get(name) for name, nested in split])
+    return values
+
+def to_table(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Encode entity dictionaries as {"columns": [...], "rows": [[...], ...]}"""
+    columns = table_columns(rows)
+    return {"columns": columns, "rows": table_rows(rows, columns)}
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+def to_delimited(rows: List[Dict[str, Any]], delimiter: str = ",") -> str:
+    """Encode entity dictionaries as CSV (or TSV) text with a header line"""
+    columns = table_columns(rows)
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(columns)
+    for values in table_rows(rows, columns):
+        writer.writerow([_cell(value) for value in values])
+    return output.getvalue()
+
+def encode_rows(rows: List[Dict[str, Any]], output_format: str) -> Dict[str, Any]:
+    """
+    Encode a list of entity dictionaries in an output format
+
+    Args:
+        rows: The entity dictionaries
+        output_format: "table", "csv" or "tsv"
+
+    Returns:
+        The fields replacing the list in a response: {"columns", "rows"}
+        for a table, {"csv": text} or {"tsv": text}
+
+    Raises:
+        ValueError: For an unknown format
+    """
+    if output_format == "table":
+        return to_table(rows)
+    if output_format == "csv":
+        return {"csv": to_delimited(rows, ",")}
+    if output_format == "tsv":
+        return {"tsv": to_delimited(rows, "\t")}
+    raise ValueError(f"Unknown format '{output_format}' (supported: {', '.join(FORMATS)})")
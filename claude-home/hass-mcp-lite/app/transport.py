@@ -0,0 +1,148 @@
+import importlib.util
+import logging
+from typing import Dict, Any, Optional, AsyncIterator, Callable
+
+import httpx
+
+from .config import (
+    HA_URL, HA_POOL_MAX_CONNECTIONS, HA_POOL_MAX_KEEPALIVE, HA_POOL_KEEPALIVE_EXPIRY, HA_HTTP2,
+    HA_CONNECT_TIMEOUT, HA_POOL_TIMEOUT, HA_TIMEOUT_STATES, HA_TIMEOUT_ERROR_LOG, HA_TIMEOUT_SERVICES,
+    get_ha_headers
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def _timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(read, connect=HA_CONNECT_TIMEOUT, pool=HA_POOL_TIMEOUT)
+
+# Timeouts per endpoint class. "states" covers the read API (states, config
+# and history), "error_log" the full log download and "services" service calls.
+ENDPOINT_TIMEOUTS: Dict[str, httpx.Timeout] = {
+    "states": _timeout(HA_TIMEOUT_STATES),
+    "error_log": _timeout(HA_TIMEOUT_ERROR_LOG),
+    "services": _timeout(HA_TIMEOUT_SERVICES),
+}
+
+def endpoint_timeout(endpoint: str) -> httpx.Timeout:
+    """Return the timeout of an endpoint class ("states", "error_log" or "services")"""
+    return ENDPOINT_TIMEOUTS[endpoint]
+
+def http2_enabled() -> bool:
+    """
+    Check whether HTTP/2 should be offered
+
+    It is offered unless HA_HTTP2 turns it off, when the h2 package is
+    importable (the "http2" extra) and HA_URL is https: httpx only negotiates
+    HTTP/2 over TLS, so a plain http URL always uses HTTP/1.1.
+    """
+    if HA_HTTP2 in ("0", "false", "no", "off"):
+        return False
+    forced = HA_HTTP2 != "auto"
+    if importlib.util.find_spec("h2") is None:
+        if forced:
+            logger.warning("HA_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        return False
+    if not HA_URL.lower().startswith("https://"):
+        if forced:
+            logger.warning("HA_HTTP2 is set but HA_URL is not https; using HTTP/1.1")
+        return False
+    return True
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that reports once when it is closed (the connection is free again)"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """
+    Connection-pooling transport that reports how busy its pool is
+
+    A request is in flight from when it is sent until its response body is
+    closed. Over HTTP/1.1 each one holds a connection, so a request sent
+    while max_connections are already in flight waits for the pool and is
+    counted as a wait. Idle connections are those kept alive for the next
+    request.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HA_POOL_MAX_CONNECTIONS,
+        max_keepalive: int = HA_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = HA_POOL_KEEPALIVE_EXPIRY,
+        http2: bool = False
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        super().__init__(limits=self.limits, http2=http2)
+        self.http2 = http2
+        self.requests = 0
+        self.waits = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if not self.http2 and self.in_flight >= self.limits.max_connections:
+            self.waits += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        response.stream = _ReleasingStream(response.stream, self._release)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool limits, connections in use and idle, and request/wait counters"""
+        connections = [connection for connection in self._pool.connections if not connection.is_closed()]
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "connections": len(connections),
+            "in_use": len(connections) - idle,
+            "idle": idle,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "waits": self.waits,
+        }
+
+def create_client(transport: PooledTransport) -> httpx.AsyncClient:
+    """
+    Create the shared Home Assistant client
+
+    The base URL and authorization headers are set once here, so requests
+    only pass an API path (and a per-endpoint timeout).
+    """
+    return httpx.AsyncClient(
+        base_url=HA_URL,
+        headers=get_ha_headers(),
+        timeout=endpoint_timeout("states"),
+        transport=transport
+    )
@@ -0,0 +1,83 @@
+"""
+Benchmark: lean field projection per entity
+
+Compares the previous per-entity path (build the lean field list, then let
+filter_fields re-parse every "attr.X" string) with compiled per-domain
+projections. Run from the hass-mcp-lite directory:
+
+    python -m benchmarks.bench_projection [entity_count]
+"""
+import sys
+import time
+from typing import Dict, Any, List
+
+from app.hass import DEFAULT_LEAN_FIELDS, DOMAIN_IMPORTANT_ATTRIBUTES, get_lean_projection
+
+from .synthetic import make_entities
+
+def legacy_filter_fields(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """filter_fields as it was before projections were compiled"""
+    if not fields:
+        return data
+    result = {"entity_id": data["entity_id"]}
+    for field in fields:
+        if field == "state":
+            result["state"] = data.get("state")
+        elif field == "attributes":
+            result["attributes"] = data.get("attributes", {})
+        elif field.startswith("attr.") and len(field) > 5:
+            attr_name = field[5:]
+            attributes = data.get("attributes", {})
+            if attr_name in attributes:
+                if "attributes" not in result:
+                    result["attributes"] = {}
+                result["attributes"][attr_name] = attributes[attr_name]
+        elif field == "context":
+            if "context" in data:
+                result["context"] = data["context"]
+        elif field in ["last_updated", "last_changed"]:
+            if field in data:
+                result[field] = data[field]
+    return result
+
+def legacy_lean(entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    result = []
+    for entity in entities:
+        entity_domain = entity["entity_id"].split('.')[0]
+        lean_fields = DEFAULT_LEAN_FIELDS.copy()
+        if entity_domain in DOMAIN_IMPORTANT_ATTRIBUTES:
+            for attr in DOMAIN_IMPORTANT_ATTRIBUTES[entity_domain]:
+                lean_fields.append(f"attr.{attr}")
+        result.append(legacy_filter_fields(entity, lean_fields))
+    return result
+
+def compiled_lean(entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        get_lean_projection(entity["entity_id"].split('.', 1)[0]).apply(entity)
+        for entity in entities
+    ]
+
+def best_of(func, entities, rounds: int = 5) -> float:
+    """Return the best wall time in seconds over several rounds"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(entities)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    entities = make_entities(count)
+
+    assert legacy_lean(entities) == compiled_lean(entities), "projections disagree"
+
+    before = best_of(legacy_lean, entities)
+    after = best_of(compiled_lean, entities)
+    print(f"entities: {count}")
+    print(f"before: {before * 1e3:8.2f} ms total  {before / count * 1e9:7.0f} ns/entity")
+    print(f"after:  {after * 1e3:8.2f} ms total  {after / count * 1e9:7.0f} ns/entity")
+    print(f"speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark: resident memory of the entity snapshot held by EntityStore
+
+The same /api/states body is loaded the way _load_snapshot does (streamed
+in 64 KiB chunks) into a store holding plain dictionaries ("before",
+HA_COMPACT_STATES=false) and into one holding CompactEntity records
+("after"). Memory still allocated once the load has finished is measured
+with tracemalloc; it excludes the body itself. Run from the hass-mcp-lite
+directory:
+
+    python -m benchmarks.bench_snapshot_memory [entity_count]
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from app.store import EntityStore
+
+from .bench_state_parsing import load_streaming
+from .synthetic import make_entities
+
+def measure(body: bytes, compact: bool):
+    """Return (retained bytes, seconds, store) for one load into an empty store"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    store = EntityStore(compact=compact)
+    load_streaming(body, store)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained, elapsed, store
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    body = json.dumps(make_entities(count), separators=(",", ":")).encode()
+    print(f"entities: {count}  body: {len(body) / 1e6:.1f} MB")
+
+    results = {}
+    for name, compact in (("before", False), ("after", True)):
+        retained, elapsed, store = measure(body, compact)
+        results[name] = retained
+        print(
+            f"{name:6}  retained {retained / 1e6:6.2f} MB  {retained / count:6.0f} B/entity"
+            f"  load {elapsed * 1e3:6.0f} ms"
+        )
+        del store
+    print(f"reduction: {results['before'] / results['after']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: peak memory of loading a /api/states snapshot into the cache
+
+"before" buffers the whole compact body (as Home Assistant sends it) and
+decodes it with json.loads, which is what response.json() does; "after"
+decodes it incrementally with JSONArrayStream from 64 KiB chunks, as
+_load_snapshot does. Both are measured for a first
+load into an empty store and for a refresh of an unchanged store. Peak
+memory is measured with tracemalloc and excludes the store's existing
+contents. Run from the hass-mcp-lite directory:
+
+    python -m benchmarks.bench_state_parsing [entity_count]
+"""
+import codecs
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Iterator
+
+from app.hass import STATE_ITEM_HINT
+from app.jsonstream import JSONArrayStream
+from app.store import EntityStore
+
+from .synthetic import make_entities
+
+CHUNK_SIZE = 65536
+
+def iter_chunks(body: bytes) -> Iterator[bytes]:
+    """Yield the body in network-sized pieces"""
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+def load_buffered(body: bytes, store: EntityStore) -> None:
+    # httpx keeps the complete body, then response.json() decodes all of it
+    content = b"".join(iter_chunks(body))
+    store.replace_all(json.loads(content))
+
+def load_streaming(body: bytes, store: EntityStore) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = JSONArrayStream(item_hint=STATE_ITEM_HINT)
+    entities = []
+    for chunk in iter_chunks(body):
+        for entity in parser.feed(decoder.decode(chunk)):
+            entities.append(store.canonical(entity))
+    parser.close()
+    store.replace_all(entities)
+
+def measure(load, body: bytes, store: EntityStore):
+    """Return (peak bytes above the starting point, seconds) for one load"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    load(body, store)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak, elapsed
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    body = json.dumps(make_entities(count), separators=(",", ":")).encode()
+    print(f"entities: {count}  body: {len(body) / 1e6:.1f} MB")
+
+    for name, load in (("before", load_buffered), ("after", load_streaming)):
+        store = EntityStore()
+        first_peak, first_time = measure(load, body, store)
+        refresh_peak, refresh_time = measure(load, body, store)
+        print(
+            f"{name:6}  first load: peak {first_peak / 1e6:6.1f} MB {first_time * 1e3:6.0f} ms"
+            f"   refresh: peak {refresh_peak / 1e6:6.1f} MB {refresh_time * 1e3:6.0f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
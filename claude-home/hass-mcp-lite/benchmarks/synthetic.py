@@ -0,0 +1,50 @@
+"""Synthetic Home Assistant states shaped like /api/states items"""
+import random
+from typing import Dict, Any, List
+
+DOMAINS = ["light", "switch", "sensor", "binary_sensor", "climate", "media_player", "cover", "automation"]
+ROOMS = ["kitchen", "living room", "bedroom", "garage", "office", "hall", "bathroom", "garden"]
+
+def make_entity(index: int, rnd: random.Random) -> Dict[str, Any]:
+    """Build one plausible entity state"""
+    domain = DOMAINS[index % len(DOMAINS)]
+    room = ROOMS[(index // len(DOMAINS)) % len(ROOMS)]
+    attributes: Dict[str, Any] = {"friendly_name": f"{room.title()} {domain.replace('_', ' ')} {index}"}
+    state = "on" if index % 2 else "off"
+
+    if domain == "light":
+        attributes.update(brightness=rnd.randint(0, 255), color_temp=rnd.randint(153, 500),
+                          supported_color_modes=["color_temp", "hs"], supported_features=44)
+    elif domain == "sensor":
+        attributes.update(device_class="temperature", unit_of_measurement="°C", state_class="measurement")
+        state = f"{rnd.uniform(15, 25):.1f}"
+    elif domain == "binary_sensor":
+        attributes.update(device_class="motion")
+    elif domain == "climate":
+        attributes.update(hvac_mode="heat", hvac_modes=["off", "heat", "auto"], current_temperature=20.5,
+                          temperature=21, hvac_action="heating", min_temp=7, max_temp=35)
+        state = "heat"
+    elif domain == "media_player":
+        attributes.update(media_title=f"Track {index}", media_artist="Artist", source="Spotify",
+                          volume_level=0.4, source_list=["Spotify", "Radio", "TV"])
+        state = "playing"
+    elif domain == "cover":
+        attributes.update(current_position=rnd.randint(0, 100), device_class="shade")
+        state = "open"
+    elif domain == "automation":
+        attributes.update(id=str(index), last_triggered="2024-01-01T00:00:00+00:00", mode="single")
+
+    timestamp = "2024-01-01T00:00:00.000000+00:00"
+    return {
+        "entity_id": f"{domain}.{room.replace(' ', '_')}_{index}",
+        "state": state,
+        "attributes": attributes,
+        "last_changed": timestamp,
+        "last_updated": timestamp,
+        "context": {"id": f"01HABCDEFGHJKMNPQRSTV{index:05d}", "parent_id": None, "user_id": None},
+    }
+
+def make_entities(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Build count deterministic entity states"""
+    rnd = random.Random(seed)
+    return [make_entity(index, rnd) for index in range(count)]
@@ -0,0 +1,14 @@
+import pytest
+
+from app import hass
+from benchmarks.synthetic import make_entities
+
+@pytest.fixture
+def loaded_store(monkeypatch):
+    """The shared entity cache holding 400 synthetic states, with no Home Assistant behind it"""
+    monkeypatch.setattr(hass, "HA_TOKEN", "test-token")
+    monkeypatch.setattr(hass, "HA_MIRROR_ENABLED", False)
+    hass._store.replace_all(make_entities(400))
+    yield hass._store
+    hass._store.set_live(False)
+    hass._store.replace_all([])
@@ -0,0 +1,84 @@
+import random
+
+from app.aggregates import EntityAggregates, UNKNOWN_AREA, area_of
+from app.compact import plain
+from app.store import EntityStore
+from benchmarks.synthetic import make_entities
+
+def recount(store):
+    """Aggregates built from scratch over the store's current contents"""
+    aggregates = EntityAggregates()
+    for entity_id, entity in store.mapping().items():
+        aggregates.update(entity_id, None, entity)
+    return aggregates
+
+def snapshot(aggregates):
+    return {
+        domain: (
+            aggregate.count,
+            {state: set(members) for state, members in aggregate.states.items()},
+            dict(aggregate.attributes),
+            dict(aggregate.areas),
+        )
+        for domain, aggregate in aggregates.domains.items()
+    }
+
+def churn(store, rng, steps):
+    """Random additions, state/attribute/area changes and removals"""
+    for step in range(steps):
+        entity_ids = sorted(store.mapping())
+        entity_id = rng.choice(entity_ids)
+        entity = plain(store.peek(entity_id))
+        action = rng.randrange(6)
+        if action == 0:
+            store.remove(entity_id)
+        elif action == 1:
+            store.upsert({**entity, "state": rng.choice(["on", "off", "unavailable", "42"])})
+        elif action == 2:
+            store.upsert({**entity, "attributes": {**entity["attributes"], f"extra_{step % 3}": step}})
+        elif action == 3:
+            store.upsert({**entity, "attributes": {"area_name": rng.choice(["Kitchen", "Loft"])}})
+        elif action == 4:
+            store.upsert({**entity, "last_updated": f"2024-01-02T00:00:{step % 60:02d}+00:00"})
+        else:
+            domain = rng.choice(["light", "lock", "vacuum"])
+            store.upsert({"entity_id": f"{domain}.new_{step}", "state": "on", "attributes": {}})
+
+def test_incremental_aggregates_match_a_full_recount():
+    store = EntityStore()
+    aggregates = EntityAggregates()
+    store.add_listener(aggregates.update)
+    store.replace_all(make_entities(200))
+    assert snapshot(aggregates) == snapshot(recount(store))
+
+    rng = random.Random(7)
+    for _ in range(5):
+        churn(store, rng, 100)
+        assert snapshot(aggregates) == snapshot(recount(store))
+
+    store.replace_all(make_entities(50, seed=4))
+    assert snapshot(aggregates) == snapshot(recount(store))
+
+def test_emptied_domains_are_dropped():
+    store = EntityStore()
+    aggregates = EntityAggregates()
+    store.add_listener(aggregates.update)
+    store.upsert({"entity_id": "lock.front", "state": "locked", "attributes": {}})
+    assert aggregates.domain("lock").state_counts() == {"locked": 1}
+    store.remove("lock.front")
+    assert aggregates.domain("lock") is None
+    assert aggregates.most_common_domains(5) == []
+
+def test_area_distribution_and_top_attributes():
+    store = EntityStore()
+    aggregates = EntityAggregates()
+    store.add_listener(aggregates.update)
+    store.replace_all([
+        {"entity_id": "light.a", "state": "on", "attributes": {"area_name": "Kitchen", "brightness": 1}},
+        {"entity_id": "light.b", "state": "off", "attributes": {"brightness": 2}},
+        {"entity_id": "switch.c", "state": "on", "attributes": {"area_id": "hall"}},
+    ])
+    assert aggregates.area_distribution() == {"Kitchen": {"light": 1}, UNKNOWN_AREA: {"light": 1}, "hall": {"switch": 1}}
+    assert aggregates.domain("light").top_attributes(1) == [("brightness", 2)]
+    assert aggregates.most_common_domains(1) == [("light", 2)]
+    assert area_of({"attributes": None}) == UNKNOWN_AREA
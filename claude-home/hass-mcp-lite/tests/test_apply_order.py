@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import hass
+
+def entity(entity_id, state, **attributes):
+    return {"entity_id": entity_id, "state": state, "attributes": attributes}
+
+@pytest.fixture
+def service_log(loaded_store, monkeypatch):
+    """Fake service endpoint that records calls and overlapping calls per entity"""
+    log = {"calls": [], "overlaps": [], "fail": set()}
+    in_flight = set()
+
+    async def handler(request):
+        domain, service = request.url.path.split("/")[-2:]
+        entity_ids = json.loads(request.content)["entity_id"]
+        entity_ids = [entity_ids] if isinstance(entity_ids, str) else entity_ids
+        log["overlaps"].extend(entity_id for entity_id in entity_ids if entity_id in in_flight)
+        in_flight.update(entity_ids)
+        # The first operation of an entity is the slow one
+        await asyncio.sleep(0.02 if service in ("set_hvac_mode", "turn_on") else 0)
+        in_flight.difference_update(entity_ids)
+        log["calls"].append((f"{domain}.{service}", sorted(entity_ids)))
+        if f"{domain}.{service}" in log["fail"]:
+            return httpx.Response(500, text="failed")
+        return httpx.Response(200, json=[])
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ha.test")
+    monkeypatch.setattr(hass, "_client", client)
+    for state in (
+        entity("climate.living", "off", temperature=18),
+        entity("media_player.tv", "off"),
+        entity("light.a", "off"),
+        entity("light.b", "off"),
+    ):
+        loaded_store.upsert(state)
+    return log
+
+TARGETS = {
+    "climate.living": {"state": "heat", "temperature": 21},
+    "media_player.tv": {"state": "on", "volume_level": 0.3},
+    "light.a": "on",
+    "light.b": "on",
+}
+
+def test_operations_of_one_entity_run_in_order(service_log):
+    result = asyncio.run(hass.apply_states(TARGETS, max_age=3600))
+    assert service_log["overlaps"] == []
+    calls = [name for name, _ in service_log["calls"]]
+    assert calls.index("climate.set_hvac_mode") < calls.index("climate.set_temperature")
+    assert calls.index("media_player.turn_on") < calls.index("media_player.volume_set")
+    # The first wave still merges the identical light calls into one
+    assert ("light.turn_on", ["light.a", "light.b"]) in service_log["calls"]
+    assert result["calls"] == 5
+    assert [row[0] for row in result["rows"]] == list(range(6))
+    assert result["failed"] == 0
+
+def test_later_operations_are_skipped_after_a_failure(service_log):
+    service_log["fail"].add("climate.set_hvac_mode")
+    result = asyncio.run(hass.apply_states(TARGETS, max_age=3600))
+    assert "climate.set_temperature" not in [name for name, _ in service_log["calls"]]
+    statuses = {row[1]: row[3] for row in result["rows"]}
+    assert statuses["climate.set_hvac_mode"].startswith("error")
+    assert statuses["climate.set_temperature"] == "skipped: an earlier operation failed"
+    assert statuses["media_player.volume_set"] == "ok"
+    assert result["failed"] == 2
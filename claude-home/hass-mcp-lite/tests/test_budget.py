@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app import server
+from app.budget import estimate_bytes, fit_to_budget
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_fitting_response_is_unchanged():
+    response = [{"entity_id": "light.a", "state": "on"}]
+    assert run(fit_to_budget(response, estimate_bytes(response))) is response
+
+def test_impossible_budget_is_an_error_never_larger_than_the_original():
+    response = [{"entity_id": f"light.{index}", "state": "on"} for index in range(10)]
+    result = run(fit_to_budget(response, 5))
+    assert result["error"] == "budget too small"
+    assert result["min_bytes"] <= estimate_bytes(response)
+
+@pytest.mark.parametrize("query", [
+    {"search_query": "kitchen", "rank": True},
+    {"search_query": "light"},
+    {"domain": "sensor"},
+])
+def test_truncated_list_keeps_the_first_entities_in_order(loaded_store, query):
+    full = run(server.list_entities(limit=60, max_age=3600, **query))
+    assert isinstance(full, list) and len(full) > 10
+    max_bytes = estimate_bytes(full) // 3
+    cut = run(server.list_entities(limit=60, max_age=3600, max_bytes=max_bytes, **query))
+    kept = cut["entities"]
+    assert 0 < len(kept) < len(full)
+    assert kept == full[:len(kept)]
+    assert estimate_bytes(cut) <= max_bytes
+    assert {"step": "truncate", "kept": len(kept), "of": len(full)} in cut["elided"]
+
+def test_entities_by_id_truncates_the_distinct_ids(loaded_store):
+    ids = sorted(loaded_store.mapping())[:30]
+    requested = ids + ids[:10] + ["light.missing"]
+    full = run(server.get_entities_by_id_tool(requested, max_age=3600))
+    assert len(full) == 31
+    max_bytes = estimate_bytes(full) // 2
+    cut = run(server.get_entities_by_id_tool(requested, max_age=3600, max_bytes=max_bytes))
+    kept = cut["entities"]
+    assert kept == full[:len(kept)]
+    assert cut["remaining_entity_ids"] == (ids + ["light.missing"])[len(kept):]
+    truncate = next(note for note in cut["elided"] if note["step"] == "truncate")
+    assert truncate == {"step": "truncate", "kept": len(kept), "of": 31}
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app.compact import Attributes, CompactEntity, compact_entity, plain, plain_attributes
+from benchmarks.synthetic import make_entities
+
+ODD = {
+    "entity_id": "sensor.odd",
+    "state": None,
+    "attributes": {
+        "nested": {"a": [1, {"b": 2}]},
+        "matrix": [[1, 2], [3]],
+        "options": ["x", "y"],
+        "empty": [],
+        "flag": False,
+        "long": "z" * 100,
+    },
+    "last_changed": "2024-01-01T00:00:00+00:00",
+    "last_reported": "2024-01-01T00:00:02+00:00",
+    "last_updated": "2024-01-01T00:00:01+00:00",
+    "unexpected_key": {"kept": True},
+}
+
+ENTITIES = make_entities(40) + [ODD, {"entity_id": "light.bare", "state": "on", "attributes": {}}]
+
+@pytest.mark.parametrize("entity", ENTITIES, ids=lambda entity: entity["entity_id"])
+def test_round_trip_through_dict_and_json(entity):
+    compact = compact_entity(entity, keep_context=True)
+    assert isinstance(compact, CompactEntity)
+    assert compact == entity
+    assert dict(compact) == entity
+    assert list(compact) == list(entity)
+    assert plain(compact) == entity
+    assert json.loads(json.dumps(plain(compact))) == json.loads(json.dumps(entity))
+    assert compact_entity(plain(compact), keep_context=True) == compact
+    assert plain_attributes(compact["attributes"]) == entity.get("attributes", {})
+
+def test_context_is_dropped_unless_kept():
+    entity = make_entities(1)[0]
+    compact = compact_entity(entity)
+    assert "context" not in compact and compact.get("context") is None
+    assert plain(compact) == {key: value for key, value in entity.items() if key != "context"}
+    assert compact_entity(compact_entity(entity, keep_context=True))["attributes"] == entity["attributes"]
+    assert "context" not in compact_entity(compact_entity(entity, keep_context=True))
+
+def test_shared_lists_are_handed_out_as_fresh_lists():
+    first, second = (compact_entity(entity) for entity in make_entities(17)[8::8])
+    assert first["attributes"]["supported_color_modes"] == ["color_temp", "hs"]
+    assert first.values is not second.values
+    assert first.shape is second.shape
+    modes = first["attributes"]["supported_color_modes"]
+    modes.append("rgb")
+    assert first["attributes"]["supported_color_modes"] == ["color_temp", "hs"]
+    assert second["attributes"].get("supported_color_modes") == ["color_temp", "hs"]
+
+def test_mapping_behaviour():
+    compact = compact_entity(ODD)
+    assert compact["unexpected_key"] == {"kept": True}
+    assert "context" not in compact and "last_reported" in compact
+    with pytest.raises(KeyError):
+        compact["context"]
+    attributes = compact["attributes"]
+    assert isinstance(attributes, Attributes)
+    assert "flag" in attributes and "missing" not in attributes
+    assert attributes.get("missing", 5) == 5
+    assert len(attributes) == len(ODD["attributes"])
+    assert compact != compact_entity({**ODD, "state": "1"})
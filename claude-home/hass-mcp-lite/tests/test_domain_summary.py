@@ -0,0 +1,41 @@
+import asyncio
+import random
+from collections import Counter
+
+from app import hass
+from app.aggregates import reservoir_sample
+
+def test_reservoir_sample_edges():
+    assert reservoir_sample(range(3), 5) == [0, 1, 2]
+    assert reservoir_sample(range(3), 0) == []
+    assert reservoir_sample(range(3), -1) == []
+    sample = reservoir_sample((number for number in range(1000)), 10, random.Random(1))
+    assert len(sample) == len(set(sample)) == 10
+
+def test_reservoir_sample_is_uniform():
+    rng = random.Random(3)
+    counts = Counter()
+    for _ in range(4000):
+        counts.update(reservoir_sample(range(20), 5, rng))
+    # Each item is expected 1000 times; late items are not favoured or starved
+    assert set(counts) == set(range(20))
+    assert all(850 < count < 1150 for count in counts.values())
+
+def test_summary_counts_every_entity(loaded_store):
+    lights = [entity for entity_id, entity in loaded_store.mapping().items() if entity_id.startswith("light.")]
+    summary = asyncio.run(hass.summarize_domain("light", example_limit=2))
+    assert summary["total_count"] == len(lights)
+    assert summary["state_distribution"] == dict(Counter(entity["state"] for entity in lights))
+    assert all(len(examples) <= 2 for examples in summary["examples"].values())
+    assert dict(summary["common_attributes"])["friendly_name"] == len(lights)
+
+def test_sampled_examples_come_from_their_state(loaded_store):
+    summary = asyncio.run(hass.summarize_domain("switch", example_limit=4, sample=True))
+    for state, examples in summary["examples"].items():
+        assert len(examples) == min(4, summary["state_distribution"][state])
+        for example in examples:
+            assert loaded_store.peek(example["entity_id"])["state"] == state
+
+def test_unknown_domain_is_empty(loaded_store):
+    summary = asyncio.run(hass.summarize_domain("water_heater"))
+    assert (summary["total_count"], summary["examples"]) == (0, {})
@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import hass
+from benchmarks.synthetic import make_entities
+
+@pytest.fixture
+def states_api(loaded_store, monkeypatch):
+    """Serve /api/states from 400 entities in which every light is switched on"""
+    states = [
+        {**entity, "state": "on"} if entity["entity_id"].startswith("light.") else entity
+        for entity in make_entities(400)
+    ]
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(200, json=states)
+
+    monkeypatch.setattr(hass, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ha.test"))
+    hass._forget_recent()
+    yield requests
+    hass._forget_recent()
+
+def ids(store, prefix, count):
+    return sorted(entity_id for entity_id in store.mapping() if entity_id.startswith(prefix))[:count]
+
+def test_entities_come_back_once_in_the_requested_order(loaded_store, states_api):
+    lights, sensors = ids(loaded_store, "light.", 2), ids(loaded_store, "sensor.", 2)
+    requested = [sensors[1], lights[0], "light.missing", sensors[1], lights[1], sensors[0]]
+    result = asyncio.run(hass.get_entities_by_id(requested, max_age=3600))
+    assert [entity["entity_id"] for entity in result] == [sensors[1], lights[0], "light.missing", lights[1], sensors[0]]
+    assert result[2] == {"entity_id": "light.missing", "error": "Entity not found"}
+
+def test_cached_entities_need_no_request(loaded_store, states_api):
+    requested = ids(loaded_store, "light.", 5)
+    asyncio.run(hass.get_entities_by_id(requested, max_age=3600))
+    assert states_api == []
+
+def test_stale_entities_are_refreshed_with_one_snapshot(loaded_store, states_api):
+    requested = ids(loaded_store, "light.", 10)
+    result = asyncio.run(hass.get_entities_by_id(requested, max_age=0))
+    assert states_api == ["/api/states"]
+    assert {entity["state"] for entity in result} == {"on"}
+
+def test_fields_and_lean_projections(loaded_store, states_api):
+    light = ids(loaded_store, "light.", 1)[0]
+    [selected] = asyncio.run(hass.get_entities_by_id([light], fields=["state", "attr.brightness"], max_age=3600))
+    assert set(selected) == {"entity_id", "state", "attributes"}
+    assert set(selected["attributes"]) == {"brightness"}
+    [lean] = asyncio.run(hass.get_entities_by_id([light], max_age=3600))
+    assert "friendly_name" in lean["attributes"] and "supported_features" not in lean["attributes"]
+    [full] = asyncio.run(hass.get_entities_by_id([light], lean=False, max_age=3600))
+    assert "supported_features" in full["attributes"] and "last_changed" in full
@@ -0,0 +1,108 @@
+from app.errorlog import ErrorLogFollower, OVERLAP_BYTES
+
+def record(number, level="ERROR", logger_name="homeassistant.components.mqtt", message=None):
+    message = message or f"Message {number}"
+    return f"2024-01-01 00:00:{number % 60:02d}.000 {level} (MainThread) [{logger_name}] {message}\n"
+
+def make_log(count, start=0):
+    return "".join(record(number) for number in range(start, start + count)).encode()
+
+def serve(log, range_header, honour_range=True):
+    """Answer a fetch like Home Assistant's file response: (status, body, Content-Range)"""
+    if range_header is None or not honour_range:
+        return 200, log, None
+    start = int(range_header[len("bytes="):].rstrip("-"))
+    if start >= len(log):
+        return 416, b"", None
+    return 206, log[start:], f"bytes {start}-{len(log) - 1}/{len(log)}"
+
+def refresh(follower, log, honour_range=True):
+    """Fetch like _refresh_error_log: a replaced log is read again from the start"""
+    for _ in range(2):
+        new_lines = follower.apply(*serve(log, follower.range_header(), honour_range))
+        if new_lines is not None:
+            return new_lines
+    raise AssertionError("log was not read")
+
+def test_first_read_is_full():
+    follower = ErrorLogFollower()
+    assert follower.range_header() is None
+    assert refresh(follower, make_log(10)) == 10
+    assert follower.total_lines == 10
+    assert follower.offset == len(make_log(10))
+
+def test_follow_reads_only_the_new_bytes():
+    follower = ErrorLogFollower()
+    log = make_log(10)
+    refresh(follower, log)
+    assert follower.range_header() == f"bytes={len(log) - OVERLAP_BYTES}-"
+
+    log += make_log(3, start=10)
+    assert refresh(follower, log) == 3
+    assert follower.last_fetched_bytes == OVERLAP_BYTES + len(make_log(3, start=10))
+    assert follower.total_lines == 13
+    assert follower.index.records == 13
+
+def test_nothing_new_is_not_a_replacement():
+    follower = ErrorLogFollower()
+    log = make_log(5)
+    refresh(follower, log)
+    generation = follower.generation
+    assert refresh(follower, log) == 0
+    assert follower.generation == generation
+
+def test_server_ignoring_range_still_parses_only_new_lines():
+    follower = ErrorLogFollower()
+    log = make_log(10)
+    refresh(follower, log, honour_range=False)
+    log += make_log(2, start=10)
+    assert refresh(follower, log, honour_range=False) == 2
+    assert follower.total_lines == 12
+
+def test_partial_line_waits_for_its_newline():
+    follower = ErrorLogFollower()
+    log = make_log(2)
+    line = record(2)
+    assert refresh(follower, log + line[:20].encode()) == 2
+    assert refresh(follower, log + line.encode()) == 1
+    assert follower.page(1)[0] == [(2, line.rstrip("\n"))]
+
+def test_replaced_log_is_detected_and_reread():
+    follower = ErrorLogFollower()
+    refresh(follower, make_log(10))
+    generation = follower.generation
+
+    replaced = "".join(record(number, message=f"After restart {number}") for number in range(20)).encode()
+    assert follower.apply(*serve(replaced, follower.range_header())) is None
+    assert follower.generation == generation + 1
+    assert refresh(follower, replaced) == 20
+    assert follower.total_lines == 20
+    assert follower.index.records == 20
+
+def test_shorter_log_is_a_replacement():
+    follower = ErrorLogFollower()
+    refresh(follower, make_log(30))
+    shorter = make_log(2)
+    assert follower.apply(*serve(shorter, follower.range_header())) is None
+    assert refresh(follower, shorter) == 2
+
+def test_page_is_newest_first_and_continues():
+    follower = ErrorLogFollower()
+    refresh(follower, make_log(7))
+    lines, next_before = follower.page(3)
+    assert [number for number, _ in lines] == [6, 5, 4]
+    lines, next_before = follower.page(3, before=next_before)
+    assert [number for number, _ in lines] == [3, 2, 1]
+    lines, next_before = follower.page(3, before=next_before)
+    assert [number for number, _ in lines] == [0]
+    assert next_before is None
+
+def test_page_after_returns_only_newer_lines():
+    follower = ErrorLogFollower()
+    log = make_log(4)
+    refresh(follower, log)
+    mark = follower.total_lines
+    refresh(follower, log + make_log(2, start=4))
+    lines, next_before = follower.page(10, after=mark)
+    assert [number for number, _ in lines] == [5, 4]
+    assert next_before is None
@@ -0,0 +1,91 @@
+from app.errorlog import ErrorLogIndex, fingerprint, integration_of
+
+def header(second, level, logger_name, message):
+    return f"2024-01-01 10:00:{second:02d}.123 {level} (MainThread) [{logger_name}] {message}"
+
+def index_of(lines):
+    index = ErrorLogIndex()
+    for line in lines:
+        index.add_line(line)
+    return index
+
+def test_fingerprint_normalises_numbers_and_ids():
+    same = [
+        "Timeout after 10 s talking to 0xdeadbeef (entry 01HABCDEFGHJKMNPQRSTVWXYZ0)",
+        "Timeout after 25.5 s talking to 0x1f (entry 01HZZZZZZZZZZZZZZZZZZZZZZZ)",
+    ]
+    assert fingerprint("ERROR", "mqtt", same[0]) == fingerprint("ERROR", "mqtt", same[1])
+    assert (
+        fingerprint("ERROR", "x", "device 3fa85f64-5717-4562-b3fc-2c963f66afa6 lost")
+        == fingerprint("ERROR", "x", "device 9b2c1e04-0000-4aaa-8bbb-1234567890ab lost")
+    )
+    assert fingerprint("ERROR", "x", "token a1b2c3d4e5f6a7b8 expired") == fingerprint("ERROR", "x", "token 0123456789abcdef0 expired")
+    assert fingerprint("ERROR", "mqtt", "Disconnected") != fingerprint("WARNING", "mqtt", "Disconnected")
+    assert fingerprint("ERROR", "mqtt", "Disconnected") != fingerprint("ERROR", "zha", "Disconnected")
+
+def test_integration_of_logger_names():
+    assert integration_of("homeassistant.components.mqtt.client") == "mqtt"
+    assert integration_of("custom_components.hacs") == "hacs"
+    assert integration_of("homeassistant.core") == "core"
+    assert integration_of("aiohttp.server") == "aiohttp"
+
+def test_repeats_are_grouped_with_counts():
+    index = index_of([
+        header(1, "ERROR", "homeassistant.components.mqtt", "Timeout after 10 s"),
+        header(2, "ERROR", "homeassistant.components.mqtt", "Timeout after 12 s"),
+        header(3, "WARNING", "homeassistant.components.zha", "Device 7 offline"),
+        header(4, "ERROR", "homeassistant.components.mqtt", "Timeout after 99 s"),
+    ])
+    assert index.records == 4
+    assert len(index.groups) == 2
+    groups, total = index.search()
+    assert total == 2
+    mqtt = next(group for group in groups if group["integration"] == "mqtt")
+    assert mqtt["count"] == 3
+    assert mqtt["message"] == "Timeout after 10 s"
+    assert (mqtt["first_seen"], mqtt["last_seen"]) == ("2024-01-01 10:00:01.123", "2024-01-01 10:00:04.123")
+    assert index.levels["ERROR"] == 3
+    assert index.integrations["mqtt"] == 3
+
+def test_traceback_lines_fold_into_the_first_record():
+    traceback = [
+        "Traceback (most recent call last):",
+        '  File "/usr/src/homeassistant/core.py", line 10, in run',
+        "ValueError: bad value 42",
+    ]
+    index = index_of(
+        [header(1, "ERROR", "homeassistant.core", "Error doing job")] + traceback
+        + [header(2, "ERROR", "homeassistant.core", "Error doing job")] + ["ValueError: other 7"]
+        + [header(3, "INFO", "homeassistant.core", "Started")]
+    )
+    assert index.records == 3
+    groups, _ = index.search(level="ERROR")
+    assert len(groups) == 1
+    assert groups[0]["count"] == 2
+    assert groups[0]["traceback"] == "\n".join(traceback)
+
+def test_lines_before_any_record_are_ignored():
+    index = index_of(["  stray continuation", header(1, "ERROR", "x.y", "Boom")])
+    groups, _ = index.search()
+    assert "traceback" not in groups[0]
+
+def test_search_filters():
+    index = index_of([
+        header(1, "ERROR", "homeassistant.components.mqtt", "Broker refused connection"),
+        "ConnectionRefusedError: port 1883",
+        header(2, "WARNING", "homeassistant.components.zha", "Device offline"),
+        header(5, "INFO", "homeassistant.core", "Bus started"),
+        header(9, "CRITICAL", "custom_components.hacs", "Storage corrupt"),
+    ])
+    assert [group["integration"] for group in index.search(level="warning")[0]] == ["hacs", "zha", "mqtt"]
+    assert [group["integration"] for group in index.search(integration="MQTT")[0]] == ["mqtt"]
+    assert [group["logger"] for group in index.search(integration="homeassistant.core")[0]] == ["homeassistant.core"]
+    assert [group["message"] for group in index.search(text="1883")[0]] == ["Broker refused connection"]
+
+    groups, total = index.search(since="2024-01-01T10:00:05")
+    assert total == 2
+    assert all(group["count_since"] == 1 for group in groups)
+
+    groups, total = index.search(limit=1)
+    assert (len(groups), total) == (1, 4)
+    assert groups[0]["integration"] == "hacs"
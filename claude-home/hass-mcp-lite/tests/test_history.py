@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.history import (
+    history_points, is_numeric, collapse_runs, bucket_numeric, lttb, reduce_history
+)
+
+T0 = 1_700_000_000.0
+
+def point(offset, state):
+    epoch = T0 + offset
+    return (epoch, datetime.fromtimestamp(epoch, timezone.utc).isoformat(), state)
+
+def numeric_series(count, step=60.0):
+    """A fixed saw-tooth series with one spike at the middle"""
+    return [point(i * step, "999.0" if i == count // 2 else f"{(i % 17) * 0.5:.1f}") for i in range(count)]
+
+def test_history_points_parses_minimal_response():
+    states = [
+        {"entity_id": "light.a", "state": "on", "last_changed": "2024-01-01T00:00:00+00:00"},
+        {"state": "off", "last_changed": "2024-01-01T00:01:00Z"},
+        {"state": "on"},
+    ]
+    points = history_points(states)
+    assert [state for _, _, state in points] == ["on", "off"]
+    assert points[1][0] - points[0][0] == 60
+
+def test_is_numeric_ignores_gaps():
+    assert is_numeric([point(0, "1.5"), point(1, "unavailable"), point(2, "2")])
+    assert not is_numeric([point(0, "unavailable"), point(1, "unknown")])
+    assert not is_numeric([point(0, "1"), point(1, "on")])
+    assert not is_numeric([point(0, "nan")])
+
+def test_collapse_runs_merges_consecutive_states():
+    points = [point(0, "on"), point(10, "on"), point(20, "off"), point(30, "off"), point(40, "on")]
+    runs = collapse_runs(points, end=T0 + 100)
+    assert [(run["state"], run["duration_seconds"]) for run in runs] == [("on", 20.0), ("off", 20.0), ("on", 60.0)]
+    assert runs[1]["last_changed"] == points[2][1]
+
+def test_collapse_runs_without_end_gives_last_run_no_duration():
+    runs = collapse_runs([point(0, "on"), point(5, "off")])
+    assert runs[-1]["duration_seconds"] == 0.0
+    assert collapse_runs([]) == []
+
+def test_reduce_history_discrete_keeps_latest_runs():
+    points = [point(0, "on"), point(10, "on"), point(20, "off"), point(30, "off"), point(40, "on")]
+    result = reduce_history(points, max_points=2, end=T0 + 100)
+    assert result["kind"] == "discrete"
+    assert [run["state"] for run in result["states"]] == ["off", "on"]
+    assert result["omitted_runs"] == 1
+    assert result["state_durations"] == {"on": 80.0, "off": 20.0}
+    assert result["reduced"]
+
+def test_reduce_history_numeric_within_budget_is_unchanged():
+    points = numeric_series(20)
+    result = reduce_history(points, max_points=20)
+    assert not result["reduced"]
+    assert [item["state"] for item in result["states"]] == [state for _, _, state in points]
+
+@pytest.mark.parametrize("max_points", [1, 7, 50])
+def test_bucket_numeric_summarises_every_point(max_points):
+    points = numeric_series(1000)
+    buckets = bucket_numeric(points, max_points)
+    assert 0 < len(buckets) <= max_points
+    assert sum(bucket["count"] for bucket in buckets) == len(points)
+    assert buckets[0]["start"] == points[0][1]
+    assert buckets[-1]["end"] == points[-1][1]
+    assert max(bucket["max"] for bucket in buckets) == 999.0
+    assert min(bucket["min"] for bucket in buckets) == 0.0
+
+def test_bucket_numeric_counts_gaps():
+    points = [point(0, "1"), point(1, "unavailable"), point(2, "3")]
+    buckets = bucket_numeric(points, 1)
+    assert buckets == [{"start": points[0][1], "end": points[2][1], "count": 2,
+                        "min": 1.0, "max": 3.0, "mean": 2.0, "unavailable": 1}]
+
+@pytest.mark.parametrize("max_points", [3, 10, 100, 999])
+def test_lttb_keeps_endpoints_and_real_samples(max_points):
+    points = numeric_series(1000)
+    samples = lttb(points, max_points)
+    assert len(samples) == max_points
+    assert samples[0] == {"state": points[0][2], "last_changed": points[0][1]}
+    assert samples[-1] == {"state": points[-1][2], "last_changed": points[-1][1]}
+    originals = {(timestamp, state) for _, timestamp, state in points}
+    assert all((sample["last_changed"], sample["state"]) in originals for sample in samples)
+    timestamps = [sample["last_changed"] for sample in samples]
+    assert timestamps == sorted(timestamps)
+
+def test_lttb_keeps_a_spike():
+    samples = lttb(numeric_series(1000), 20)
+    assert any(sample["state"] == "999.0" for sample in samples)
+
+def test_lttb_returns_short_series_unchanged():
+    points = numeric_series(5) + [point(1000, "unavailable")]
+    samples = lttb(points, 10)
+    assert [sample["state"] for sample in samples] == [state for _, _, state in points[:5]]
+
+def test_lttb_below_three_points_keeps_only_endpoints():
+    points = numeric_series(10)
+    assert [sample["last_changed"] for sample in lttb(points, 2)] == [points[0][1], points[-1][1]]
+
+def test_reduce_history_numeric_methods():
+    points = numeric_series(500)
+    buckets = reduce_history(points, max_points=25)
+    assert buckets["method"] == "buckets" and len(buckets["states"]) <= 25
+    samples = reduce_history(points, max_points=25, method="lttb")
+    assert samples["method"] == "lttb" and len(samples["states"]) == 25
@@ -0,0 +1,98 @@
+import asyncio
+import math
+from datetime import datetime, timezone
+
+from app.history_cache import HistoryCache, Segment, merge_segments, missing_ranges, slice_points
+
+T0 = 1_700_000_000.0
+STEP = 60.0
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def state_at(epoch):
+    return str(int((epoch - T0) // STEP) % 5)
+
+def series(start, end):
+    """What the history API returns for [start, end]: the state at start, then every change"""
+    points = [(start, iso(start), state_at(start))]
+    change = T0 + (math.floor((start - T0) / STEP) + 1) * STEP
+    while change <= end:
+        points.append((change, iso(change), state_at(change)))
+        change += STEP
+    return points
+
+class Fetcher:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, entity_id, start, end):
+        self.calls.append((start, end))
+        return series(start, end)
+
+def get(cache, fetcher, start, end, now=None):
+    return asyncio.run(cache.get_points("sensor.a", T0 + start, T0 + end, fetcher, now=now or T0 + 100000))
+
+def test_missing_ranges():
+    segments = [Segment(0, 100, ()), Segment(200, 300, ())]
+    assert missing_ranges(segments, 50, 250) == [(100, 200)]
+    assert missing_ranges(segments, 0, 300) == [(100, 200)]
+    assert missing_ranges(segments, 210, 290) == []
+    assert missing_ranges(segments, 250, 400) == [(300, 400)]
+    assert missing_ranges([], 5, 10) == [(5, 10)]
+
+def test_merge_segments_joins_overlapping_and_touching():
+    first = Segment(T0, T0 + 600, tuple(series(T0, T0 + 600)))
+    second = Segment(T0 + 600, T0 + 1200, tuple(series(T0 + 600, T0 + 1200)))
+    third = Segment(T0 + 900, T0 + 1500, tuple(series(T0 + 900, T0 + 1500)))
+    merged = merge_segments([third, first, second])
+    assert len(merged) == 1
+    assert (merged[0].start, merged[0].end) == (T0, T0 + 1500)
+    assert list(merged[0].points) == series(T0, T0 + 1500)
+
+def test_merge_segments_drops_leading_repeat_of_previous_state():
+    first = Segment(T0, T0 + 90, tuple(series(T0, T0 + 90)))
+    second = Segment(T0 + 90, T0 + 200, tuple(series(T0 + 90, T0 + 200)))
+    merged = merge_segments([first, second])
+    assert [point[0] for point in merged[0].points] == [T0, T0 + 60, T0 + 120, T0 + 180]
+
+def test_merge_segments_keeps_disjoint_segments():
+    merged = merge_segments([Segment(T0 + 500, T0 + 600, ()), Segment(T0, T0 + 100, ())])
+    assert [(segment.start, segment.end) for segment in merged] == [(T0, T0 + 100), (T0 + 500, T0 + 600)]
+
+def test_slice_points_leads_with_state_at_start():
+    segments = [Segment(T0, T0 + 1200, tuple(series(T0, T0 + 1200)))]
+    assert slice_points(segments, T0 + 130, T0 + 400) == series(T0 + 130, T0 + 400)
+    assert slice_points(segments, T0 + 120, T0 + 400) == series(T0 + 120, T0 + 400)
+
+def test_partial_overlap_fetches_only_the_missing_part():
+    cache, fetcher = HistoryCache(), Fetcher()
+    assert get(cache, fetcher, 0, 1000) == series(T0, T0 + 1000)
+    assert get(cache, fetcher, 500, 1500) == series(T0 + 500, T0 + 1500)
+    assert fetcher.calls == [(T0, T0 + 1000), (T0 + 1000, T0 + 1500)]
+    assert get(cache, fetcher, 200, 1400) == series(T0 + 200, T0 + 1400)
+    assert len(fetcher.calls) == 2
+    assert get(cache, fetcher, -300, 1500) == series(T0 - 300, T0 + 1500)
+    assert fetcher.calls[-1] == (T0 - 300, T0)
+    stats = cache.stats()
+    assert (stats["misses"], stats["partial_hits"], stats["hits"]) == (1, 2, 1)
+
+def test_unsettled_tail_is_fetched_again():
+    cache, fetcher = HistoryCache(), Fetcher()
+    get(cache, fetcher, 0, 1000, now=T0 + 1000)
+    get(cache, fetcher, 0, 1000, now=T0 + 1000)
+    assert fetcher.calls[1] == (T0 + 970, T0 + 1000)
+
+def test_entries_persist_across_instances(tmp_path):
+    fetcher = Fetcher()
+    get(HistoryCache(str(tmp_path)), fetcher, 0, 1000)
+    reloaded = HistoryCache(str(tmp_path))
+    assert get(reloaded, fetcher, 100, 900) == series(T0 + 100, T0 + 900)
+    assert len(fetcher.calls) == 1
+
+def test_least_recently_used_entries_are_evicted():
+    cache, fetcher = HistoryCache(max_points=30), Fetcher()
+    for entity_id in ("sensor.a", "sensor.b", "sensor.c"):
+        asyncio.run(cache.get_points(entity_id, T0, T0 + 1200, fetcher, now=T0 + 100000))
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["evictions"] == 2
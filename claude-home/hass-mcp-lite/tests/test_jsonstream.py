@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from app.hass import STATE_ITEM_HINT
+from app.jsonstream import JSONArrayStream
+
+ENTITIES = [
+    {"entity_id": "light.kitchen", "state": "on", "attributes": {"brightness": 128}},
+    {"entity_id": "sensor.quote", "state": 'say "hi" \\ bye', "attributes": {}},
+    {"entity_id": "sensor.brackets", "state": "[1, {2}] ]}", "attributes": {"raw": "},{\"entity_id\":"}},
+    {"entity_id": "sensor.unicode", "state": "é☃ \\u0041", "attributes": {"list": [1, 2.5, None, True]}},
+    {"entity_id": "sensor.number", "state": "21.5", "attributes": {"value": -1.25e3}},
+]
+
+def decode(text, chunk_size, item_hint=STATE_ITEM_HINT):
+    stream = JSONArrayStream(item_hint=item_hint)
+    items = []
+    for start in range(0, len(text), chunk_size):
+        items.extend(stream.feed(text[start:start + chunk_size]))
+    stream.close()
+    return items
+
+@pytest.mark.parametrize("item_hint", [STATE_ITEM_HINT, None])
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 100000])
+def test_items_split_across_chunks(chunk_size, item_hint):
+    for separators in ((",", ":"), (", ", ": ")):
+        text = json.dumps(ENTITIES, separators=separators)
+        assert decode(text, chunk_size, item_hint) == ENTITIES
+
+def test_hint_inside_an_item_falls_back_to_single_items():
+    nested = {"entity_id": "group.all", "state": "on", "attributes": {"members": [0, {"entity_id": "light.a"}]}}
+    text = json.dumps(ENTITIES[:2] + [nested], separators=(",", ":"))
+    cut = text.index('{"entity_id":"light.a"') + 3
+    stream = JSONArrayStream(item_hint=STATE_ITEM_HINT)
+    items = stream.feed(text[:cut]) + stream.feed(text[cut:])
+    stream.close()
+    assert items == ENTITIES[:2] + [nested]
+
+def test_whitespace_and_empty_arrays():
+    assert decode(' \n[ \t]\n ', 1) == []
+    assert decode('[ 1 , "a" , [ ] , { } ]', 1, item_hint=None) == [1, "a", [], {}]
+
+def test_number_at_the_end_of_a_chunk_waits_for_more():
+    stream = JSONArrayStream()
+    assert stream.feed("[12") == []
+    assert stream.feed("34,tr") == [1234]
+    assert stream.feed("ue,nul") == [True]
+    assert stream.feed("l]") == [None]
+    stream.close()
+
+@pytest.mark.parametrize("text", [
+    "",
+    "[",
+    '[{"entity_id":"a"}',
+    '[{"entity_id":"a"},',
+    '[{"entity_id":"a"},{"entity_id":"b"',
+    '[{"entity_id":"a","state":"unterminated',
+    "[12",
+])
+def test_truncated_input_raises_on_close(text):
+    stream = JSONArrayStream(item_hint=STATE_ITEM_HINT)
+    stream.feed(text)
+    with pytest.raises(ValueError):
+        stream.close()
+
+@pytest.mark.parametrize("text", ['{"entity_id":"a"}', "[1 2]", "[1]]", "[1],"])
+def test_malformed_input_raises_on_feed(text):
+    stream = JSONArrayStream()
+    with pytest.raises(ValueError):
+        stream.feed(text)
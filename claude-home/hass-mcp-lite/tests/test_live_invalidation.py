@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import hass
+from app.compact import plain
+
+@pytest.fixture
+def live_store(loaded_store, monkeypatch):
+    """The loaded cache marked live, with requests answered by a fake Home Assistant"""
+    requests = []
+    answers = {}
+
+    def handler(request):
+        requests.append(request.url.path)
+        entity_id = request.url.path.rsplit("/", 1)[-1]
+        if entity_id not in answers:
+            return httpx.Response(404, json={"message": "Entity not found."})
+        return httpx.Response(200, json=answers[entity_id](entity_id))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ha.test")
+    monkeypatch.setattr(hass, "_client", client)
+    hass._forget_recent()
+    loaded_store.set_live(True)
+    yield loaded_store, answers, requests
+    hass._forget_recent()
+
+def switched(store, entity_id, state):
+    return {**plain(store.peek(entity_id)), "state": state}
+
+def lights(store, count):
+    return sorted(entity_id for entity_id in store.mapping() if entity_id.startswith("light."))[:count]
+
+def test_invalidated_entities_are_refetched_while_live(live_store):
+    store, answers, requests = live_store
+    light = lights(store, 1)[0]
+    store.upsert(switched(store, light, "off"))
+    answers[light] = lambda entity_id: switched(store, entity_id, "on")
+    store.invalidate([light])
+
+    states = asyncio.run(hass._get_state_list(domain="light"))
+    assert next(state for state in states if state["entity_id"] == light)["state"] == "on"
+    assert requests == [f"/api/states/{light}"]
+    assert not store.invalidated
+    assert store.live
+
+def test_many_invalidated_entities_never_load_a_snapshot_while_live(live_store):
+    store, answers, requests = live_store
+    targets = lights(store, hass.MAX_PARTIAL_REFETCH + 5)
+    for entity_id in targets:
+        answers[entity_id] = lambda entity_id: switched(store, entity_id, "unavailable")
+    store.invalidate(targets)
+
+    asyncio.run(hass._refresh_states())
+    assert sorted(requests) == sorted(f"/api/states/{entity_id}" for entity_id in targets)
+    assert all(store.peek(entity_id)["state"] == "unavailable" for entity_id in targets)
+    assert store.live
+
+def test_mirror_update_during_the_refetch_is_kept(live_store):
+    store, answers, requests = live_store
+    light = lights(store, 1)[0]
+
+    def answer(entity_id):
+        response = switched(store, entity_id, "off")
+        # The mirror delivers a newer state while the request is in flight
+        store.upsert(switched(store, entity_id, "on"))
+        return response
+
+    answers[light] = answer
+    store.invalidate([light])
+    asyncio.run(hass._refresh_states())
+    assert store.peek(light)["state"] == "on"
+
+def test_removed_entities_are_dropped(live_store):
+    store, _, _ = live_store
+    light = lights(store, 1)[0]
+    store.invalidate([light])
+    asyncio.run(hass._refresh_states())
+    assert light not in store
+    assert not store.invalidated
@@ -0,0 +1,60 @@
+import asyncio
+import sys
+
+import pytest
+
+from app import __main__ as entry
+from app import network
+from app.server import mcp
+
+def test_app_routes_event_stream_and_messages():
+    app = network.create_app(mcp)
+    assert [route.path for route in app.routes] == ["/sse", "/messages"]
+
+@pytest.mark.parametrize("info, message", [
+    ({"snapshot_version": 3, "snapshot_age_seconds": 0}, "Entity snapshot loaded (version 3)"),
+    ({"error": "Connection refused"}, "Could not load the entity snapshot at startup: Connection refused"),
+])
+def test_lifespan_warms_snapshot_and_closes_client(monkeypatch, caplog, info, message):
+    calls = []
+
+    async def get_snapshot_info():
+        calls.append("snapshot")
+        return info
+
+    async def cleanup_client():
+        calls.append("cleanup")
+
+    monkeypatch.setattr(network, "get_snapshot_info", get_snapshot_info)
+    monkeypatch.setattr(network, "cleanup_client", cleanup_client)
+    app = network.create_app(mcp)
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            assert calls == ["snapshot"]
+
+    with caplog.at_level("INFO", logger=network.__name__):
+        asyncio.run(run())
+    assert calls == ["snapshot", "cleanup"]
+    assert message in caplog.text
+
+@pytest.mark.parametrize("argv, expected", [
+    ([], ("stdio",)),
+    (["--transport", "sse", "--port", "9000"], ("sse", "127.0.0.1", 9000, None)),
+    (["--transport", "sse", "--socket", "/tmp/hass-mcp.sock"], ("sse", "127.0.0.1", 8000, "/tmp/hass-mcp.sock")),
+])
+def test_main_picks_the_transport(monkeypatch, argv, expected):
+    calls = []
+
+    async def serve(server, host, port, socket_path):
+        calls.append(("sse", host, port, socket_path))
+
+    monkeypatch.setattr(entry, "HA_MCP_TRANSPORT", "stdio")
+    monkeypatch.setattr(entry, "HA_MCP_HOST", "127.0.0.1")
+    monkeypatch.setattr(entry, "HA_MCP_PORT", 8000)
+    monkeypatch.setattr(entry, "HA_MCP_SOCKET", "")
+    monkeypatch.setattr(network, "serve", serve)
+    monkeypatch.setattr(entry.mcp, "run", lambda: calls.append(("stdio",)))
+    monkeypatch.setattr(sys, "argv", ["python -m app"] + argv)
+    entry.main()
+    assert calls == [expected]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app import hass
+from app.pagination import cursor_scope, encode_cursor, decode_cursor, page_after
+
+def walk(limit, **query):
+    """Follow next_cursor from the first page to the last, returning the entity IDs and page count"""
+    entity_ids, pages, cursor = [], 0, None
+    while True:
+        page = asyncio.run(hass.get_entities_page(limit=limit, max_age=3600, cursor=cursor, **query))
+        assert "error" not in page
+        entity_ids += [entity["entity_id"] for entity in page["entities"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return entity_ids, pages
+
+def test_cursor_round_trip():
+    scope = cursor_scope("light", None, "kitchen", True)
+    cursor = encode_cursor(7, [2.5, "light.kitchen_1"], scope)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, scope) == (7, [2.5, "light.kitchen_1"])
+
+def test_cursor_from_another_query_is_rejected():
+    cursor = encode_cursor(1, ["light.a"], cursor_scope("light", None, "", False))
+    with pytest.raises(ValueError, match="different query"):
+        decode_cursor(cursor, cursor_scope("switch", None, "", False))
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "e30", encode_cursor(1, ["x"], "s")[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "s")
+
+def test_page_after_seeks_past_the_key():
+    ids = ["a", "b", "c", "d", "e"]
+    assert page_after(ids, None, 2) == ["a", "b"]
+    assert page_after(ids, "b", 2) == ["c", "d"]
+    assert page_after(ids, "bb", 10) == ["c", "d", "e"]
+    assert page_after(ids, "e", 2) == []
+    assert page_after(ids, "a", 2, accept=lambda entity_id: entity_id != "c") == ["b", "d"]
+
+def test_domain_walk_has_no_duplicates_or_gaps(loaded_store):
+    entity_ids, pages = walk(7, domain="light")
+    expected = sorted(entity_id for entity_id in loaded_store.mapping() if entity_id.startswith("light."))
+    assert entity_ids == expected
+    assert pages == -(-len(expected) // 7)
+
+def test_search_walk_has_no_duplicates_or_gaps(loaded_store):
+    entity_ids, _ = walk(6, search_query="kitchen")
+    assert entity_ids == sorted(hass._search_index.search("kitchen"))
+
+def test_ranked_walk_has_no_duplicates_or_gaps(loaded_store):
+    entity_ids, pages = walk(5, search_query="kitchen light", rank=True)
+    expected = [entity_id for _, entity_id in hass._search_index.rank("kitchen light")]
+    assert entity_ids == expected
+    assert len(set(entity_ids)) == len(entity_ids)
+    assert pages > 1
+
+def test_ranked_walk_within_a_domain(loaded_store):
+    entity_ids, _ = walk(4, search_query="kitchen", rank=True, domain="sensor")
+    expected = [
+        entity_id for _, entity_id in hass._search_index.rank("kitchen")
+        if entity_id.startswith("sensor.")
+    ]
+    assert entity_ids == expected
+
+def test_cursor_cannot_continue_another_query(loaded_store):
+    page = asyncio.run(hass.get_entities_page(domain="light", limit=3, max_age=3600))
+    other = asyncio.run(hass.get_entities_page(domain="switch", limit=3, max_age=3600, cursor=page["next_cursor"]))
+    assert other["error"].startswith("Invalid cursor")
+
+def test_ranked_cursor_with_wrong_key_is_rejected(loaded_store):
+    scope = cursor_scope(None, None, "kitchen", True)
+    page = asyncio.run(hass.get_entities_page(
+        search_query="kitchen", rank=True, limit=3, max_age=3600, cursor=encode_cursor(1, ["light.a"], scope)
+    ))
+    assert page["error"].startswith("Invalid cursor")
@@ -0,0 +1,58 @@
+import itertools
+
+import pytest
+
+from app.compact import compact_entity, plain
+from app.hass import filter_fields, get_lean_projection, DEFAULT_LEAN_FIELDS, DOMAIN_IMPORTANT_ATTRIBUTES
+from app.projection import compile_projection
+from benchmarks.synthetic import make_entities
+
+FIELDS = ["state", "attributes", "attr.friendly_name", "attr.brightness", "attr.missing",
+          "context", "last_updated", "last_changed", "bogus", "attr."]
+
+def reference(data, fields):
+    """Field filtering done per entity and per field, as before projections were compiled"""
+    result = {"entity_id": data["entity_id"]}
+    for field in fields:
+        if field == "state":
+            result["state"] = data.get("state")
+        elif field == "attributes":
+            result["attributes"] = dict(data.get("attributes", {}))
+        elif field.startswith("attr.") and len(field) > 5:
+            attributes = data.get("attributes", {})
+            if field[5:] in attributes:
+                result.setdefault("attributes", {})[field[5:]] = attributes[field[5:]]
+        elif field in ("context", "last_updated", "last_changed"):
+            if field in data:
+                result[field] = data[field]
+    return result
+
+ENTITIES = make_entities(16) + [{"entity_id": "sensor.bare", "state": "1"}]
+
+@pytest.mark.parametrize("fields", [
+    fields for size in (1, 2, 3) for fields in itertools.combinations(FIELDS, size)
+])
+def test_compiled_projection_matches_per_field_filtering(fields):
+    projection = compile_projection(fields)
+    for entity in ENTITIES:
+        expected = reference(entity, fields)
+        assert projection.apply(entity) == expected
+        assert projection.apply(compact_entity(entity, True)) == expected
+        assert filter_fields(entity, list(fields)) == expected
+
+def test_projection_order_does_not_matter_for_attributes():
+    entity = ENTITIES[0]
+    assert compile_projection(("attr.brightness", "attributes")).apply(entity) == reference(entity, ["attributes"])
+
+def test_projections_are_compiled_once():
+    assert compile_projection(("state", "attr.brightness")) is compile_projection(("state", "attr.brightness"))
+    assert get_lean_projection("light") is get_lean_projection("light")
+
+def test_lean_projection_uses_domain_attributes():
+    light = next(entity for entity in ENTITIES if entity["entity_id"].startswith("light."))
+    fields = DEFAULT_LEAN_FIELDS + [f"attr.{name}" for name in DOMAIN_IMPORTANT_ATTRIBUTES["light"]]
+    assert get_lean_projection("light").apply(compact_entity(light, False)) == reference(light, fields)
+
+def test_no_fields_returns_a_plain_copy():
+    entity = compact_entity(ENTITIES[0], True)
+    assert filter_fields(entity, []) == plain(entity) == ENTITIES[0]
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from app import hass
+from app.reconcile import plan_entity, plan_states, same_value
+
+def entity(entity_id, state, **attributes):
+    return {"entity_id": entity_id, "state": state, "attributes": attributes}
+
+CURRENT = {
+    "light.kitchen": entity("light.kitchen", "on", brightness=128, color_mode="brightness"),
+    "light.hall": entity("light.hall", "off"),
+    "switch.fan": entity("switch.fan", "off"),
+    "cover.blind": entity("cover.blind", "open", current_position=100),
+    "climate.living": entity("climate.living", "heat", temperature=21),
+    "input_number.target": entity("input_number.target", "20.0"),
+    "input_boolean.guest": entity("input_boolean.guest", "off"),
+    "input_select.scene": entity("input_select.scene", "Movie"),
+    "media_player.tv": entity("media_player.tv", "on", volume_level=0.5),
+}
+
+def test_same_value_compares_like_home_assistant():
+    assert same_value("20.0", 20)
+    assert same_value((255, 0, 0), [255, 0, 0])
+    assert not same_value(True, False)
+    assert not same_value("on", "off")
+
+def test_unchanged_entities_are_skipped():
+    operations, unchanged, errors = plan_states(
+        {
+            "light.kitchen": {"state": "on", "brightness": 128},
+            "light.hall": "off",
+            "cover.blind": "open",
+            "climate.living": {"temperature": 21.0},
+            "input_number.target": 20,
+        },
+        CURRENT
+    )
+    assert operations == []
+    assert errors == {}
+    assert sorted(unchanged) == ["climate.living", "cover.blind", "input_number.target", "light.hall", "light.kitchen"]
+
+def test_missing_entities_are_reported():
+    operations, unchanged, errors = plan_states({"light.gone": "on", "switch.fan": "on"}, CURRENT)
+    assert errors == {"light.gone": "Entity not found"}
+    assert operations == [{"domain": "switch", "service": "turn_on", "data": {"entity_id": "switch.fan"}}]
+    assert unchanged == []
+
+def test_attribute_only_target_maps_to_turn_on_with_data():
+    assert plan_entity("light.kitchen", CURRENT["light.kitchen"], {"brightness": 200}) == [
+        {"domain": "light", "service": "turn_on", "data": {"entity_id": "light.kitchen", "brightness": 200}}
+    ]
+    assert plan_entity("light.hall", CURRENT["light.hall"], {"brightness": 128}) == [
+        {"domain": "light", "service": "turn_on", "data": {"entity_id": "light.hall", "brightness": 128}}
+    ]
+
+def test_call_options_do_not_count_as_changes():
+    assert plan_entity("light.kitchen", CURRENT["light.kitchen"], {"brightness": 128, "transition": 2}) == []
+
+def test_attributes_of_a_switched_off_target_are_ignored():
+    assert plan_entity("light.hall", CURRENT["light.hall"], {"state": "off", "brightness": 10}) == []
+
+def test_dedicated_attribute_services():
+    assert plan_entity("climate.living", CURRENT["climate.living"], {"temperature": 19}) == [
+        {"domain": "climate", "service": "set_temperature", "data": {"entity_id": "climate.living", "temperature": 19}}
+    ]
+    assert plan_entity("cover.blind", CURRENT["cover.blind"], {"state": "open", "position": 40}) == [
+        {"domain": "cover", "service": "set_cover_position", "data": {"entity_id": "cover.blind", "position": 40}}
+    ]
+
+def test_value_and_state_services():
+    assert plan_entity("input_number.target", CURRENT["input_number.target"], 22.5) == [
+        {"domain": "input_number", "service": "set_value", "data": {"entity_id": "input_number.target", "value": 22.5}}
+    ]
+    assert plan_entity("cover.blind", CURRENT["cover.blind"], "closed") == [
+        {"domain": "cover", "service": "close_cover", "data": {"entity_id": "cover.blind"}}
+    ]
+
+def test_booleans_mean_on_and_off():
+    assert plan_entity("input_boolean.guest", CURRENT["input_boolean.guest"], True) == [
+        {"domain": "input_boolean", "service": "turn_on", "data": {"entity_id": "input_boolean.guest"}}
+    ]
+    assert plan_entity("input_boolean.guest", CURRENT["input_boolean.guest"], False) == []
+    assert plan_entity("light.kitchen", CURRENT["light.kitchen"], {"state": True, "brightness": 128}) == []
+
+def test_states_are_compared_without_case():
+    assert plan_entity("light.hall", CURRENT["light.hall"], "OFF") == []
+    assert plan_entity("switch.fan", CURRENT["switch.fan"], {"state": "On"}) == [
+        {"domain": "switch", "service": "turn_on", "data": {"entity_id": "switch.fan"}}
+    ]
+    assert plan_entity("cover.blind", CURRENT["cover.blind"], "Closed") == [
+        {"domain": "cover", "service": "close_cover", "data": {"entity_id": "cover.blind"}}
+    ]
+    assert plan_entity("climate.living", CURRENT["climate.living"], "HEAT") == []
+
+def test_select_options_keep_their_case():
+    assert plan_entity("input_select.scene", CURRENT["input_select.scene"], "Movie") == []
+    assert plan_entity("input_select.scene", CURRENT["input_select.scene"], "movie") == [
+        {"domain": "input_select", "service": "select_option", "data": {"entity_id": "input_select.scene", "option": "movie"}}
+    ]
+
+@pytest.mark.parametrize("entity_id, target", [
+    ("climate.living", {"state": "off", "temperature": 22}),
+    ("media_player.tv", {"state": "off", "volume_level": 0.2}),
+])
+def test_dedicated_attributes_of_a_switched_off_target_are_errors(entity_id, target):
+    operations, unchanged, errors = plan_states({entity_id: target}, CURRENT)
+    assert (operations, unchanged) == ([], [])
+    assert "while" in errors[entity_id]
+
+@pytest.mark.parametrize("entity_id, target", [
+    ("switch.fan", "dimmed"),
+    ("cover.blind", "ajar"),
+    ("cover.blind", {"state": "open", "speed": 1}),
+    ("input_number.target", {"state": 3, "step": 1}),
+])
+def test_unreachable_targets_are_errors(entity_id, target):
+    operations, unchanged, errors = plan_states({entity_id: target}, CURRENT)
+    assert (operations, unchanged) == ([], [])
+    assert entity_id in errors
+
+def test_apply_states_dry_run_diffs_against_the_cache(loaded_store):
+    lights = sorted(entity_id for entity_id in loaded_store.mapping() if entity_id.startswith("light."))
+    on, off = lights[0], lights[1]
+    loaded_store.upsert(entity(on, "on", brightness=50))
+    loaded_store.upsert(entity(off, "off"))
+
+    result = asyncio.run(hass.apply_states(
+        {on: {"brightness": 50}, off: {"brightness": 50}, "light.missing": "on"},
+        dry_run=True,
+        max_age=3600
+    ))
+    assert result["unchanged"] == 1
+    assert result["errors"] == {"light.missing": "Entity not found"}
+    assert result["planned"] == [[off, "light.turn_on"]]
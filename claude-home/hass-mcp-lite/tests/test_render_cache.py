@@ -0,0 +1,50 @@
+import asyncio
+
+from app import server
+from app.compact import plain
+from app.render_cache import RenderCache
+
+def test_only_the_current_version_is_served():
+    cache = RenderCache()
+    assert cache.get("hass://a", 1) is None
+    assert cache.put("hass://a", 1, "one") == "one"
+    assert cache.get("hass://a", 1) == "one"
+    assert cache.get("hass://a", 2) is None
+    cache.put("hass://a", 2, "two")
+    assert cache.get("hass://a", 1) is None
+    assert cache.stats()["entries"] == 1
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 3)
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = RenderCache(max_chars=10)
+    cache.put("hass://a", 1, "aaaa")
+    cache.put("hass://b", 1, "bbbb")
+    cache.get("hass://a", 1)
+    cache.put("hass://c", 1, "cccc")
+    assert cache.get("hass://b", 1) is None
+    assert cache.get("hass://a", 1) == "aaaa"
+    assert cache.stats()["chars"] == 8
+    cache.put("hass://huge", 1, "x" * 11)
+    assert cache.get("hass://huge", 1) is None
+    assert cache.stats()["evictions"] == 1
+
+def test_resource_is_rendered_again_when_the_snapshot_changes(loaded_store):
+    first = asyncio.run(server.get_all_entities_resource())
+    hits = server._render_cache.hits
+    assert asyncio.run(server.get_all_entities_resource()) is first
+    assert server._render_cache.hits == hits + 1
+
+    light = sorted(entity_id for entity_id in loaded_store.mapping() if entity_id.startswith("light."))[0]
+    entity = plain(loaded_store.peek(light))
+    loaded_store.upsert({**entity, "attributes": {**entity["attributes"], "friendly_name": "Renamed Lamp"}})
+    second = asyncio.run(server.get_all_entities_resource())
+    assert "Renamed Lamp" in second and "Renamed Lamp" not in first
+    assert asyncio.run(server.get_all_entities_resource()) is second
+
+def test_unchanged_upsert_keeps_the_rendered_text(loaded_store):
+    first = asyncio.run(server.get_all_entities_resource())
+    light = sorted(entity_id for entity_id in loaded_store.mapping() if entity_id.startswith("light."))[0]
+    version = loaded_store.version
+    loaded_store.upsert(plain(loaded_store.peek(light)))
+    assert loaded_store.version == version
+    assert asyncio.run(server.get_all_entities_resource()) is first
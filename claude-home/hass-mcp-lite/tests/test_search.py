@@ -0,0 +1,90 @@
+import pytest
+
+from app.search import SearchIndex, matches
+from app.store import EntityStore
+from benchmarks.synthetic import make_entities
+
+QUERIES = ["kitchen", "living room", "light 1", "on", "21", "tv", "spotify", "zzz", "garage cover", "°c"]
+
+@pytest.fixture
+def indexed():
+    store = EntityStore()
+    index = SearchIndex()
+    store.add_listener(index.update)
+    store.replace_all(make_entities(300))
+    return store, index
+
+def scan(store, query):
+    return {entity_id for entity_id, entity in store.mapping().items() if matches(query, entity)}
+
+def test_search_matches_a_linear_scan(indexed):
+    store, index = indexed
+    for query in QUERIES:
+        assert index.search(query) == scan(store, query), query
+
+def test_upsert_reindexes_only_the_changed_entity(indexed):
+    store, index = indexed
+    entity_id = "light.kitchen_0"
+    original = store.peek(entity_id)
+    store.upsert({**original, "state": "pondering", "attributes": {"friendly_name": "Pantry Lamp"}})
+    assert index.search("pantry pondering") == {entity_id}
+    store.upsert(original)
+    assert index.search("pantry") == set()
+    assert index.search("pondering") == set()
+    for query in QUERIES:
+        assert index.search(query) == scan(store, query), query
+
+def test_remove_drops_the_entity_and_its_postings(indexed):
+    store, index = indexed
+    store.upsert({"entity_id": "sensor.unique_xyzzy", "state": "quux", "attributes": {}})
+    assert index.search("xyzzy quux") == {"sensor.unique_xyzzy"}
+    size = len(index)
+    store.remove("sensor.unique_xyzzy")
+    assert len(index) == size - 1
+    assert index.search("xyzzy") == set()
+    assert not any("xyz" in gram for gram in index._trigrams)
+    assert "quux" not in index._tokens
+
+def test_replace_all_keeps_the_index_in_sync(indexed):
+    store, index = indexed
+    store.replace_all(make_entities(120, seed=2))
+    assert len(index) == 120
+    for query in QUERIES:
+        assert index.search(query) == scan(store, query), query
+
+def test_short_words_and_empty_queries():
+    index = SearchIndex()
+    index.update("light.a", None, {"entity_id": "light.a", "state": "on", "attributes": {"friendly_name": "Lamp"}})
+    index.update("switch.b", None, {"entity_id": "switch.b", "state": "off", "attributes": {}})
+    assert index.search("b") == {"switch.b"}
+    assert index.search(".") == {"light.a", "switch.b"}
+    assert index.search("on") == {"light.a"}
+    assert index.search("   ") == set()
+
+def test_rank_prefers_the_best_field():
+    index = SearchIndex()
+    for entity in (
+        {"entity_id": "sensor.other", "state": "1", "attributes": {"friendly_name": "x", "room": "desk"}},
+        {"entity_id": "sensor.desk", "state": "1", "attributes": {"friendly_name": "y"}},
+        {"entity_id": "sensor.lamp", "state": "desk", "attributes": {"friendly_name": "z"}},
+        {"entity_id": "sensor.third", "state": "1", "attributes": {"friendly_name": "Desk"}},
+        {"entity_id": "sensor.desktop", "state": "1", "attributes": {"friendly_name": "w"}},
+    ):
+        index.update(entity["entity_id"], None, entity)
+    ranked = index.rank("desk")
+    # A partial entity_id match weighs as much as a whole state match; the shorter ID wins the tie
+    assert [entity_id for _, entity_id in ranked] == [
+        "sensor.desk", "sensor.third", "sensor.lamp", "sensor.desktop", "sensor.other"
+    ]
+    assert ranked[2][0] == ranked[3][0]
+
+def test_rank_top_k_is_the_head_of_the_full_ranking(indexed):
+    _, index = indexed
+    full = index.rank("light")
+    assert len(full) > 14
+    assert {entity_id for _, entity_id in full} == index.search("light")
+    assert index.rank("light", limit=7) == full[:7]
+    assert index.rank("light", limit=7, after=full[6]) == full[7:14]
+    lights = index.rank("kitchen", accept=lambda entity_id: entity_id.startswith("light."))
+    assert lights == [item for item in index.rank("kitchen") if item[1].startswith("light.")]
+    assert index.rank("") == []
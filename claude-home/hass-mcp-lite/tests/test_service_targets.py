@@ -0,0 +1,36 @@
+import pytest
+
+from app.hass import _bulk_group_key, _service_target_ids
+
+@pytest.mark.parametrize("data, expected", [
+    ({"entity_id": "light.a"}, {"light.a"}),
+    ({"entity_id": "light.a, light.b,"}, {"light.a", "light.b"}),
+    ({"entity_id": ["light.a", "light.b"]}, {"light.a", "light.b"}),
+    ({"entity_id": ("light.a",)}, {"light.a"}),
+    ({"entity_id": {"light.a"}}, {"light.a"}),
+    ({"entity_id": "light.a", "target": {"entity_id": ["light.b"]}}, {"light.a", "light.b"}),
+    ({"brightness": 10}, set()),
+    ({"entity_id": None}, set()),
+])
+def test_entity_id_forms_are_normalised(data, expected):
+    assert _service_target_ids(data) == expected
+
+@pytest.mark.parametrize("data", [
+    {"entity_id": "all"},
+    {"entity_id": ["light.a", "all"]},
+    {"area_id": "kitchen"},
+    {"target": {"device_id": ["abc"]}},
+    {"entity_id": 42},
+    {"entity_id": {"light.a": True}},
+    {"entity_id": ["light.a", 7]},
+    {"entity_id": [["light.a"]]},
+    {"target": "light.a"},
+    {"target": {"entity_id": 1.5}},
+])
+def test_unknown_targets_invalidate_everything(data):
+    assert _service_target_ids(data) is None
+
+def test_unexpected_entity_id_types_are_never_merged():
+    assert _bulk_group_key("light", "turn_on", {"entity_id": "light.a"}) is not None
+    assert _bulk_group_key("light", "turn_on", {"entity_id": {"light.a": True}}) is None
+    assert _bulk_group_key("light", "turn_on", {"entity_id": ["light.a", 7]}) is None
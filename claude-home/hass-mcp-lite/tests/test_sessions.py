@@ -0,0 +1,54 @@
+import asyncio
+import gc
+
+from app.sessions import SessionLimiter
+
+class Session:
+    pass
+
+async def run_requests(limiter, sessions, per_session):
+    running = {}
+    peak = {}
+
+    async def request(session):
+        async with limiter.slot(session):
+            running[session] = running.get(session, 0) + 1
+            peak[session] = max(peak.get(session, 0), running[session])
+            await asyncio.sleep(0.01)
+            running[session] -= 1
+
+    await asyncio.gather(*(request(session) for session in sessions for _ in range(per_session)))
+    return peak
+
+def test_each_session_is_capped_on_its_own():
+    limiter = SessionLimiter(2)
+    busy, quiet = Session(), Session()
+    peak = asyncio.run(run_requests(limiter, [busy, quiet], 5))
+    assert peak == {busy: 2, quiet: 2}
+    assert limiter.stats() == {"limit": 2, "sessions": 2, "active": 0, "waits": 6}
+
+def test_nested_handler_does_not_take_a_second_slot():
+    limiter = SessionLimiter(1)
+    session = Session()
+
+    async def outer():
+        async with limiter.slot(session):
+            async with limiter.slot(session):
+                return limiter.stats()["active"]
+
+    assert asyncio.run(asyncio.wait_for(outer(), 1)) == 1
+
+def test_no_session_or_no_limit_is_unlimited():
+    for limiter, session in ((SessionLimiter(1), None), (SessionLimiter(0), Session())):
+        peak = asyncio.run(run_requests(limiter, [session], 3))
+        assert peak == {session: 3}
+        assert limiter.stats()["sessions"] == 0
+
+def test_closed_sessions_are_forgotten():
+    limiter = SessionLimiter(1)
+    session = Session()
+    asyncio.run(run_requests(limiter, [session], 1))
+    assert limiter.stats()["sessions"] == 1
+    del session
+    gc.collect()
+    assert limiter.stats()["sessions"] == 0
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import hass
+from app.mirror import EntityMirror
+from app.store import EntityStore
+
+T0 = 1_700_000_000.0
+
+def rest_state(entity_id, state):
+    return {
+        "entity_id": entity_id, "state": state, "attributes": {},
+        "last_changed": "2023-11-14T22:13:20+00:00", "last_updated": "2023-11-14T22:13:20+00:00",
+    }
+
+@pytest.fixture
+def racing_mirror(loaded_store, monkeypatch):
+    """A snapshot request during which the mirror's initial event arrives"""
+    mirror = EntityMirror("ws://ha.test/api/websocket", "test-token", loaded_store)
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        # The subscription delivers its snapshot while /api/states is in flight
+        mirror._apply_event({"a": {
+            "light.kitchen": {"s": "on", "a": {}, "lc": T0 + 60},
+            "light.hall": {"s": "on", "a": {}, "lc": T0 + 60},
+        }})
+        return httpx.Response(200, json=[rest_state("light.kitchen", "off"), rest_state("light.hall", "off")])
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ha.test")
+    monkeypatch.setattr(hass, "_client", client)
+    hass._forget_recent()
+    loaded_store.set_live(False)
+    loaded_store.invalidate()
+    yield loaded_store, mirror, requests
+    hass._forget_recent()
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_snapshot_finishing_after_the_mirror_is_dropped(racing_mirror, monkeypatch, stream):
+    store, mirror, requests = racing_mirror
+    monkeypatch.setattr(hass, "HA_STREAM_STATES", stream)
+
+    asyncio.run(hass._refresh_states())
+    assert requests == ["/api/states"]
+    assert mirror.ready and store.live
+    assert sorted(store.mapping()) == ["light.hall", "light.kitchen"]
+    assert {entity["state"] for entity in store.mapping().values()} == {"on"}
+
+    # Reads are served by the mirror from now on, without another download
+    asyncio.run(hass._refresh_states(max_age=0))
+    assert requests == ["/api/states"]
+
+def test_rest_replace_keeps_the_live_flag():
+    store = EntityStore()
+    store.replace_all([rest_state("light.a", "on")], live=True)
+    store.replace_all([rest_state("light.a", "off")])
+    assert store.live
+    store.set_live(False)
+    store.replace_all([rest_state("light.a", "on")])
+    assert not store.live
@@ -0,0 +1,62 @@
+from app.compact import plain
+from app.store import EntityStore
+from benchmarks.synthetic import make_entities
+
+def device_class_of(entity):
+    return (entity.get("attributes") or {}).get("device_class")
+
+def assert_partitions_match(store):
+    """Compare every partition with one rebuilt from the full map"""
+    entities = store.mapping()
+    domains = {entity_id.split(".", 1)[0] for entity_id in entities}
+    classes = {device_class_of(entity) for entity in entities.values()} - {None}
+    assert set(store.partitions()) == domains
+    for domain in domains:
+        expected = sorted(entity_id for entity_id in entities if entity_id.startswith(domain + "."))
+        assert sorted(entity["entity_id"] for entity in store.select(domain)) == expected
+        assert store.sorted_ids(domain) == expected
+    for device_class in classes:
+        expected = sorted(entity_id for entity_id, entity in entities.items() if device_class_of(entity) == device_class)
+        assert sorted(entity["entity_id"] for entity in store.select(device_class=device_class)) == expected
+        for domain in domains:
+            both = [entity_id for entity_id in expected if entity_id.startswith(domain + ".")]
+            assert sorted(entity["entity_id"] for entity in store.select(domain, device_class)) == both
+    assert store.select("water_heater") == []
+    assert store.select(device_class="no_such_class") == []
+
+def test_partitions_follow_upserts_and_removals():
+    store = EntityStore()
+    store.replace_all(make_entities(200))
+    assert_partitions_match(store)
+
+    sensor = next(entity_id for entity_id in store.mapping() if entity_id.startswith("sensor."))
+    # device_class changes, appears and disappears
+    store.upsert({**plain(store.peek(sensor)), "attributes": {"device_class": "humidity"}})
+    assert_partitions_match(store)
+    store.upsert({**plain(store.peek(sensor)), "attributes": {}})
+    assert_partitions_match(store)
+
+    store.upsert({"entity_id": "vacuum.robot", "state": "docked", "attributes": {"device_class": "humidity"}})
+    assert_partitions_match(store)
+    for entity_id in [entity_id for entity_id in store.mapping() if entity_id.startswith("cover.")]:
+        store.remove(entity_id)
+    assert "cover" not in store.partitions()
+    assert "shade" not in {device_class_of(entity) for entity in store.select()}
+    assert_partitions_match(store)
+
+def test_replace_all_rebuilds_partitions():
+    store = EntityStore()
+    store.replace_all(make_entities(200))
+    store.replace_all(make_entities(30, seed=3))
+    assert len(store.select()) == 30
+    assert_partitions_match(store)
+
+def test_sorted_ids_are_reused_until_membership_changes():
+    store = EntityStore()
+    store.replace_all(make_entities(100))
+    lights = store.sorted_ids("light")
+    light = lights[0]
+    store.upsert({**plain(store.peek(light)), "state": "on" if store.peek(light)["state"] == "off" else "off"})
+    assert store.sorted_ids("light") is lights
+    store.upsert({"entity_id": "light.aaa_new", "state": "on", "attributes": {}})
+    assert store.sorted_ids("light")[0] == "light.aaa_new"
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.store import EntityStore
+from app.subscriptions import ResourceSubscriptions, resource_scope
+
+class Session:
+    def __init__(self, fail=False):
+        self.updates = []
+        self.fail = fail
+
+    async def send_resource_updated(self, uri):
+        if self.fail:
+            raise ConnectionError("session closed")
+        self.updates.append(uri)
+
+def entity(entity_id, state, name=""):
+    return {"entity_id": entity_id, "state": state, "attributes": {"friendly_name": name}}
+
+@pytest.fixture
+def store():
+    store = EntityStore()
+    store.replace_all([
+        entity("light.kitchen", "off", "Kitchen Lamp"),
+        entity("light.hall", "off", "Hall Lamp"),
+        entity("switch.fan", "off", "Fan"),
+    ])
+    return store
+
+def run(subscriptions, store, changes):
+    """Apply changes to the store inside an event loop and let notifications go out"""
+    async def main():
+        for change in changes:
+            change(store)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    asyncio.run(main())
+
+URIS = ["hass://entities/light.kitchen", "hass://entities/domain/light", "hass://search/fan", "hass://entities"]
+
+def subscribed(store, session):
+    subscriptions = ResourceSubscriptions()
+    store.add_listener(subscriptions.update)
+    for uri in URIS + ["hass://history/light.kitchen"]:
+        subscriptions.subscribe(uri, session)
+    return subscriptions
+
+def test_resource_scopes():
+    assert resource_scope("hass://entities") == ("all", "")
+    assert resource_scope("hass://entities/light.kitchen") == ("entity", "light.kitchen")
+    assert resource_scope("hass://entities/light.kitchen/detailed") == ("entity", "light.kitchen")
+    assert resource_scope("hass://entities/domain/light/summary") == ("domain", "light")
+    assert resource_scope("hass://search/living%20room/5") == ("search", "living room")
+    assert resource_scope("hass://history/light.kitchen") is None
+    assert resource_scope("https://example.com") is None
+
+def test_only_resources_rendered_from_the_entity_are_notified(store):
+    session = Session()
+    subscriptions = subscribed(store, session)
+    run(subscriptions, store, [lambda store: store.upsert(entity("light.kitchen", "on", "Kitchen Lamp"))])
+    assert sorted(session.updates) == sorted(URIS[:2] + ["hass://entities"])
+
+    session.updates.clear()
+    run(subscriptions, store, [lambda store: store.upsert(entity("switch.fan", "on", "Fan"))])
+    assert sorted(session.updates) == ["hass://entities", "hass://search/fan"]
+
+def test_entity_leaving_a_search_is_notified(store):
+    session = Session()
+    subscriptions = ResourceSubscriptions()
+    store.add_listener(subscriptions.update)
+    subscriptions.subscribe("hass://search/lamp", session)
+    run(subscriptions, store, [lambda store: store.upsert(entity("light.kitchen", "off", "Kitchen Light"))])
+    assert session.updates == ["hass://search/lamp"]
+    session.updates.clear()
+    # Neither the old nor the new state matches any more
+    run(subscriptions, store, [lambda store: store.remove("light.kitchen")])
+    assert session.updates == []
+    run(subscriptions, store, [lambda store: store.remove("light.hall")])
+    assert session.updates == ["hass://search/lamp"]
+
+def test_unchanged_states_send_nothing(store):
+    session = Session()
+    subscriptions = subscribed(store, session)
+    run(subscriptions, store, [lambda store: store.upsert(entity("light.kitchen", "off", "Kitchen Lamp"))])
+    assert session.updates == []
+
+def test_a_burst_of_changes_is_one_notification_per_resource(store):
+    session = Session()
+    subscriptions = subscribed(store, session)
+    run(subscriptions, store, [
+        lambda store: store.upsert(entity("light.kitchen", "on")),
+        lambda store: store.upsert(entity("light.hall", "on")),
+        lambda store: store.upsert(entity("light.kitchen", "off")),
+    ])
+    assert sorted(session.updates) == sorted(URIS[:2] + ["hass://entities"])
+    assert subscriptions.notifications == 3
+
+def test_unsubscribed_and_failing_sessions_stop_receiving(store):
+    session, broken = Session(), Session(fail=True)
+    subscriptions = subscribed(store, session)
+    subscriptions.subscribe("hass://entities/light.kitchen", broken)
+    subscriptions.unsubscribe("hass://entities", session)
+    run(subscriptions, store, [lambda store: store.upsert(entity("light.kitchen", "on"))])
+    assert sorted(session.updates) == sorted(URIS[:2])
+    assert subscriptions.failures == 1
+    assert subscriptions.stats()["subscriptions"] == len(URIS)
+
+    run(subscriptions, store, [lambda store: store.upsert(entity("light.kitchen", "off"))])
+    assert subscriptions.failures == 1
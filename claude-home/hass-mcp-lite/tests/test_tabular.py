@@ -0,0 +1,58 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from app import server
+from app.tabular import encode_rows, to_delimited, to_table
+
+ROWS = [
+    {"entity_id": "sensor.a", "state": "1,5", "attributes": {"friendly_name": 'Say "hi"', "unit": "°C"}},
+    {"entity_id": "sensor.b", "state": "tab\there", "attributes": {"friendly_name": "two\nlines", "list": [1, "x"]}},
+    {"entity_id": "sensor.c", "state": None, "attributes": {"friendly_name": "crlf\r\nend", "nested": {"k": "v,w"}}},
+    {"entity_id": "sensor.d", "state": "plain", "last_changed": "2024-01-01T00:00:00+00:00"},
+]
+
+COLUMNS = ["entity_id", "state", "last_changed", "attr.friendly_name", "attr.unit", "attr.list", "attr.nested"]
+
+def parse(text, delimiter):
+    return list(csv.reader(io.StringIO(text, newline=""), delimiter=delimiter))
+
+def test_table_columns_and_rows():
+    table = to_table(ROWS)
+    assert table["columns"] == COLUMNS
+    assert table["rows"][0] == ["sensor.a", "1,5", None, 'Say "hi"', "°C", None, None]
+    assert table["rows"][3] == ["sensor.d", "plain", "2024-01-01T00:00:00+00:00", None, None, None, None]
+
+@pytest.mark.parametrize("delimiter", [",", "\t"])
+def test_delimited_text_escapes_delimiters_quotes_and_newlines(delimiter):
+    text = to_delimited(ROWS, delimiter)
+    records = parse(text, delimiter)
+    assert records[0] == COLUMNS
+    assert len(records) == len(ROWS) + 1
+    assert records[1][:4] == ["sensor.a", "1,5", "", 'Say "hi"']
+    assert records[2][1] == "tab\there"
+    assert records[2][3] == "two\nlines"
+    assert json.loads(records[2][5]) == [1, "x"]
+    assert records[3][3] == "crlf\r\nend"
+    assert json.loads(records[3][6]) == {"k": "v,w"}
+    assert records[3][1] == ""
+
+def test_tsv_and_csv_quote_only_what_they_must():
+    assert to_delimited([{"entity_id": "a.b", "state": "1,5"}], "\t") == "entity_id\tstate\na.b\t1,5\n"
+    assert to_delimited([{"entity_id": "a.b", "state": "1\t5"}], ",") == "entity_id,state\na.b,1\t5\n"
+
+def test_unknown_format_is_rejected():
+    assert set(encode_rows(ROWS, "csv")) == {"csv"}
+    with pytest.raises(ValueError):
+        encode_rows(ROWS, "xml")
+
+def test_list_entities_formats_agree(loaded_store):
+    listed = asyncio.run(server.list_entities(domain="light", limit=10, max_age=3600))
+    table = asyncio.run(server.list_entities(domain="light", limit=10, max_age=3600, format="table"))
+    assert table == to_table(listed)
+    text = asyncio.run(server.list_entities(domain="light", limit=10, max_age=3600, format="tsv"))["tsv"]
+    assert [record[0] for record in parse(text, "\t")[1:]] == [entity["entity_id"] for entity in listed]
+    assert "error" in asyncio.run(server.list_entities(domain="light", format="yaml"))
@@ -0,0 +1,37 @@
+import importlib.util
+import logging
+
+import pytest
+
+from app import transport
+
+@pytest.fixture
+def h2_installed(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: object() if name == "h2" else find_spec(name))
+
+@pytest.mark.parametrize("setting, url, expected", [
+    ("auto", "https://ha.example:8123", True),
+    ("true", "https://ha.example:8123", True),
+    ("off", "https://ha.example:8123", False),
+    ("auto", "http://supervisor/core", False),
+])
+def test_http2_needs_https(monkeypatch, h2_installed, setting, url, expected):
+    monkeypatch.setattr(transport, "HA_HTTP2", setting)
+    monkeypatch.setattr(transport, "HA_URL", url)
+    assert transport.http2_enabled() is expected
+
+def test_forced_http2_warns_when_it_cannot_be_used(monkeypatch, caplog):
+    monkeypatch.setattr(transport, "HA_HTTP2", "true")
+    monkeypatch.setattr(transport, "HA_URL", "https://ha.example:8123")
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+    with caplog.at_level(logging.WARNING, logger=transport.__name__):
+        assert transport.http2_enabled() is False
+    assert "h2 package is not installed" in caplog.text
+
+def test_auto_http2_is_silent_over_http(monkeypatch, h2_installed, caplog):
+    monkeypatch.setattr(transport, "HA_HTTP2", "auto")
+    monkeypatch.setattr(transport, "HA_URL", "http://supervisor/core")
+    with caplog.at_level(logging.WARNING, logger=transport.__name__):
+        assert transport.http2_enabled() is False
+    assert caplog.text == ""